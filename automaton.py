@@ -0,0 +1,534 @@
+from __future__ import division, unicode_literals
+import heapq
+import bisect
+import itertools
+
+import numpy
+
+import lang_gen
+
+'''
+A language's phonotactics compiled into a weighted finite-state automaton. A word is a path
+through it: each syllable reads an onset, a coda and a nucleus, and the state between
+syllables is the last coda (or the start of the word). The weights are the conditional
+probabilities Language.choose_valid_onset(), choose_valid_coda() and choose_valid_nucleus()
+draw with - their rejection loops and forced empty onsets / codas included - for every
+syllable position (see Language.get_syllable_position()). So
+
+    automaton = language.get_automaton()
+    automaton.count(2)                      # exactly how many 2 syllable words there are
+    automaton.sample(2)                     # a word, distributed exactly like create_word()'s
+    automaton.rank(word)                    # the word's place among all words of its length
+    automaton.unrank(12345, 2)              # and back
+    automaton.sample_unique(1000, 2)        # 1000 different words, uniformly
+    automaton.most_probable(100, 2)         # the 100 most probable 2 syllable words
+
+Words are counted by their syllable structure. A few different structures can spell out the
+same phonemes (a coda /s/ and an onset /tr/, or a coda /st/ and an onset /r/).
+
+Sampling draws from an alias table for each (syllable position, previous component), so each
+draw takes a single random variate and constant time. Tables are built the first time they're
+needed.
+
+Unique samples are drawn with a sparse Fisher-Yates shuffle over the ranks, which only keeps
+track of the ranks it has moved. It never retries, so it doesn't slow down as the words run out.
+
+The most probable words come out of a best-first search over the automaton. A syllable is three
+steps - onset, coda, nucleus - and every node knows the best probability of any way to finish
+the word from it. The search expands a node's steps lazily, best first, so it pops complete
+words in order of decreasing probability, and keeps only a couple of entries per word it has
+produced.
+'''
+
+SYLLABLE_POSITIONS = (-1, 0, 1, 2)
+
+
+class AliasTable:
+    ''' Vose's alias method: draws an index with probability proportional to its weight in constant time '''
+    def __init__(self, weights):
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+        self.size = len(weights)
+        total = weights.sum()
+        scaled = (weights * self.size / total).tolist() if total else [1.0] * self.size
+
+        self.probability = [1.0] * self.size
+        self.alias = range(self.size)
+
+        small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def draw(self, rng):
+        ''' One variate: its whole part picks a column, and its fractional part picks the column's index or its alias '''
+        column = rng.random() * self.size
+        index = int(column)
+        return index if column - index < self.probability[index] else self.alias[index]
+
+
+def normalize(weights):
+    total = weights.sum()
+    return weights / total if total else weights
+
+
+class WordAutomaton:
+    ''' The words of a language as paths through its onsets, codas and nuclei '''
+    def __init__(self, language):
+        self.language = language
+        phoneme_data = language.phoneme_data
+
+        # The empty onset and coda can always be forced, even if they're not among the language's components
+        self.onsets = list(language.probabilities['onset'])
+        if phoneme_data.empty_onset not in language.probabilities['onset']:
+            self.onsets.append(phoneme_data.empty_onset)
+        self.codas = list(language.probabilities['coda'])
+        if phoneme_data.empty_coda not in language.probabilities['coda']:
+            self.codas.append(phoneme_data.empty_coda)
+        self.nuclei = list(language.probabilities['nucleus'])
+
+        self.onset_index = {onset: i for i, onset in enumerate(self.onsets)}
+        self.coda_index = {coda: i for i, coda in enumerate(self.codas)}
+        self.nucleus_index = {nucleus: i for i, nucleus in enumerate(self.nuclei)}
+        # The state at the start of a word, before any coda
+        self.start = len(self.codas)
+
+        # By syllable position: (previous codas + start) x onsets, onsets x codas, and nuclei
+        self.onset_probabilities = {position: self.get_onset_probabilities(position) for position in SYLLABLE_POSITIONS}
+        self.coda_probabilities = {position: self.get_coda_probabilities(position) for position in SYLLABLE_POSITIONS}
+        self.nucleus_probabilities = {position: self.get_nucleus_probabilities(position) for position in SYLLABLE_POSITIONS}
+
+        # Which transitions are possible at all, and the nuclei each position allows (in order)
+        self.onset_allowed = {position: table > 0 for position, table in self.onset_probabilities.iteritems()}
+        self.coda_allowed = {position: table > 0 for position, table in self.coda_probabilities.iteritems()}
+        self.allowed_nuclei = {position: numpy.flatnonzero(table > 0).tolist() for position, table in self.nucleus_probabilities.iteritems()}
+
+        self.alias_tables = {}
+        # Per number of syllables, the count tables rank() and unrank() use (see get_count_tables())
+        self.count_tables = {}
+        # Built the first time words are scored in bulk (see get_log_tables())
+        self.log_tables = None
+        self.indexes_by_id = None
+        # Per number of syllables, the best completions and sorted steps most_probable() uses
+        self.best_completions = {}
+        self.sorted_steps = {}
+
+    # ------------------------------------ Probabilities ------------------------------------ #
+
+    def get_onset_probabilities(self, position):
+        ''' Rows are the previous coda (and the start of the word), columns the onset; follows choose_valid_onset() '''
+        onsets = self.language.probabilities['onset']
+        weights = numpy.array([onsets.get(onset, 0) for onset in self.onsets], dtype=numpy.float64)
+        empty_onset = numpy.zeros(len(self.onsets))
+        empty_onset[self.onset_index[self.language.phoneme_data.empty_onset]] = 1
+
+        table = numpy.zeros((len(self.codas) + 1, len(self.onsets)))
+        if position in (-1, 0):
+            table[self.start] = normalize(weights)
+            return table
+
+        force_empty = lang_gen.FORCE_EMPTY_ONSET_AFTER_ANY_CODA_CHANCE / 100
+        for row, coda in enumerate(self.codas):
+            if coda.is_complex() or (position == 1 and not coda.is_empty()):
+                table[row] = empty_onset
+                continue
+
+            allowed = weights.copy()
+            for column, onset in enumerate(self.onsets):
+                if onset.phoneme_ids[-1] == coda.phoneme_ids[-1] or (onset.is_empty() and coda.is_empty()):
+                    allowed[column] = 0
+            table[row] = normalize(allowed)
+            if not coda.is_empty():
+                table[row] = force_empty * empty_onset + (1 - force_empty) * table[row]
+
+        return table
+
+    def get_coda_probabilities(self, position):
+        ''' Rows are the onset, columns the coda; follows choose_valid_coda() '''
+        codas = self.language.probabilities['coda']
+        weights = numpy.array([codas.get(coda, 0) for coda in self.codas], dtype=numpy.float64)
+
+        table = numpy.zeros((len(self.onsets), len(self.codas)))
+        for row, onset in enumerate(self.onsets):
+            if position == 1:
+                table[row, self.coda_index[self.language.phoneme_data.empty_coda]] = 1
+                continue
+
+            allowed = weights.copy()
+            for column, coda in enumerate(self.codas):
+                if onset.has_any_phoneme((221, 224)) and coda.has_any_phoneme((221, 224)):
+                    allowed[column] = 0
+                if position == -1 and coda.is_empty():
+                    allowed[column] = 0
+            table[row] = normalize(allowed)
+
+        return table
+
+    def get_nucleus_probabilities(self, position):
+        ''' Follows choose_valid_nucleus(); the nucleus doesn't depend on the rest of the syllable '''
+        nuclei = self.language.probabilities['nucleus_monophthong' if position == 1 else 'nucleus']
+        return normalize(numpy.array([nuclei.get(nucleus, 0) for nucleus in self.nuclei], dtype=numpy.float64))
+
+    def get_positions(self, number_of_syllables):
+        return [self.language.get_syllable_position(current_syllable=i, total_syllables=number_of_syllables)
+                    for i in xrange(number_of_syllables)]
+
+    def get_path_components(self, word):
+        ''' The (onset, coda, nucleus) indexes of each of a word's syllables, or None if a component isn't in the language '''
+        try:
+            return [(self.onset_index[syllable.onset], self.coda_index[syllable.coda], self.nucleus_index[syllable.nucleus])
+                        for syllable in word.syllables]
+        except KeyError:
+            return None
+
+    def get_path_probability(self, path):
+        probability = 1.0
+        state = self.start
+        for position, (onset, coda, nucleus) in zip(self.get_positions(len(path)), path):
+            probability *= self.onset_probabilities[position][state, onset] * self.coda_probabilities[position][onset, coda] * \
+                           self.nucleus_probabilities[position][nucleus]
+            state = coda
+        return probability
+
+    # --------------------------------------- Scoring --------------------------------------- #
+
+    def is_own_word(self, word):
+        ''' Whether the word is made of components from this language's phoneme data (and so can be scored by its syllables) '''
+        return isinstance(word, lang_gen.Word) and word.language.phoneme_data is self.language.phoneme_data
+
+    def log_probability(self, word):
+        ''' The log of the probability of create_word() making this word, given its number of syllables. The word
+            can also be a sequence of phoneme ids (or a word from a language with other phoneme data), which
+            is scored by log_probability_of_phonemes(). -inf if the language can't make it '''
+        if not self.is_own_word(word):
+            return self.log_probability_of_phonemes(getattr(word, 'phoneme_ids', word))
+
+        path = self.get_path_components(word)
+        probability = self.get_path_probability(path) if path is not None else 0
+        return numpy.log(probability) if probability else float('-inf')
+
+    def log_probability_of_phonemes(self, phoneme_ids):
+        ''' The log of the probability of create_word() making this sequence of phonemes, over every way of splitting
+            it into syllables. Each vowel is a nucleus; the consonants between two vowels can be split between the
+            first's coda and the second's onset. The empty onset / coda markers (300 and 301) are ignored '''
+        phoneme_data = self.language.phoneme_data
+        phoneme_ids = [phoneme_id for phoneme_id in phoneme_ids if phoneme_id < 300]
+
+        nuclei = []
+        clusters = [[]]
+        for phoneme_id in phoneme_ids:
+            if phoneme_data.is_consonant(phoneme_id):
+                clusters[-1].append(phoneme_id)
+            else:
+                nuclei.append(phoneme_data.get_component_by_phoneme_ids('nucleus', (phoneme_id, )))
+                clusters.append([])
+
+        if not nuclei or None in nuclei or any(nucleus not in self.nucleus_index for nucleus in nuclei):
+            return float('-inf')
+
+        def get_index(component_type, ids, empty_component, component_index):
+            component = phoneme_data.get_component_by_phoneme_ids(component_type, tuple(ids)) if ids else empty_component
+            return component_index.get(component)
+
+        probability = 0.0
+        # Where each cluster between two vowels is split; the first cluster is all onset, and the last all coda
+        for splits in itertools.product(*[xrange(len(cluster) + 1) for cluster in clusters[1:-1]]):
+            codas = [cluster[:split] for cluster, split in zip(clusters[1:-1], splits)] + [clusters[-1]]
+            onsets = [clusters[0]] + [cluster[split:] for cluster, split in zip(clusters[1:-1], splits)]
+
+            path = [(get_index('onset', onset, phoneme_data.empty_onset, self.onset_index),
+                     get_index('coda', coda, phoneme_data.empty_coda, self.coda_index),
+                     self.nucleus_index[nucleus]) for onset, coda, nucleus in zip(onsets, codas, nuclei)]
+            if all(onset is not None and coda is not None for onset, coda, _ in path):
+                probability += self.get_path_probability(path)
+
+        return numpy.log(probability) if probability else float('-inf')
+
+    def get_log_tables(self):
+        ''' By syllable position, the log probability tables, and by component id, each component's index '''
+        if self.log_tables is None:
+            with numpy.errstate(divide='ignore'):
+                self.log_tables = {position: (numpy.log(self.onset_probabilities[position]), numpy.log(self.coda_probabilities[position]),
+                                              numpy.log(self.nucleus_probabilities[position])) for position in SYLLABLE_POSITIONS}
+
+            self.indexes_by_id = {}
+            for name, components in (('onset', self.onsets), ('coda', self.codas), ('nucleus', self.nuclei)):
+                indexes = numpy.full(self.language.phoneme_data.next_component_id, -1, dtype=numpy.int64)
+                indexes[[component.id_ for component in components]] = numpy.arange(len(components))
+                self.indexes_by_id[name] = indexes
+
+        return self.log_tables
+
+    def log_probabilities(self, words):
+        ''' log_probability() of each of the words, as an array. The language's own words are grouped by their
+            number of syllables, and each group is scored at once with lookups into the log tables '''
+        log_tables = self.get_log_tables()
+        scores = numpy.empty(len(words))
+
+        groups = {}
+        for i, word in enumerate(words):
+            if self.is_own_word(word):
+                groups.setdefault(len(word.syllables), []).append(i)
+            else:
+                scores[i] = self.log_probability(word)
+
+        for number_of_syllables, indexes in groups.iteritems():
+            # words x syllables x (onset, coda, nucleus) component ids
+            component_ids = numpy.fromiter((component.id_ for i in indexes for syllable in words[i].syllables
+                                                for component in (syllable.onset, syllable.coda, syllable.nucleus)),
+                                           dtype=numpy.int64, count=len(indexes) * number_of_syllables * 3)
+            component_ids = component_ids.reshape(len(indexes), number_of_syllables, 3)
+            onsets = self.indexes_by_id['onset'][component_ids[:, :, 0]]
+            codas = self.indexes_by_id['coda'][component_ids[:, :, 1]]
+            nuclei = self.indexes_by_id['nucleus'][component_ids[:, :, 2]]
+            valid = ((onsets >= 0) & (codas >= 0) & (nuclei >= 0)).all(axis=1)
+            onsets, codas, nuclei = onsets.clip(0), codas.clip(0), nuclei.clip(0)
+
+            group_scores = numpy.zeros(len(indexes))
+            states = numpy.full(len(indexes), self.start, dtype=numpy.int64)
+            for syllable, position in enumerate(self.get_positions(number_of_syllables)):
+                log_onsets, log_codas, log_nuclei = log_tables[position]
+                group_scores += log_onsets[states, onsets[:, syllable]] + log_codas[onsets[:, syllable], codas[:, syllable]] + \
+                                log_nuclei[nuclei[:, syllable]]
+                states = codas[:, syllable]
+
+            group_scores[~valid] = float('-inf')
+            scores[indexes] = group_scores
+
+        return scores
+
+    # -------------------------------------- Sampling --------------------------------------- #
+
+    def get_alias_table(self, kind, position, row=None):
+        key = (kind, position, row)
+        if key not in self.alias_tables:
+            if kind == 'onset':     weights = self.onset_probabilities[position][row]
+            elif kind == 'coda':    weights = self.coda_probabilities[position][row]
+            else:                   weights = self.nucleus_probabilities[position]
+            self.alias_tables[key] = AliasTable(weights)
+        return self.alias_tables[key]
+
+    def make_word(self, path, meaning=None):
+        syllables = [lang_gen.Syllable(onset=self.onsets[onset], nucleus=self.nuclei[nucleus], coda=self.codas[coda]) for onset, coda, nucleus in path]
+        return lang_gen.Word(meaning=meaning, language=self.language, syllables=syllables)
+
+    def sample(self, number_of_syllables, meaning=None):
+        ''' A word drawn from the same distribution as Language.create_word(), from the language's word stream '''
+        rng = self.language.rng
+        path = []
+        state = self.start
+        for position in self.get_positions(number_of_syllables):
+            onset = self.get_alias_table('onset', position, state).draw(rng)
+            coda = self.get_alias_table('coda', position, onset).draw(rng)
+            nucleus = self.get_alias_table('nucleus', position).draw(rng)
+            path.append((onset, coda, nucleus))
+            state = coda
+
+        return self.make_word(path, meaning=meaning)
+
+    # -------------------------------- Counting and ranking --------------------------------- #
+
+    def get_count_tables(self, number_of_syllables):
+        ''' For each syllable: the number of ways to finish the word after each of its codas (the codas' "tails"),
+            and the number of ways to finish it from each of its onsets. Exact (python integers) '''
+        if number_of_syllables not in self.count_tables:
+            tails = numpy.ones(len(self.codas), dtype=object)
+            tables = []
+            for position in reversed(self.get_positions(number_of_syllables)):
+                onset_counts = self.coda_allowed[position].astype(object).dot(tails) * len(self.allowed_nuclei[position])
+                tables.append((tails, onset_counts))
+                # By previous coda, and the start of the word in the last row
+                completions = self.onset_allowed[position].astype(object).dot(onset_counts)
+                tails = completions[:-1]
+
+            tables.reverse()
+            self.count_tables[number_of_syllables] = (completions[self.start], tables)
+        return self.count_tables[number_of_syllables]
+
+    def count(self, number_of_syllables):
+        ''' Exactly how many words of this many syllables the language can make '''
+        if number_of_syllables == 0:
+            return 0
+        return self.get_count_tables(number_of_syllables)[0]
+
+    def unrank(self, rank, number_of_syllables, meaning=None):
+        ''' The word at this rank among all the words of this many syllables, 0 <= rank < count(). Words are
+            ordered by their first onset, then its coda, then its nucleus, then the next syllable, and so on '''
+        total, tables = self.get_count_tables(number_of_syllables)
+        if not 0 <= rank < total:
+            raise IndexError('rank {0} is out of range for {1} syllable words ({2} words)'.format(rank, number_of_syllables, total))
+
+        path = []
+        state = self.start
+        for position, (tails, onset_counts) in zip(self.get_positions(number_of_syllables), tables):
+            onsets = numpy.flatnonzero(self.onset_allowed[position][state])
+            onset = onsets[self.find_block(rank, [onset_counts[o] for o in onsets])]
+            rank -= sum(onset_counts[o] for o in onsets if o < onset)
+
+            nuclei = self.allowed_nuclei[position]
+            codas = numpy.flatnonzero(self.coda_allowed[position][onset])
+            coda = codas[self.find_block(rank, [tails[c] * len(nuclei) for c in codas])]
+            rank -= sum(tails[c] * len(nuclei) for c in codas if c < coda)
+
+            nucleus, rank = divmod(rank, tails[coda])
+            path.append((int(onset), int(coda), nuclei[nucleus]))
+            state = coda
+
+        return self.make_word(path, meaning=meaning)
+
+    def find_block(self, rank, block_sizes):
+        ''' Which of a run of consecutive blocks (of these sizes) the rank falls in '''
+        return bisect.bisect_right(cumulative_sums(block_sizes), rank)
+
+    def rank(self, word):
+        ''' The word's rank among all the words of its number of syllables (see unrank()), or None if it isn't a valid word '''
+        path = self.get_path_components(word)
+        if path is None:
+            return None
+        total, tables = self.get_count_tables(len(path))
+
+        rank = 0
+        state = self.start
+        for position, (tails, onset_counts), (onset, coda, nucleus) in zip(self.get_positions(len(path)), tables, path):
+            nuclei = self.allowed_nuclei[position]
+            if not (self.onset_allowed[position][state, onset] and self.coda_allowed[position][onset, coda] and nucleus in nuclei):
+                return None
+
+            rank += sum(onset_counts[o] for o in numpy.flatnonzero(self.onset_allowed[position][state]) if o < onset)
+            rank += sum(tails[c] * len(nuclei) for c in numpy.flatnonzero(self.coda_allowed[position][onset]) if c < coda)
+            rank += nuclei.index(nucleus) * tails[coda]
+            state = coda
+
+        return rank
+
+    # ---------------------------------- Unique sampling ------------------------------------ #
+
+    def random_rank(self, stop):
+        ''' A uniformly random integer in [0, stop), however large stop is, 32 random bits at a time '''
+        bits = stop.bit_length()
+        chunks = -(-bits // 32)
+        while True:
+            value = 0
+            for _ in xrange(chunks):
+                value = value << 32 | int(self.language.rng.random() * 2**32)
+            value >>= chunks * 32 - bits
+            if value < stop:
+                return value
+
+    def iterate_unique(self, number_of_syllables):
+        ''' A generator of every word of this many syllables, each exactly once, in a uniformly random order.
+            A sparse Fisher-Yates shuffle of the ranks: only the ranks which have been swapped are kept '''
+        total = self.count(number_of_syllables)
+        swapped = {}
+        for i in itertools.count():
+            if i >= total:
+                return
+            j = i + self.random_rank(total - i)
+            rank = swapped.get(j, j)
+            swapped[j] = swapped.pop(i, i)
+            yield self.unrank(rank, number_of_syllables)
+
+    def sample_unique(self, k, number_of_syllables):
+        ''' k different words of this many syllables, uniformly at random (fewer if there aren't k of them) '''
+        return list(itertools.islice(self.iterate_unique(number_of_syllables), k))
+
+
+    # --------------------------------- Most probable words --------------------------------- #
+
+    def get_best_completions(self, number_of_syllables):
+        ''' For each syllable, the log probability of the best way to finish the word from each of its onsets,
+            from each of its codas (before the nucleus), and after each of its codas (the next syllable's states) '''
+        if number_of_syllables not in self.best_completions:
+            with numpy.errstate(divide='ignore'):
+                after_coda = numpy.zeros(len(self.codas))
+                tables = []
+                for position in reversed(self.get_positions(number_of_syllables)):
+                    from_coda = numpy.log(self.nucleus_probabilities[position]).max() + after_coda
+                    from_onset = (numpy.log(self.coda_probabilities[position]) + from_coda).max(axis=1)
+                    tables.append((from_onset, from_coda, after_coda))
+                    after_coda = (numpy.log(self.onset_probabilities[position]) + from_onset).max(axis=1)[:-1]
+
+            tables.reverse()
+            self.best_completions[number_of_syllables] = tables
+        return self.best_completions[number_of_syllables]
+
+    def get_sorted_steps(self, number_of_syllables, node):
+        ''' The steps out of a node, best first: (log probability of the best word through the step, log probability
+            of the step, component index, next node). Nodes are (syllable, 'state' / 'onset' / 'coda', index) '''
+        key = (number_of_syllables, node)
+        if key not in self.sorted_steps:
+            syllable, kind, index = node
+            position = self.get_positions(number_of_syllables)[syllable]
+            from_onset, from_coda, after_coda = self.get_best_completions(number_of_syllables)[syllable]
+
+            if kind == 'state':
+                step_probabilities, completions = self.onset_probabilities[position][index], from_onset
+                next_nodes = [(syllable, 'onset', onset) for onset in xrange(len(self.onsets))]
+            elif kind == 'onset':
+                step_probabilities, completions = self.coda_probabilities[position][index], from_coda
+                next_nodes = [(syllable, 'coda', coda) for coda in xrange(len(self.codas))]
+            else:
+                # The nucleus leads on to the next syllable, from the coda this node is for
+                step_probabilities = self.nucleus_probabilities[position]
+                completions = numpy.repeat(after_coda[index], len(self.nuclei))
+                next_nodes = [(syllable + 1, 'state', index)] * len(self.nuclei)
+
+            steps = [(numpy.log(probability) + completions[i], numpy.log(probability), i, next_nodes[i])
+                        for i, probability in enumerate(step_probabilities) if probability > 0]
+            steps.sort(key=lambda step: -step[0])
+            self.sorted_steps[key] = steps
+        return self.sorted_steps[key]
+
+    def iterate_most_probable(self, number_of_syllables, meaning=None):
+        ''' A generator of (log probability, word) for the words of this many syllables, most probable first.
+            Heap entries are (minus the best log probability through a step, log probability so far, path so
+            far, node, the step's place in the node's sorted steps). Taking a step pushes the node's next step
+            and the best step out of the node it leads to, so the heap grows by at most two entries per step '''
+        if self.count(number_of_syllables) == 0:
+            return
+
+        start = (0, 'state', self.start)
+        heap = [(-self.get_sorted_steps(number_of_syllables, start)[0][0], 0.0, None, start, 0)]
+        while heap:
+            _, log_probability, path, node, step_index = heapq.heappop(heap)
+            steps = self.get_sorted_steps(number_of_syllables, node)
+
+            if step_index + 1 < len(steps):
+                heapq.heappush(heap, (-(log_probability + steps[step_index + 1][0]), log_probability, path, node, step_index + 1))
+
+            _, step_log_probability, component, next_node = steps[step_index]
+            log_probability += step_log_probability
+            # Paths are linked lists of components, so that paths with the same start share it
+            path = (path, component)
+
+            if next_node[0] == number_of_syllables:
+                yield log_probability, self.make_word(self.unlink_path(path), meaning=meaning)
+            else:
+                next_steps = self.get_sorted_steps(number_of_syllables, next_node)
+                if next_steps:
+                    heapq.heappush(heap, (-(log_probability + next_steps[0][0]), log_probability, path, next_node, 0))
+
+    def unlink_path(self, path):
+        ''' A linked path of onset, coda, nucleus, onset, ... as (onset, coda, nucleus) for each syllable '''
+        components = []
+        while path is not None:
+            path, component = path
+            components.append(component)
+        components.reverse()
+        return [tuple(components[i:i + 3]) for i in xrange(0, len(components), 3)]
+
+    def most_probable(self, k, number_of_syllables):
+        ''' The k most probable words of this many syllables, most probable first '''
+        return [word for _, word in itertools.islice(self.iterate_most_probable(number_of_syllables), k)]
+
+
+def cumulative_sums(values):
+    sums = []
+    total = 0
+    for value in values:
+        total += value
+        sums.append(total)
+    return sums
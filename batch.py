@@ -0,0 +1,395 @@
+from __future__ import division, unicode_literals
+import time
+import random
+import argparse
+
+import numpy
+
+import lang_gen
+import phonemes as p
+import phoneme_arrays
+from component_weights import ComponentWeights
+from random_source import MAX_SEED
+
+'''
+Generates many languages at once. Instead of each Language running its drop decisions and
+drawing its component probabilities one at a time, a LanguageBatch makes every decision for
+every language in the batch with numpy:
+
+    valid_consonants    languages x consonants boolean matrix (the consonant inventories)
+    weights[type]       languages x components integer matrix of onset / coda / nucleus
+                        probabilities, 0 where a component isn't valid in that language
+
+The rules (and their chances) are the ones in lang_gen.py, so a batch draws languages from
+the same distribution as Language.generate_language_properties(). The random numbers are
+drawn in a different order though, so a batch row is not the same language as
+Language(seed=row seed). Rows are only turned into Language objects when they're asked for:
+
+    batch = LanguageBatch(size=10000, seed=1)
+    small = numpy.flatnonzero(batch.consonant_counts < 12)
+    language = batch.get_language(small[0])
+'''
+
+# How many languages are generated at a time when screening a large number of them
+DEFAULT_BATCH_SIZE = 10000
+
+
+class PhonemeTables:
+    ''' The properties of the consonants and syllable components in a set of phoneme data,
+        as arrays which line up with the columns of a LanguageBatch '''
+    def __init__(self, phoneme_data):
+        self.phoneme_data = phoneme_data
+
+        # The real consonants (not the empty placeholders), in id order
+        self.consonants = sorted((c for c in p.CONSONANTS if c.id_ < 300), key=lambda c: c.id_)
+
+        self.consonant_method   = self.index_array([c.method for c in self.consonants], phoneme_data.consonant_methods)
+        self.consonant_location = self.index_array([c.location for c in self.consonants], phoneme_data.consonant_locations)
+        self.consonant_voicing  = numpy.array([c.voicing for c in self.consonants])
+        self.is_aspirated       = numpy.array([c.special == 'aspirated' for c in self.consonants])
+        self.is_plosive         = self.consonant_method == phoneme_data.consonant_methods.index('plosive')
+        self.is_dental          = self.consonant_location == phoneme_data.consonant_locations.index('dental')
+        self.is_non_english     = numpy.array([not c.is_english() for c in self.consonants])
+
+        # The columns of the onset / coda / nucleus weight matrices. The empty onset and coda
+        # get the last column of their matrices, as they come last in Language.probabilities
+        self.components = {
+            'onset':   [c for c in phoneme_data.all_syllable_components['onset'] if not c.is_empty()] + [phoneme_data.empty_onset],
+            'coda':    [c for c in phoneme_data.all_syllable_components['coda']  if not c.is_empty()] + [phoneme_data.empty_coda],
+            'nucleus': list(phoneme_data.all_syllable_components['nucleus']),
+        }
+        self.component_ids = {component_type: numpy.array([c.id_ for c in components]) for component_type, components in self.components.iteritems()}
+
+        # ------ Onsets and codas, not counting the empty component in the last column ------ #
+        # These come from the component arrays, which are memory mapped when they've been built
+        arrays = phoneme_arrays.get_phoneme_arrays(phoneme_data)
+        consonant_slots = numpy.array([c.id_ for c in self.consonants]) - phoneme_arrays.CONSONANT_ID_BASE
+        voicing_by_id = numpy.zeros(phoneme_arrays.CONSONANT_ID_BASE + phoneme_arrays.CONSONANT_SLOTS, dtype=self.consonant_voicing.dtype)
+        voicing_by_id[consonant_slots + phoneme_arrays.CONSONANT_ID_BASE] = self.consonant_voicing
+        self.incidence = {}
+        self.is_complex = {}
+        self.edge_voicing = {}
+
+        for component_type, get_edge_phoneme_ids in (('onset', arrays.get_first_phoneme_ids), ('coda', arrays.get_last_phoneme_ids)):
+            component_ids = numpy.array([c.id_ for c in self.components[component_type][:-1]])
+            # consonants x components; an entry is 1 if the consonant appears in the component
+            self.incidence[component_type] = arrays.consonant_mask[component_ids][:, consonant_slots].T.astype(numpy.float32)
+            self.is_complex[component_type] = arrays.get_lengths(component_ids) > 1
+            # Voicing restrictions look at the first consonant of an onset, and the last consonant of a coda
+            self.edge_voicing[component_type] = voicing_by_id[get_edge_phoneme_ids(component_ids)]
+
+        # ------------------------------------- Nuclei -------------------------------------- #
+        vowels = [nucleus.phonemes[0] for nucleus in self.components['nucleus']]
+        self.is_diphthong = numpy.array([v.is_diphthong() for v in vowels])
+        self.is_lax       = numpy.array([v.manner == 'lax' for v in vowels])
+        self.is_rounded   = numpy.array([v.lips == 'rounded' for v in vowels])
+
+        # Multiplier on each component's probability (complex onsets / codas and diphthongs are less common)
+        self.probability_multipliers = {
+            'onset':   numpy.where(self.is_complex['onset'], lang_gen.COMPLEX_ONSET_PROBABILITY_MULTIPLIER, 1),
+            'coda':    numpy.where(self.is_complex['coda'],  lang_gen.COMPLEX_CODA_PROBABILITY_MULTIPLIER, 1),
+            'nucleus': numpy.where(self.is_diphthong,        lang_gen.DIPHTHONG_PROBABILITY_MULTIPLIER, 1),
+        }
+
+    def index_array(self, values, options):
+        ''' Each value's position in options, or -1 if it's not one of them '''
+        return numpy.array([options.index(value) if value in options else -1 for value in values])
+
+
+# The tables only depend on the phoneme data, so they're built once for each set of it
+PHONEME_TABLES = {}
+
+
+def get_phoneme_tables(phoneme_data):
+    if id(phoneme_data) not in PHONEME_TABLES:
+        PHONEME_TABLES[id(phoneme_data)] = PhonemeTables(phoneme_data=phoneme_data)
+    return PHONEME_TABLES[id(phoneme_data)]
+
+
+class LanguageBatch:
+    ''' The phoneme inventories and component probabilities of a number of languages. Properties
+        which can be None on a Language are stored as -1 here '''
+    def __init__(self, size, seed=None, phoneme_data=None):
+        self.size = size
+        self.seed = seed if seed is not None else random.randint(0, MAX_SEED)
+        self.phoneme_data = phoneme_data if phoneme_data is not None else p.data
+
+        self.tables = get_phoneme_tables(self.phoneme_data)
+        self.random_state = numpy.random.RandomState(self.seed)
+
+        # Each row's Language gets its own seed, for its orthography and words
+        self.language_seeds = self.random_state.randint(0, MAX_SEED + 1, size=size, dtype=numpy.int64)
+
+        self.generate_consonants()
+        self.generate_nuclei()
+        self.generate_syllable_rules()
+
+        self.weights['onset'] = self.generate_component_weights(component_type='onset')
+        self.weights['coda']  = self.generate_component_weights(component_type='coda')
+
+        self.consonant_counts = self.valid_consonants.sum(axis=1)
+        self.vowel_counts = (self.weights['nucleus'] > 0).sum(axis=1)
+
+    def __len__(self):
+        return self.size
+
+    # ---------------------------------- Random draws ---------------------------------- #
+
+    def chance(self, number):
+        ''' A chance (out of 100) for each language '''
+        return self.random_state.random_sample(self.size) * 100 < number
+
+    def choice(self, options):
+        ''' One of the options for each language '''
+        return numpy.asarray(options)[self.random_state.randint(len(options), size=self.size)]
+
+    def weighted_choice(self, choices):
+        ''' The index of one of an OrderedDict of choice:weight pairs for each language '''
+        cumulative_weights = numpy.cumsum(choices.values())
+        return numpy.searchsorted(cumulative_weights, self.random_state.random_sample(self.size) * cumulative_weights[-1], side='right')
+
+    def random_ranks(self, allowed):
+        ''' A random ordering (0, 1, 2...) of the allowed columns in each row. Columns which aren't
+            allowed rank after all the allowed ones '''
+        keys = self.random_state.random_sample(allowed.shape)
+        keys[~allowed] = 2
+        return keys.argsort(axis=1).argsort(axis=1)
+
+    def component_probabilities(self, component_type):
+        ''' A probability for every language and component, as in Language.get_component_probability() '''
+        multipliers = self.tables.probability_multipliers[component_type]
+        probabilities = self.random_state.lognormal(3, 1.2, size=(self.size, len(multipliers))) * multipliers
+        # Clip before truncating to an integer, since the occasional spike doesn't fit in one
+        probabilities = numpy.minimum(probabilities, lang_gen.MAX_COMPONENT_PROBABILITY).astype(numpy.int32)
+        return numpy.maximum(probabilities, lang_gen.MIN_COMPONENT_PROBABILITY)
+
+    # ------------------------------- Language properties ------------------------------- #
+
+    def generate_consonants(self):
+        ''' Drop consonants from each language, following Language.generate_language_properties() '''
+        t = self.tables
+        valid = numpy.ones((self.size, len(t.consonants)), dtype=bool)
+        methods   = numpy.arange(len(self.phoneme_data.consonant_methods))
+        locations = numpy.arange(len(self.phoneme_data.consonant_locations))
+
+        # ----- Entire methods, dentals, entire locations, and entire voicings ----- #
+        self.dropped_method = numpy.where(self.chance(lang_gen.DROP_ENTIRE_METHOD_CHANCE), self.choice(methods), -1)
+        valid &= ~((self.dropped_method[:, None] != -1) & (t.consonant_method == self.dropped_method[:, None]))
+
+        self.dropped_dentals = self.chance(lang_gen.DROP_DENTAL_CHANCE)
+        valid &= ~(self.dropped_dentals[:, None] & t.is_dental)
+
+        self.dropped_location = numpy.where(self.chance(lang_gen.DROP_ENTIRE_LOCATION_CHANCE), self.choice(locations), -1)
+        valid &= ~((self.dropped_location[:, None] != -1) & (t.consonant_location == self.dropped_location[:, None]))
+
+        self.language_voicing_restriction = numpy.where(self.chance(lang_gen.DROP_ENTIRE_VOICING_CHANCE), self.choice((0, 1)), -1)
+        valid &= ~((self.language_voicing_restriction[:, None] != -1) & (t.consonant_voicing == self.language_voicing_restriction[:, None]))
+
+        # ----- Aspirated / unaspirated plosives ----- #
+        self.plosive_types = self.weighted_choice(lang_gen.PLOSIVE_TYPES)
+        plosive_type_names = lang_gen.PLOSIVE_TYPES.keys()
+        unaspirated = self.plosive_types == plosive_type_names.index('unaspirated')
+        aspirated   = self.plosive_types == plosive_type_names.index('aspirated')
+        valid &= ~(unaspirated[:, None] & t.is_plosive & t.is_aspirated)
+        valid &= ~(aspirated[:, None] & t.is_plosive & ~t.is_aspirated)
+
+        # ----- Non-english phonemes ----- #
+        force_english = self.chance(lang_gen.FORCE_ENGLISH_PHONEMES_CHANCE)
+        drop_non_english_chance = numpy.where(force_english, 100, self.choice(lang_gen.DROP_NON_ENGLISH_PHONEME_CHANCES))
+        self.non_english_phoneme_chances = 100 - drop_non_english_chance
+        valid &= ~(t.is_non_english & (self.random_state.random_sample(valid.shape) * 100 < drop_non_english_chance[:, None]))
+
+        # ----- A few random consonants ----- #
+        drop_random = (valid.sum(axis=1) >= lang_gen.DROP_RANDOM_CONSONANT_THRESHHOLD) & self.chance(lang_gen.DROP_RANDOM_CONSONANT_CHANCE)
+        amounts = numpy.where(drop_random, self.choice(lang_gen.DROP_RANDOM_CONSONANT_AMOUNTS), 0)
+        valid &= self.random_ranks(allowed=valid) >= amounts[:, None]
+
+        self.valid_consonants = valid
+
+    def generate_nuclei(self):
+        ''' Choose each language's vowels and their probabilities, following Language.generate_valid_nuclei() '''
+        t = self.tables
+        drop_all_diphthongs = self.chance(lang_gen.DROP_ALL_DIPHTHONGS_CHANCE)
+        drop_all_lax = drop_all_diphthongs & self.chance(lang_gen.DROP_ALL_LAX_MONPHTHONGS_CHANCE)
+        drop_all_rounded = ~drop_all_diphthongs & self.chance(lang_gen.DROP_ALL_ROUNDED_CHANCE)
+
+        valid = ~(drop_all_diphthongs[:, None] & t.is_diphthong)
+        valid &= ~(drop_all_lax[:, None] & t.is_lax)
+        valid &= ~(drop_all_rounded[:, None] & t.is_rounded)
+
+        # Drop random vowels
+        random_drop_chance = numpy.where(t.is_diphthong, lang_gen.DROP_RANDOM_DIPHTHONG_CHANCE, lang_gen.DROP_RANDOM_MONOPHTHONG_CHANCE)
+        valid &= self.random_state.random_sample(valid.shape) * 100 >= random_drop_chance
+
+        # Bring languages with too few vowels up to MIN_NUM_VOWELS, with randomly chosen extra ones
+        missing = numpy.maximum(lang_gen.MIN_NUM_VOWELS - valid.sum(axis=1), 0)
+        valid |= self.random_ranks(allowed=~valid) < missing[:, None]
+
+        weights = numpy.where(valid, self.component_probabilities(component_type='nucleus'), 0)
+
+        # A diphthong can't be the most probable vowel, so swap it with the most probable monophthong
+        rows = numpy.arange(self.size)
+        most_probable = weights.argmax(axis=1)
+        monophthong_weights = numpy.where(t.is_diphthong, 0, weights)
+        most_probable_monophthong = monophthong_weights.argmax(axis=1)
+        swap = t.is_diphthong[most_probable] & (monophthong_weights[rows, most_probable_monophthong] > 0)
+
+        rows, most_probable, most_probable_monophthong = rows[swap], most_probable[swap], most_probable_monophthong[swap]
+        weights[rows, most_probable], weights[rows, most_probable_monophthong] = \
+            weights[rows, most_probable_monophthong], weights[rows, most_probable]
+
+        self.weights = {'nucleus': weights}
+
+    def generate_syllable_rules(self):
+        ''' Complexity and voicing restrictions on onsets and codas, and the multipliers for empty ones '''
+        self.no_complex_onsets = self.chance(lang_gen.DROP_COMPLEX_ONSETS_CHANCE)
+        self.no_complex_codas  = self.chance(lang_gen.DROP_COMPLEX_CODAS_CHANCE)
+        self.no_onset_multiplier = self.choice(lang_gen.NO_ONSET_MULTIPLIERS)
+        self.no_coda_multiplier  = self.choice(lang_gen.NO_CODA_MULTIPLIERS)
+
+        no_language_voicing_restriction = self.language_voicing_restriction == -1
+
+        restrict = self.chance(lang_gen.ONSET_RESTRICT_VOICING_CHANCE) & no_language_voicing_restriction
+        self.onset_voicing_restriction        = numpy.where(restrict, self.choice((0, 1)), -1)
+        self.invert_onset_voicing_restriction = numpy.where(restrict, self.choice((0, 1)), -1)
+
+        # As in Language, an unvoiced (0) onset restriction still allows a coda restriction
+        restrict = self.chance(lang_gen.CODA_RESTRICT_VOICING_CHANCE) & no_language_voicing_restriction & \
+                   (self.onset_voicing_restriction != 1)
+        self.coda_voicing_restriction        = numpy.where(restrict, self.choice((0, 1)), -1)
+        self.invert_coda_voicing_restriction = numpy.where(restrict, self.choice((0, 1)), -1)
+
+    def generate_component_weights(self, component_type):
+        ''' Onset or coda probabilities, following Language.generate_valid_onsets() / generate_valid_codas() '''
+        t = self.tables
+        no_complex  = {'onset': self.no_complex_onsets,         'coda': self.no_complex_codas}[component_type]
+        restriction = {'onset': self.onset_voicing_restriction, 'coda': self.coda_voicing_restriction}[component_type]
+        invert      = {'onset': self.invert_onset_voicing_restriction, 'coda': self.invert_coda_voicing_restriction}[component_type]
+        multiplier  = {'onset': self.no_onset_multiplier,       'coda': self.no_coda_multiplier}[component_type]
+
+        # A component is valid if none of its consonants have been dropped
+        valid = (~self.valid_consonants).astype(numpy.float32).dot(t.incidence[component_type]) == 0
+        valid &= ~(no_complex[:, None] & t.is_complex[component_type])
+
+        # With a voicing restriction, the component's edge consonant can't match it (or must, if it's inverted)
+        matches_restriction = t.edge_voicing[component_type] == restriction[:, None]
+        valid &= ~((restriction[:, None] != -1) & (matches_restriction != (invert[:, None] == 1)))
+
+        weights = numpy.where(valid, self.component_probabilities(component_type=component_type), 0)
+        empty_weights = (weights.sum(axis=1) * multiplier).astype(numpy.int32)
+
+        return numpy.column_stack((weights, empty_weights))
+
+    # ----------------------------------- Materializing ----------------------------------- #
+
+    def get_properties(self, index):
+        ''' The Language.properties of a row '''
+        def optional(values):
+            return int(values[index]) if values[index] != -1 else None
+
+        return {
+            'language_voicing_restriction':     optional(self.language_voicing_restriction),
+            'plosive_types':                    lang_gen.PLOSIVE_TYPES.keys()[self.plosive_types[index]],
+            'non_english_phoneme_chances':      int(self.non_english_phoneme_chances[index]),
+            'no_complex_onsets':                int(self.no_complex_onsets[index]),
+            'no_complex_codas':                 int(self.no_complex_codas[index]),
+            'no_onset_multiplier':              self.no_onset_multiplier[index].item(),
+            'no_coda_multiplier':               self.no_coda_multiplier[index].item(),
+            'onset_voicing_restriction':        optional(self.onset_voicing_restriction),
+            'invert_onset_voicing_restriction': optional(self.invert_onset_voicing_restriction),
+            'coda_voicing_restriction':         optional(self.coda_voicing_restriction),
+            'invert_coda_voicing_restriction':  optional(self.invert_coda_voicing_restriction),
+        }
+
+    def get_stage_logs(self, index, language):
+        ''' The log a Language would have kept of the rules that got flagged for this row, by stage '''
+        consonant_log = []
+        if self.dropped_method[index] != -1:
+            consonant_log.append('Dropping all {0}s'.format(self.phoneme_data.consonant_methods[self.dropped_method[index]]))
+        if self.dropped_dentals[index]:
+            consonant_log.append('Dropping dentals')
+        if self.dropped_location[index] != -1:
+            consonant_log.append('Dropping all {0}s'.format(self.phoneme_data.consonant_locations[self.dropped_location[index]]))
+        if language.properties['language_voicing_restriction'] is not None:
+            consonant_log.append('Dropping with voicing of {0}'.format(language.properties['language_voicing_restriction']))
+        consonant_log.append('Allow {0} plosives'.format(language.properties['plosive_types']))
+
+        if language.properties['non_english_phoneme_chances'] == 0:
+            consonant_log.append('All phonemes must be English')
+        else:
+            consonant_log.append('{0}% chance of dropping non-english phonemes'.format(100 - language.properties['non_english_phoneme_chances']))
+
+        syllable_log = list(language.describe_syllable_level_rules())
+        syllable_log.append('No onset mutiplier: {0}'.format(language.properties['no_onset_multiplier']))
+        syllable_log.append('No coda mutiplier: {0}'.format(language.properties['no_coda_multiplier']))
+        syllable_log.append('Consonants: {0}; Vowels: {1}\n'.format(len(language.valid_consonants), len(language.probabilities['nucleus'])))
+
+        return {'consonants': consonant_log, 'nuclei': [], 'syllable rules': [], 'syllable components': syllable_log}
+
+    def get_language(self, index):
+        ''' Build the Language for one row of the batch. Its orthography is generated as usual, from
+            its own seed, the first time it's needed '''
+        language = lang_gen.Language(seed=int(self.language_seeds[index]), phoneme_data=self.phoneme_data)
+        # Everything but the orthography comes from the batch, so none of those stages get generated
+        language.generated_stages.update(lang_gen.LOGGING_STAGES)
+        language.properties.update(self.get_properties(index))
+
+        language.valid_consonants = p.PhonemeInventory(c for c, valid in zip(self.tables.consonants, self.valid_consonants[index]) if valid)
+
+        for component_type in ('onset', 'coda', 'nucleus'):
+            weights = self.weights[component_type][index]
+            # The empty onset / coda is always kept, even with no weight
+            columns = numpy.flatnonzero(weights != 0)
+            if component_type != 'nucleus' and (not len(columns) or columns[-1] != len(weights) - 1):
+                columns = numpy.append(columns, len(weights) - 1)
+            language.probabilities[component_type] = ComponentWeights(self.phoneme_data, ids=self.tables.component_ids[component_type][columns].tolist(),
+                                                                      weights=weights[columns].tolist())
+
+        language.probabilities['nucleus_monophthong'] = language.probabilities['nucleus'].select(lambda nucleus: not nucleus.phonemes[0].is_diphthong())
+        language.valid_vowels = p.PhonemeInventory(nucleus.phonemes[0] for nucleus in language.probabilities['nucleus'])
+
+        language.stage_logs.update(self.get_stage_logs(index, language))
+
+        return language
+
+
+def generate_batches(number_of_languages, batch_size=DEFAULT_BATCH_SIZE, seed=None, phoneme_data=None):
+    ''' Yields LanguageBatches until number_of_languages have been generated. Each batch gets
+        its own seed, drawn from the given one, so the whole run can be reproduced from it '''
+    seeds = random.Random(seed)
+    while number_of_languages > 0:
+        size = min(batch_size, number_of_languages)
+        yield LanguageBatch(size=size, seed=seeds.randint(0, MAX_SEED), phoneme_data=phoneme_data)
+        number_of_languages -= size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate languages in batches, and compare the speed with generating them one at a time')
+    parser.add_argument('--languages', type=int, default=100000, help='Number of languages to generate')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--compare', type=int, default=500, help='Number of languages to generate one at a time, for comparison')
+    args = parser.parse_args()
+
+    start = time.time()
+    consonant_counts = numpy.concatenate([batch.consonant_counts for batch in generate_batches(args.languages, args.batch_size, args.seed)])
+    batch_elapsed = time.time() - start
+
+    print 'Batched:     {0} languages in {1:.2f}s ({2:.0f} languages/sec)'.format(args.languages, batch_elapsed, args.languages / batch_elapsed)
+    print '             {0:.1f} consonants on average'.format(consonant_counts.mean())
+
+    if args.compare:
+        start = time.time()
+        counts = []
+        for i in xrange(args.compare):
+            language = lang_gen.Language()
+            language.generate_language_properties()
+            counts.append(len(language.valid_consonants))
+        single_elapsed = time.time() - start
+
+        print 'One by one:  {0} languages in {1:.2f}s ({2:.0f} languages/sec)'.format(args.compare, single_elapsed, args.compare / single_elapsed)
+        print '             {0:.1f} consonants on average'.format(numpy.mean(counts))
+
+
+if __name__ == '__main__':
+    main()
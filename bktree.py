@@ -0,0 +1,155 @@
+from __future__ import division, unicode_literals
+
+import phonemes as p
+
+'''
+Finds words which sound nearly the same, such as two words differing only in a coda. Words
+are compared by the edit distance of their phonemes (the empty onset / coda placeholders
+don't count), and kept in a BKTree, which answers "every word within distance d of this one"
+without comparing it against most of the others:
+
+    tree = BKTree()
+    for meaning, word in language.vocabulary.iteritems():
+        tree.add(word.phoneme_ids, meaning)
+    tree.find_within(word.phoneme_ids, 1)      # [(distance, phoneme ids, [meanings]), ...]
+
+Each node of the tree keeps its children by their distance from it. As the distance is a
+metric, a word within d of the query can only be under a child whose distance from the node
+is within d of the query's own distance from the node, so the other children are skipped.
+
+With weighted distances (PhonemeDistance(weighted=True)), swapping a phoneme for a similar
+one costs less than a whole phoneme: two consonants cost the fraction of their location,
+method, voicing and special features which differ, and two vowels the fraction of their
+position, manner and lips. So /p/ -> /b/ costs 1/4, while /p/ -> /a/ costs 1, the same as
+adding or dropping a phoneme. That's still a metric, so the tree works the same way.
+'''
+
+# Phoneme ids from here up are the empty onset / coda placeholders
+EMPTY_PHONEME_ID_BASE = 300
+
+# Weighted distances are counted in whole units, so distances from a node are exact; this many to a
+# phoneme, as consonants have 4 features and vowels 3
+FEATURE_DISTANCE_SCALE = 12
+
+CONSONANT_FEATURES = ('location', 'method', 'voicing', 'special')
+VOWEL_FEATURES = ('position', 'manner', 'lips')
+
+
+def get_key(phoneme_ids):
+    ''' The phoneme ids which are compared, without the empty placeholders '''
+    return tuple(phoneme_id for phoneme_id in phoneme_ids if phoneme_id < EMPTY_PHONEME_ID_BASE)
+
+
+def get_substitution_cost(phoneme, other_phoneme):
+    ''' The cost of swapping one phoneme for another, in units of FEATURE_DISTANCE_SCALE '''
+    if phoneme is other_phoneme:
+        return 0
+
+    for phoneme_class, features in ((p.Consonant, CONSONANT_FEATURES), (p.Vowel, VOWEL_FEATURES)):
+        if isinstance(phoneme, phoneme_class) and isinstance(other_phoneme, phoneme_class):
+            differences = sum(getattr(phoneme, feature) != getattr(other_phoneme, feature) for feature in features)
+            # Two different phonemes are never free to swap, even if their features are all the same
+            return max(1, differences * FEATURE_DISTANCE_SCALE // len(features))
+
+    return FEATURE_DISTANCE_SCALE
+
+
+# The substitution cost of every pair of phonemes, by id; built the first time it's needed
+SUBSTITUTION_COSTS = {}
+
+def get_substitution_costs():
+    if not SUBSTITUTION_COSTS:
+        for phoneme in p.PHONEMES_BY_ID.itervalues():
+            SUBSTITUTION_COSTS[phoneme.id_] = {other_phoneme.id_: get_substitution_cost(phoneme, other_phoneme)
+                                               for other_phoneme in p.PHONEMES_BY_ID.itervalues()}
+    return SUBSTITUTION_COSTS
+
+
+class PhonemeDistance:
+    ''' Edit distance between keys (see get_key), in whole units; there are scale units to a phoneme '''
+    def __init__(self, weighted=False):
+        self.weighted = weighted
+        self.scale = FEATURE_DISTANCE_SCALE if weighted else 1
+        self.substitution_costs = get_substitution_costs() if weighted else None
+
+    def __call__(self, key, other_key):
+        scale = self.scale
+        previous_row = range(0, (len(other_key) + 1) * scale, scale)
+
+        for i, phoneme_id in enumerate(key, 1):
+            costs = self.substitution_costs[phoneme_id] if self.weighted else None
+            row = [i * scale]
+            for j, other_phoneme_id in enumerate(other_key, 1):
+                if phoneme_id == other_phoneme_id:
+                    substitution = previous_row[j - 1]
+                else:
+                    substitution = previous_row[j - 1] + (costs[other_phoneme_id] if costs is not None else 1)
+                row.append(min(substitution, previous_row[j] + scale, row[j - 1] + scale))
+            previous_row = row
+
+        return previous_row[-1]
+
+
+class BKTree:
+    ''' Phoneme id sequences and the values stored with them, indexed by PhonemeDistance '''
+    def __init__(self, distance=None):
+        self.distance = distance if distance is not None else PhonemeDistance()
+        # Nodes are [key, values, {distance from the node: child node}]
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, phoneme_ids, value=None):
+        ''' Values added with the same phonemes share a node '''
+        key = get_key(phoneme_ids)
+        self.size += 1
+
+        if self.root is None:
+            self.root = [key, [value], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = self.distance(key, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            if distance not in node[2]:
+                node[2][distance] = [key, [value], {}]
+                return
+            node = node[2][distance]
+
+    def find_within(self, phoneme_ids, distance):
+        ''' Every key within the distance (in phonemes) of the phoneme ids, nearest first, as (distance, key, values) '''
+        key = get_key(phoneme_ids)
+        # A whole number of units, allowing for the distance having been given as a fraction
+        maximum = int(distance * self.distance.scale + 1e-9)
+
+        matches = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node = nodes.pop()
+            node_distance = self.distance(key, node[0])
+            if node_distance <= maximum:
+                matches.append((node_distance, node[0], node[1]))
+            for child_distance, child in node[2].iteritems():
+                if node_distance - maximum <= child_distance <= node_distance + maximum:
+                    nodes.append(child)
+
+        matches.sort(key=lambda match: match[:2])
+        return [(node_distance / self.distance.scale, node_key, values) for node_distance, node_key, values in matches]
+
+
+def find_near_duplicates(items, distance, weighted=False):
+    ''' Every pair of items whose phonemes are within the distance of each other, as (value, value of an
+        earlier item, distance), from (phoneme ids, value) items. Each item is checked against the ones
+        before it as it's added, so the pairs come out in item order '''
+    tree = BKTree(distance=PhonemeDistance(weighted=weighted))
+    pairs = []
+    for phoneme_ids, value in items:
+        for pair_distance, _, values in tree.find_within(phoneme_ids, distance):
+            pairs.extend((value, other_value, pair_distance) for other_value in values)
+        tree.add(phoneme_ids, value)
+    return pairs
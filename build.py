@@ -0,0 +1,35 @@
+from __future__ import division, unicode_literals
+import os
+import glob
+
+import phonemes
+import phoneme_arrays
+import language_page
+
+'''
+Build step to run before deploying. Precompiles the page template into python modules and
+writes out the compiled phoneme tables for every rule file in rules/, so that a new instance
+can load both instead of building them. The tables are also written as arrays, which worker
+processes memory map (see phoneme_arrays.py).
+
+    python build.py
+'''
+
+
+def build():
+    jinja_environment = language_page.create_jinja_environment(use_compiled_templates=False)
+    jinja_environment.compile_templates(language_page.COMPILED_TEMPLATE_DIRECTORY, zip=None,
+                                        filter_func=lambda template_name: template_name == language_page.PAGE_TEMPLATE)
+    print 'Compiled {0} to {1}'.format(language_page.PAGE_TEMPLATE, language_page.COMPILED_TEMPLATE_DIRECTORY)
+
+    for rule_file in sorted(glob.glob(os.path.join(os.path.dirname(phonemes.DEFAULT_RULE_FILE), '*.rules'))):
+        phoneme_data = phonemes.get_phoneme_data(rule_file)
+        artifact_path = phonemes.save_phoneme_data(phoneme_data)
+        print 'Wrote phoneme tables for {0} to {1}'.format(rule_file, artifact_path)
+
+        array_path = phoneme_arrays.save_phoneme_arrays(phoneme_arrays.encode_phoneme_data(phoneme_data), phoneme_arrays.get_array_path(phoneme_data.rule_set))
+        print 'Wrote phoneme arrays for {0} to {1}'.format(rule_file, array_path)
+
+
+if __name__ == '__main__':
+    build()
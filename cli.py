@@ -0,0 +1,282 @@
+from __future__ import division, unicode_literals
+import io
+import os
+import sys
+import errno
+import csv
+import json
+import time
+import random
+import hashlib
+import argparse
+import subprocess
+import itertools
+import multiprocessing
+from collections import OrderedDict, deque
+
+import lang_gen
+import phonemes as p
+from helpers import parse_seed_range
+from random_source import RandomSource, derive_seed
+
+'''
+Generates languages and words in bulk, streaming them out as JSONL or CSV:
+
+    python -m lang_gen --seeds 0-9999 --words 1000 --syllables 1:1,2:3,3:1 --workers 4 --output words.jsonl
+    python -m lang_gen --languages 500 --words 0 --format csv
+
+With --words 0 (and no --compounds) there's one record per language - its seed, consonants
+and properties. Otherwise there's one record per word, with the seed of its language, its
+phoneme ids, its spelling, and for compounds, its meaning and etymology.
+
+Languages are split into tasks of WORDS_PER_TASK words, and only a few tasks per worker are
+queued at a time, so memory use stays flat however many languages and words are generated.
+Records come out in seed order whatever the number of workers.
+
+Reproducibility: each task's words are drawn from a random source of their own, seeded from
+the language's seed and the task's number, so the output for a seed range is the same
+whichever workers generate it. --check-reproducible checks this, by generating the records
+in fresh processes with different hash seeds (which reorder every set and dict) and numbers of
+workers, and comparing them:
+
+    python -m lang_gen --seeds 0-99 --words 50 --compounds --check-reproducible
+
+tests/test_reproducible.py runs the same check as part of the test suite.
+'''
+
+# How many words of a language each task generates
+WORDS_PER_TASK = 1000
+# How many tasks are queued up for each worker at a time
+TASKS_QUEUED_PER_WORKER = 2
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 5
+
+# The hash seed and number of workers of each run which --check-reproducible compares
+REPRODUCIBILITY_CHECK_RUNS = (('0', 1), ('2', 1), ('3', 2))
+
+# Record fields, in CSV column order
+WORD_FIELDS = ('seed', 'word', 'meaning', 'spelling', 'phoneme_ids', 'syllables', 'etymology')
+LANGUAGE_FIELDS = ('seed', 'consonant_ids', 'vowels', 'onsets', 'codas') + tuple(sorted(lang_gen.PROPERTY_STAGES))
+
+
+def parse_syllable_weights(text):
+    ''' "1,2,3" (equally likely) or "1:1,2:3,3:1" (number of syllables:weight) '''
+    weights = OrderedDict()
+    for item in text.split(','):
+        syllables, _, weight = item.partition(':')
+        weights[int(syllables)] = float(weight or 1)
+    return weights
+
+
+def describe_word(word, seed, index):
+    return {
+        'seed':         seed,
+        'word':         index,
+        'meaning':      word.meaning,
+        'spelling':     word.language.orthography.phon_to_orth(word=word),
+        'phoneme_ids':  list(word.phoneme_ids),
+        'syllables':    len(word.syllables),
+        'etymology':    [[unicode(root_word), english_morpheme] for root_word, english_morpheme in word.etymology or ()],
+    }
+
+
+def describe_language(language):
+    record = {
+        'seed':             language.seed,
+        'consonant_ids':    sorted(consonant.id_ for consonant in language.valid_consonants),
+        'vowels':           len(language.probabilities['nucleus']),
+        # Not counting the empty onset / coda
+        'onsets':           len(language.probabilities['onset']) - 1,
+        'codas':            len(language.probabilities['coda']) - 1,
+    }
+    for key in lang_gen.PROPERTY_STAGES:
+        record[key] = language.properties[key]
+    return record
+
+
+# ------------------------------------------ Tasks ------------------------------------------ #
+
+def generate_records(task):
+    ''' Worker: the records for one task, which is either a whole language (when no words are wanted),
+        or one language's compounds and/or a run of its words '''
+    seed, task_number, number_of_words, syllable_weights, compounds, rule_file = task
+    phoneme_data = p.get_phoneme_data(rule_file) if rule_file else None
+    language = lang_gen.Language(seed=seed, phoneme_data=phoneme_data)
+
+    if not number_of_words and not compounds:
+        return [describe_language(language)]
+
+    records = []
+    first_index = task_number * WORDS_PER_TASK
+
+    if compounds and task_number == 0:
+        language.rng = RandomSource(seed=derive_seed(seed, 'compounds'))
+        records.extend(describe_word(word, seed, index=None) for word in language.get_sample_word_sets())
+
+    language.rng = RandomSource(seed=derive_seed(seed, 'words {0}'.format(task_number)))
+    for index in xrange(first_index, first_index + number_of_words):
+        word = language.create_word(meaning=None, number_of_syllables=language.rng.weighted_choice(syllable_weights))
+        records.append(describe_word(word, seed, index=index))
+
+    return records
+
+
+def get_tasks_per_language(words):
+    ''' A language with no words (but perhaps compounds) still gets one task '''
+    return max(1, -(-words // WORDS_PER_TASK))
+
+
+def generate_tasks(seeds, words, syllable_weights, compounds, rule_file):
+    for seed in seeds:
+        for task_number in xrange(get_tasks_per_language(words)):
+            number_of_words = min(WORDS_PER_TASK, words - task_number * WORDS_PER_TASK)
+            yield seed, task_number, number_of_words, syllable_weights, compounds, rule_file
+
+
+def run_tasks(tasks, workers=None):
+    ''' A generator of each task's records, in order. Only a few tasks per worker are queued at a time '''
+    if workers == 1:
+        for task in tasks:
+            yield generate_records(task)
+        return
+
+    pool = multiprocessing.Pool(processes=workers)
+    pending = deque(pool.apply_async(generate_records, (task,)) for task in
+                    itertools.islice(tasks, TASKS_QUEUED_PER_WORKER * (workers or multiprocessing.cpu_count())))
+    try:
+        while pending:
+            records = pending.popleft().get()
+            for task in itertools.islice(tasks, 1):
+                pending.append(pool.apply_async(generate_records, (task,)))
+            yield records
+    finally:
+        pool.terminate()
+
+
+# ------------------------------------------ Output ------------------------------------------ #
+
+class JSONLinesWriter:
+    def __init__(self, output_file, fields):
+        self.output_file = output_file
+        self.fields = fields
+
+    def write(self, record):
+        line = json.dumps(OrderedDict((field, record[field]) for field in self.fields), ensure_ascii=False)
+        self.output_file.write(line.encode('utf-8') + b'\n')
+
+
+class CSVWriter:
+    ''' Lists are written space separated, and etymologies as "root (morpheme); root (morpheme)" '''
+    def __init__(self, output_file, fields):
+        self.fields = fields
+        self.writer = csv.writer(output_file)
+        self.writer.writerow([field.encode('utf-8') for field in fields])
+
+    def format_value(self, field, value):
+        if value is None:
+            return b''
+        elif field == 'etymology':
+            value = '; '.join('{0} ({1})'.format(root_word, english_morpheme) for root_word, english_morpheme in value)
+        elif isinstance(value, list):
+            value = ' '.join(unicode(item) for item in value)
+        return unicode(value).encode('utf-8')
+
+    def write(self, record):
+        self.writer.writerow([self.format_value(field, record[field]) for field in self.fields])
+
+
+OUTPUT_FORMATS = {'jsonl': JSONLinesWriter, 'csv': CSVWriter}
+
+
+def check_reproducible(arguments, report):
+    ''' Run the tool with the arguments in fresh processes, and check that they all write the same records.
+        Returns True if they do '''
+    source_path = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+    digests = []
+
+    for hash_seed, workers in REPRODUCIBILITY_CHECK_RUNS:
+        command = [sys.executable, source_path] + arguments + ['--quiet', '--output', '-', '--workers', str(workers)]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, env=dict(os.environ, PYTHONHASHSEED=hash_seed))
+
+        # Hashed as it's read, so the records never have to be held in memory
+        digest = hashlib.sha1()
+        for chunk in iter(lambda: process.stdout.read(2**16), b''):
+            digest.update(chunk)
+        if process.wait():
+            raise subprocess.CalledProcessError(process.returncode, command)
+
+        digests.append(digest.hexdigest())
+        report('Hash seed {0}, {1} worker(s): {2}'.format(hash_seed, workers, digests[-1]))
+
+    return len(set(digests)) == 1
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m lang_gen', description='Generate languages and words, streamed out as JSONL or CSV')
+    parser.add_argument('--seeds', '--seed', type=parse_seed_range, default=None, help='Seed range of the languages, such as 0-9999')
+    parser.add_argument('--languages', type=int, default=1, help='Number of languages, starting from a random seed, if --seeds isn\'t given')
+    parser.add_argument('--words', type=int, default=100, help='Words per language; 0 for one record per language')
+    parser.add_argument('--syllables', type=parse_syllable_weights, default=parse_syllable_weights('1,2,3'),
+                        help='Syllables per word, such as 1,2,3 or 1:1,2:3,3:1 (syllables:weight)')
+    parser.add_argument('--compounds', action='store_true', help='Also generate the sample compound place names of each language')
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default=None, help='Output format (default: from the output\'s extension, or jsonl)')
+    parser.add_argument('--output', '-o', default='-', help='Where to write the records (default: stdout)')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes (0 for one per core)')
+    parser.add_argument('--rules', default=None, help='Rule file the languages use')
+    parser.add_argument('--quiet', '-q', action='store_true', help='No progress reports')
+    parser.add_argument('--check-reproducible', action='store_true',
+                        help='Instead of writing the records, check that they come out the same across processes, hash seeds and workers')
+    args = parser.parse_args()
+
+    if args.check_reproducible:
+        if args.seeds is None:
+            parser.error('--check-reproducible needs --seeds')
+        reproducible = check_reproducible([argument for argument in sys.argv[1:] if argument != '--check-reproducible'],
+                                          report=lambda text: sys.stderr.write(text + '\n'))
+        print 'Reproducible' if reproducible else 'NOT reproducible: the runs wrote different records'
+        sys.exit(0 if reproducible else 1)
+
+    if args.seeds is None:
+        start = random.randint(0, 32000)
+        args.seeds = xrange(start, start + args.languages)
+    output_format = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+
+    def report(text):
+        if not args.quiet:
+            sys.stderr.write(text + '\n')
+
+    report('Generating seeds {0}-{1}'.format(args.seeds[0], args.seeds[-1]))
+
+    word_records = args.words or args.compounds
+    tasks = generate_tasks(args.seeds, words=args.words, syllable_weights=args.syllables, compounds=args.compounds, rule_file=args.rules)
+    tasks_per_language = get_tasks_per_language(args.words)
+    output_file = io.open(sys.stdout.fileno() if args.output == '-' else args.output, 'wb', closefd=args.output != '-')
+
+    start = last_report = time.time()
+    records_written = 0
+    try:
+        with output_file:
+            writer = OUTPUT_FORMATS[output_format](output_file, fields=WORD_FIELDS if word_records else LANGUAGE_FIELDS)
+            for tasks_done, records in enumerate(run_tasks(tasks, workers=args.workers or None), 1):
+                for record in records:
+                    writer.write(record)
+                records_written += len(records)
+
+                if time.time() - last_report >= PROGRESS_INTERVAL:
+                    last_report = time.time()
+                    report('{0}/{1} languages, {2} records, {3:.0f} records/s'.format(
+                        tasks_done // tasks_per_language, len(args.seeds), records_written, records_written / (last_report - start)))
+    except IOError as error:
+        # The output was closed early (such as by piping into head), which is fine
+        if error.errno != errno.EPIPE:
+            raise
+        return
+
+    elapsed = time.time() - start
+    report('Wrote {0} records for {1} languages in {2:.2f}s ({3:.0f} records/s)'.format(
+        records_written, len(args.seeds), elapsed, records_written / max(elapsed, 1e-6)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+from __future__ import division, unicode_literals
+import io
+import os
+import sys
+import mmap
+import json
+import time
+import struct
+import argparse
+import multiprocessing
+from collections import Counter
+
+import numpy
+
+import lang_gen
+import phonemes as p
+from helpers import parse_seed_range
+from lexicon import EMPTY_PHONEME_ID_BASE
+
+'''
+The same meanings in many languages, side by side: a table with a row per meaning and a
+column per language (by seed), where each cell is a word's phoneme ids and its spelling.
+
+The table is written to a columnar file, which keeps each language's column in one block:
+
+    phoneme_offsets     int32, meanings + 1; the phoneme ids of meaning i are
+                        phoneme_ids[phoneme_offsets[i]:phoneme_offsets[i + 1]]
+    spelling_offsets    int32, meanings + 1; the same, into spellings
+    phoneme_ids         int16, the words' phoneme ids one after another (without the empty
+                        onset / coda placeholders)
+    spellings           the words' spellings, UTF-8, one after another
+
+after a JSON header (the meanings and the rule set) and a directory of where each language's
+column is (COLUMN_DIRECTORY_DTYPE). Like the phoneme arrays (see phoneme_arrays.py), the file
+is memory mapped and the arrays are read straight out of it, so opening a file reads its header
+and directory, and looking at one language's column reads that column's pages and nothing else:
+
+    lexicon = open_comparative_lexicon('build/comparative.bin')
+    column = lexicon.get_column(seed=42)
+    column.get_spelling('horse')
+
+Columns are generated in worker processes (build_comparative_lexicon), a task of seeds at a
+time, and written out as they come back, so the whole table is never in memory at once. Each
+language makes its words in the order of the meanings, so a column depends only on the seed and
+the meaning list, however the work is split up.
+'''
+
+# Start of every comparative lexicon file, followed by the length of the JSON header
+FILE_MAGIC = b'CMPLX001'
+HEADER_LENGTH = struct.Struct(b'<I')
+# Columns, and the arrays in them, start on multiples of this many bytes
+ARRAY_ALIGNMENT = 16
+
+# Where each language's column is: its first byte, and the number of phoneme ids and bytes of spellings in it
+COLUMN_DIRECTORY_DTYPE = numpy.dtype([(b'seed', b'<i8'), (b'offset', b'<i8'), (b'phoneme_count', b'<i8'), (b'spelling_length', b'<i8')])
+
+# How many languages each worker generates at a time
+LANGUAGES_PER_TASK = 20
+
+
+def align(offset):
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+def get_array_layout(number_of_meanings, phoneme_count, spelling_length):
+    ''' The (name, dtype, length, offset from the start of the column) of each array of a column, and the
+        column's length '''
+    layout = []
+    offset = 0
+    for name, dtype, length in (('phoneme_offsets', numpy.dtype(b'<i4'), number_of_meanings + 1),
+                                ('spelling_offsets', numpy.dtype(b'<i4'), number_of_meanings + 1),
+                                ('phoneme_ids', numpy.dtype(b'<i2'), phoneme_count),
+                                ('spellings', numpy.dtype(b'u1'), spelling_length)):
+        layout.append((name, dtype, length, offset))
+        offset = align(offset + dtype.itemsize * length)
+    return layout, offset
+
+
+class LanguageColumn:
+    ''' One language's words for each of the meanings, as arrays '''
+    def __init__(self, seed, meanings, arrays):
+        self.seed = seed
+        self.meanings = meanings
+        self.rows = {meaning: row for row, meaning in enumerate(meanings)}
+
+        self.phoneme_offsets = arrays['phoneme_offsets']
+        self.spelling_offsets = arrays['spelling_offsets']
+        self.phoneme_ids = arrays['phoneme_ids']
+        self.spellings = arrays['spellings']
+
+    def __len__(self):
+        return len(self.meanings)
+
+    def get_phoneme_ids(self, meaning):
+        row = self.rows[meaning]
+        return tuple(self.phoneme_ids[self.phoneme_offsets[row]:self.phoneme_offsets[row + 1]].tolist())
+
+    def get_spelling(self, meaning):
+        row = self.rows[meaning]
+        return self.spellings[self.spelling_offsets[row]:self.spelling_offsets[row + 1]].tobytes().decode('utf-8')
+
+    def get_spellings(self):
+        ''' Every spelling, in meaning order '''
+        # The offsets count bytes, so split the bytes before decoding them
+        encoded = self.spellings.tobytes()
+        return [encoded[start:end].decode('utf-8') for start, end in zip(self.spelling_offsets[:-1].tolist(), self.spelling_offsets[1:].tolist())]
+
+
+def make_column(language, meanings):
+    ''' The LanguageColumn of a language's words for the meanings, which it makes in order '''
+    words = [language.get_word(meaning) for meaning in meanings]
+    phoneme_ids = [[phoneme_id for phoneme_id in word.phoneme_ids if phoneme_id < EMPTY_PHONEME_ID_BASE] for word in words]
+    spellings = [unicode(word).encode('utf-8') for word in words]
+
+    arrays = {
+        'phoneme_offsets':  numpy.cumsum([0] + [len(ids) for ids in phoneme_ids]).astype(b'<i4'),
+        'spelling_offsets': numpy.cumsum([0] + [len(spelling) for spelling in spellings]).astype(b'<i4'),
+        'phoneme_ids':      numpy.array([phoneme_id for ids in phoneme_ids for phoneme_id in ids], dtype=b'<i2'),
+        'spellings':        numpy.frombuffer(b''.join(spellings), dtype=numpy.uint8) if any(spellings) else numpy.zeros(0, dtype=numpy.uint8),
+    }
+    return LanguageColumn(seed=language.seed, meanings=meanings, arrays=arrays)
+
+
+def make_columns(task):
+    ''' Worker: the columns of the languages of a list of seeds '''
+    seeds, meanings, rule_file = task
+    phoneme_data = p.get_phoneme_data(rule_file) if rule_file else None
+    return [make_column(lang_gen.Language(seed=seed, phoneme_data=phoneme_data), meanings) for seed in seeds]
+
+
+# ------------------------------------------ Files ------------------------------------------ #
+
+class ComparativeLexicon:
+    ''' A comparative lexicon file, memory mapped; columns are read from it as they're asked for '''
+    def __init__(self, mapped, header, directory):
+        self.mapped = mapped
+        self.meanings = header['meanings']
+        self.rule_set_name = header['rule_set']
+        self.directory = directory
+        self.columns_by_seed = {seed: position for position, seed in enumerate(directory['seed'].tolist())}
+
+    def __len__(self):
+        return len(self.directory)
+
+    def get_seeds(self):
+        return self.directory['seed'].tolist()
+
+    def get_column(self, seed):
+        ''' A LanguageColumn whose arrays are views of the mapped file '''
+        entry = self.directory[self.columns_by_seed[seed]]
+        layout, _ = get_array_layout(len(self.meanings), int(entry['phoneme_count']), int(entry['spelling_length']))
+        arrays = {name: numpy.frombuffer(self.mapped, dtype=dtype, count=length, offset=int(entry['offset']) + offset)
+                  for name, dtype, length, offset in layout}
+        return LanguageColumn(seed=seed, meanings=self.meanings, arrays=arrays)
+
+    def get_row(self, meaning):
+        ''' Every language's spelling of a meaning, as [(seed, spelling)]; this reads a little of every column '''
+        return [(seed, self.get_column(seed).get_spelling(meaning)) for seed in self.get_seeds()]
+
+
+def open_comparative_lexicon(path):
+    ''' Memory map a file written by write_comparative_lexicon() '''
+    with open(path, 'rb') as lexicon_file:
+        mapped = mmap.mmap(lexicon_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mapped[:len(FILE_MAGIC)] != FILE_MAGIC:
+        raise ValueError('{0} is not a comparative lexicon file'.format(path))
+
+    header_start = len(FILE_MAGIC) + HEADER_LENGTH.size
+    header_length, = HEADER_LENGTH.unpack(mapped[len(FILE_MAGIC):header_start])
+    header = json.loads(mapped[header_start:header_start + header_length].decode('utf-8'))
+
+    directory = numpy.frombuffer(mapped, dtype=COLUMN_DIRECTORY_DTYPE, count=header['languages'], offset=header['directory_offset'])
+    return ComparativeLexicon(mapped, header, directory)
+
+
+def write_comparative_lexicon(path, columns, number_of_languages, meanings, rule_set_name):
+    ''' Write LanguageColumns (any iterable, such as one which generates them as it goes) to a file. The file is
+        written under a temporary name and moved into place, so a half-written file is never opened '''
+    if os.path.dirname(path) and not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    meanings = list(meanings)
+    directory = numpy.zeros(number_of_languages, dtype=COLUMN_DIRECTORY_DTYPE)
+    # The directory's size only depends on the number of languages, so it can go straight after the header
+    header = {'meanings': meanings, 'rule_set': rule_set_name, 'languages': number_of_languages, 'directory_offset': 0}
+    header_room = len(json.dumps(header).encode('utf-8')) + 20
+    header['directory_offset'] = align(len(FILE_MAGIC) + HEADER_LENGTH.size + header_room)
+    encoded_header = json.dumps(header).encode('utf-8').ljust(header_room)
+
+    temporary_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(temporary_path, 'wb') as lexicon_file:
+        lexicon_file.write(FILE_MAGIC + HEADER_LENGTH.pack(len(encoded_header)) + encoded_header)
+
+        offset = align(header['directory_offset'] + directory.nbytes)
+        written = 0
+        for position, column in enumerate(columns):
+            if position >= number_of_languages:
+                raise ValueError('more than {0} columns'.format(number_of_languages))
+            if list(column.meanings) != meanings:
+                raise ValueError('the column for seed {0} has different meanings'.format(column.seed))
+
+            directory[position] = (column.seed, offset, len(column.phoneme_ids), len(column.spellings))
+            layout, column_length = get_array_layout(len(meanings), len(column.phoneme_ids), len(column.spellings))
+            for name, dtype, _, array_offset in layout:
+                lexicon_file.seek(offset + array_offset)
+                lexicon_file.write(numpy.ascontiguousarray(getattr(column, name), dtype=dtype).tobytes())
+            offset += column_length
+            written += 1
+
+        if written != number_of_languages:
+            raise ValueError('{0} columns were written rather than {1}'.format(written, number_of_languages))
+
+        lexicon_file.seek(header['directory_offset'])
+        lexicon_file.write(directory.tobytes())
+        lexicon_file.truncate(offset)
+    os.rename(temporary_path, path)
+
+    return path
+
+
+def build_comparative_lexicon(path, seeds, meanings=lang_gen.SAMPLE_VOCABULARY_WORDS, processes=1, rule_file=None):
+    ''' Generate the words for the meanings in the languages of the seeds, and write them to a file '''
+    seeds = list(seeds)
+    meanings = list(meanings)
+    # Spellings are looked up by meaning, so a repeated meaning would have two rows and only the last found
+    repeated = sorted(meaning for meaning, count in Counter(meanings).iteritems() if count > 1)
+    if repeated:
+        raise ValueError('meanings are repeated: {0}'.format(', '.join(repeated)))
+
+    tasks = [(seeds[start:start + LANGUAGES_PER_TASK], meanings, rule_file) for start in xrange(0, len(seeds), LANGUAGES_PER_TASK)]
+
+    if processes == 1:
+        results = (make_columns(task) for task in tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes=processes)
+        results = pool.imap(make_columns, tasks)
+
+    rule_set = p.get_phoneme_data(rule_file).rule_set if rule_file else p.data.rule_set
+    try:
+        return write_comparative_lexicon(path, (column for task_columns in results for column in task_columns),
+                                         number_of_languages=len(seeds), meanings=meanings, rule_set_name=rule_set.name)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the same meanings in many languages to a comparative lexicon file')
+    parser.add_argument('output', help='Comparative lexicon file to write (or read, with --read)')
+    parser.add_argument('--seeds', type=parse_seed_range, default=parse_seed_range('0-99'), help='Seed range of the languages, such as 0-999')
+    parser.add_argument('--meanings', default=None, help='File of meanings, one per line (by default, the sample vocabulary)')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes to generate the languages (0 for one per core)')
+    parser.add_argument('--rules', default=None, help='Rule file the languages use')
+    parser.add_argument('--read', action='store_true', help='Read an existing file rather than writing one')
+    parser.add_argument('--show', type=int, action='append', default=[], help='Print the column of this seed')
+    args = parser.parse_args()
+
+    # Spellings have characters outside ascii, so they can't go through print when stdout is piped
+    output_file = io.open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+
+    with output_file:
+        if not args.read:
+            if args.meanings:
+                with open(args.meanings, 'rb') as meanings_file:
+                    meanings = [line.strip() for line in meanings_file.read().decode('utf-8').splitlines() if line.strip()]
+            else:
+                meanings = lang_gen.SAMPLE_VOCABULARY_WORDS
+
+            start = time.time()
+            try:
+                build_comparative_lexicon(args.output, args.seeds, meanings=meanings, processes=args.processes or None, rule_file=args.rules)
+            except ValueError as error:
+                parser.error(error)
+            output_file.write('Wrote {0} meanings in {1} languages to {2} ({3} bytes) in {4:.2f}s\n'.format(
+                len(meanings), len(args.seeds), args.output, os.path.getsize(args.output), time.time() - start))
+
+        start = time.time()
+        lexicon = open_comparative_lexicon(args.output)
+        for seed in args.show:
+            column = lexicon.get_column(seed)
+            output_file.write('Seed {0}:\n'.format(seed))
+            for meaning, spelling in zip(column.meanings, column.get_spellings()):
+                output_file.write('    {0:<12} {1}\n'.format(meaning, spelling))
+        if args.show:
+            output_file.write('Read {0} columns in {1:.1f}ms\n'.format(len(args.show), (time.time() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+from __future__ import division, unicode_literals
+from array import array
+from bisect import bisect_right
+
+import numpy
+
+'''
+A language's weights for one type of syllable component (its onsets, codas or nuclei), kept
+as two parallel arrays rather than as a dict keyed by SyllableComponent objects:
+
+    ids         the components' ids, array('H'), in the order they were added
+    weights     their weights, array('i')
+
+A language holds a few hundred components, so this is a few bytes each instead of a dict
+entry and its hashing, and the arrays can be read as numpy arrays without copying (get_ids(),
+get_weights()).
+
+ComponentWeights reads like the OrderedDict it replaces: iterating it gives the components in
+order, and "component in weights", weights[component], get(), items() and so on all work. It
+can't be written to like a dict, only added to (add()) and adjusted (set_weight()) while the
+language is generated. What the consumers need from it is worked out once and cached:
+
+    get_total()             the sum of the weights
+    choose(r)               the component a uniform r in [0, 1) falls on, by binary search over the
+                            cumulative weights; the same component RandomSource.weighted_choice()
+                            would pick from an OrderedDict with the same random number
+    get_sorted()            the components from most to least probable, ties in id order; get_top(k)
+                            is the first k of them
+    get_best_ranks()        for each phoneme id, the rank (in get_sorted()) of the most probable
+                            component it's in, so "is the phoneme in one of the top k components"
+                            is a single comparison (has_phoneme_in_top())
+'''
+
+# The rank of a phoneme which isn't in any of the components
+NO_RANK = 0xFFFF
+
+
+# For each set of phoneme data (by rule set digest), its components (including the empty onset and coda) by id
+COMPONENTS_BY_ID = {}
+
+def get_components_by_id(phoneme_data):
+    digest = phoneme_data.rule_set.digest
+    if digest not in COMPONENTS_BY_ID:
+        components = [phoneme_data.empty_onset, phoneme_data.empty_coda] + phoneme_data.id_to_component.values()
+        components_by_id = [None] * (max(component.id_ for component in components) + 1)
+        for component in components:
+            components_by_id[component.id_] = component
+        COMPONENTS_BY_ID[digest] = components_by_id
+    return COMPONENTS_BY_ID[digest]
+
+
+class ComponentWeights:
+    ''' Syllable components and their weights, with a read-only dict interface '''
+    def __init__(self, phoneme_data, ids=(), weights=()):
+        self.phoneme_data = phoneme_data
+        self.components_by_id = get_components_by_id(phoneme_data)
+        self.ids = array(b'H', ids)
+        self.weights = array(b'i', weights)
+        self.clear_caches()
+
+    def clear_caches(self):
+        # Each component's position + 1, by id (0 if it isn't here)
+        self.positions = None
+        self.clear_weight_caches()
+
+    def clear_weight_caches(self):
+        ''' Clear everything worked out from the weights '''
+        self.cumulative_weights = None
+        self.sorted_components = None
+        self.best_ranks = None
+
+    def get_positions(self):
+        if self.positions is None:
+            self.positions = array(b'H', [0]) * len(self.components_by_id)
+            for position, component_id in enumerate(self.ids):
+                self.positions[component_id] = position + 1
+        return self.positions
+
+    def get_position(self, component):
+        ''' The position of a component, or None if it isn't here '''
+        positions = self.get_positions()
+        if component is None or component.id_ >= len(positions) or not positions[component.id_]:
+            return None
+        # Components of other phoneme data can share the id
+        if self.components_by_id[component.id_] is not component:
+            return None
+        return positions[component.id_] - 1
+
+    # ------------------------------------------ Building ------------------------------------------ #
+
+    def add(self, component, weight):
+        if component in self:
+            raise KeyError('{0} has already been added'.format(component))
+        self.ids.append(component.id_)
+        self.weights.append(weight)
+        self.positions[component.id_] = len(self.ids)
+        self.clear_weight_caches()
+
+    def set_weight(self, component, weight):
+        position = self.get_position(component)
+        if position is None:
+            raise KeyError(component)
+        self.weights[position] = weight
+        self.clear_weight_caches()
+
+    def copy(self):
+        return ComponentWeights(self.phoneme_data, ids=self.ids, weights=self.weights)
+
+    def select(self, predicate):
+        ''' A new ComponentWeights of the components which match the predicate '''
+        selected = [(component_id, weight) for component_id, weight in zip(self.ids, self.weights) if predicate(self.components_by_id[component_id])]
+        return ComponentWeights(self.phoneme_data, ids=[component_id for component_id, _ in selected], weights=[weight for _, weight in selected])
+
+    # ------------------------------------------ Reading ------------------------------------------ #
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        components_by_id = self.components_by_id
+        return (components_by_id[component_id] for component_id in self.ids)
+
+    def __contains__(self, component):
+        return self.get_position(component) is not None
+
+    def __getitem__(self, component):
+        position = self.get_position(component)
+        if position is None:
+            raise KeyError(component)
+        return self.weights[position]
+
+    def get(self, component, default=None):
+        position = self.get_position(component)
+        return self.weights[position] if position is not None else default
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return self.weights.tolist()
+
+    def items(self):
+        return zip(self, self.weights)
+
+    iterkeys = __iter__
+
+    def itervalues(self):
+        return iter(self.weights)
+
+    def iteritems(self):
+        return iter(zip(self, self.weights))
+
+    def get_ids(self):
+        return numpy.frombuffer(self.ids, dtype=numpy.uint16) if self.ids else numpy.zeros(0, dtype=numpy.uint16)
+
+    def get_weights(self):
+        return numpy.frombuffer(self.weights, dtype=numpy.intc) if self.weights else numpy.zeros(0, dtype=numpy.intc)
+
+    def get_total(self):
+        cumulative_weights = self.get_cumulative_weights()
+        return cumulative_weights[-1] if cumulative_weights else 0
+
+    def get_cumulative_weights(self):
+        ''' As floats, the same sums RandomSource.weighted_choice() works out as it goes '''
+        if self.cumulative_weights is None:
+            self.cumulative_weights = []
+            total = 0.0
+            for weight in self.weights:
+                total += weight
+                self.cumulative_weights.append(total)
+        return self.cumulative_weights
+
+    def choose(self, r):
+        ''' The component a uniform random number in [0, 1) picks, with probability proportional to its weight '''
+        cumulative_weights = self.get_cumulative_weights()
+        position = bisect_right(cumulative_weights, r * cumulative_weights[-1])
+        return self.components_by_id[self.ids[min(position, len(self.ids) - 1)]]
+
+    def get_sorted(self):
+        ''' The components from most to least probable; equally probable ones in id order '''
+        if self.sorted_components is None:
+            order = sorted(xrange(len(self.ids)), key=lambda position: (-self.weights[position], self.ids[position]))
+            self.sorted_components = tuple(self.components_by_id[self.ids[position]] for position in order)
+        return self.sorted_components
+
+    def get_top(self, k):
+        return self.get_sorted()[:k]
+
+    def get_best_ranks(self):
+        ''' By phoneme id, the best rank of the components it's in (NO_RANK if none) '''
+        if self.best_ranks is None:
+            sorted_components = self.get_sorted()
+            self.best_ranks = array(b'H', [NO_RANK]) * (max([0] + [max(component.phoneme_ids) for component in sorted_components]) + 1)
+            # From the least probable up, so that each phoneme ends up with its best rank
+            for rank in xrange(len(sorted_components) - 1, -1, -1):
+                for phoneme_id in sorted_components[rank].phoneme_ids:
+                    self.best_ranks[phoneme_id] = rank
+        return self.best_ranks
+
+    def has_phoneme_in_top(self, phoneme_ids, k):
+        ''' Whether any of the phonemes are in one of the k most probable components '''
+        best_ranks = self.get_best_ranks()
+        return any(phoneme_id < len(best_ranks) and best_ranks[phoneme_id] < k for phoneme_id in phoneme_ids)
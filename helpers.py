@@ -32,4 +32,10 @@ def join_list(string_list, conjunction='and', oxford_comma='', null_value="nothi
     elif len(string_list) == 2:
         return '{0} {1} '.format(oxford_comma, conjunction).join(string_list)
     else:
-        return '{0}, {1} {2}'.format(', '.join([s for s in string_list[:-1]]), conjunction, string_list[-1])
\ No newline at end of file
+        return '{0}, {1} {2}'.format(', '.join([s for s in string_list[:-1]]), conjunction, string_list[-1])
+
+
+def parse_seed_range(text):
+    ''' "5" or "0-100000" (inclusive) '''
+    start, _, end = text.partition('-')
+    return xrange(int(start), int(end or start) + 1)
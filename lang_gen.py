@@ -1,26 +1,23 @@
 
 from __future__ import division, unicode_literals
-import random
 from random import randint as roll
 from collections import namedtuple, OrderedDict
-from copy import deepcopy
+from copy import copy, deepcopy
 
+import sys
 import itertools
 
 import phonemes as p
 import orthography
-from helpers import weighted_random, chance, clamp, join_list
+from component_weights import ComponentWeights
+from helpers import clamp, join_list
+from random_source import RandomSource, derive_seed
 
 ''' 
 This file generates languages which have distinct phonemes.
 '''
 
 
-seed = roll(0, 32000)
-print ' -- Running with random seed', seed
-random.seed(seed)
-
-
 # Chance of dropping an entire articulation method from the language
 DROP_ENTIRE_METHOD_CHANCE = 5
 # Chance of dropping an entire articulation location from the language
@@ -44,11 +41,11 @@ DROP_RANDOM_CONSONANT_AMOUNTS = (1, 1, 1, 1, 2, 2, 2, 3)
 # }
 
 # What types of plosive can exist in the language
-PLOSIVE_TYPES = OrderedDict({
-    'unaspirated': 50,
-    'aspirated': 35,
-    'aspirated and unaspirated': 25
-})
+PLOSIVE_TYPES = OrderedDict([
+    ('unaspirated', 50),
+    ('aspirated', 35),
+    ('aspirated and unaspirated', 25),
+])
 
 # Chance of dropping all non-english phonemes
 FORCE_ENGLISH_PHONEMES_CHANCE = 25
@@ -116,6 +113,65 @@ MAX_COMPOUND_WORD_SYLLABLES_BEFORE_FORCE_USING_WORD_ROOT = 2
 # as part of the compound word, if it meets all other criteria
 USE_FULL_WORD_FOR_COMPOUND_WORD_CHANCE = 50
 
+# Nouns to show off a language with; get_sample_vocabulary_words() picks SAMPLE_VOCABULARY_SIZE of them
+SAMPLE_VOCABULARY_WORDS = ('city', 'house', 'teacher', 'student', 'lawyer', 'doctor', 'patient', 'waiter', 'secretary',
+                           'priest', 'police', 'army', 'soldier', 'artist', 'author', 'manager', 'reporter', 'actor',
+                           'hat', 'dress', 'shirt', 'pants', 'shoes', 'coat', 'son', 'daughter', 'mother', 'father', 'baby',
+                           'man', 'woman', 'brother', 'sister', 'king', 'queen', 'president', 'boy', 'girl', 'child', 'human',
+                           'friend', 'cheese', 'bread', 'soup', 'cake', 'chicken', 'apple', 'banana', 'orange', 'lemon', 'corn',
+                           'rice', 'oil', 'seed', 'table', 'chair', 'bed', 'dream', 'window', 'door', 'book', 'key', 'letter',
+                           'note', 'bag', 'box', 'tool', 'dog', 'cat', 'fish', 'bird', 'cow', 'pig', 'mouse', 'horse')
+SAMPLE_VOCABULARY_SIZE = 20
+
+# How many times create_word() redraws a word which sounds too like one already in the vocabulary
+# (see reject_similar_words), before keeping it anyway
+MAX_SIMILAR_WORD_REDRAWS = 20
+
+# The stages of Language.generate_language_properties(), in the order they run
+GENERATION_STAGES = ('consonants', 'nuclei', 'syllable rules', 'syllable components', 'orthography')
+
+# The stages each stage needs to have been generated first
+STAGE_DEPENDENCIES = {
+    'consonants':           (),
+    'nuclei':               (),
+    'syllable rules':       ('consonants', ),
+    'syllable components':  ('consonants', 'nuclei', 'syllable rules'),
+    'orthography':          (),
+}
+
+# Which stage generates each of a language's properties, probabilities, and attributes
+PROPERTY_STAGES = {
+    'language_voicing_restriction':     'consonants',
+    'plosive_types':                    'consonants',
+    'non_english_phoneme_chances':      'consonants',
+    'no_complex_onsets':                'syllable rules',
+    'no_complex_codas':                 'syllable rules',
+    'no_onset_multiplier':              'syllable rules',
+    'no_coda_multiplier':               'syllable rules',
+    'onset_voicing_restriction':        'syllable rules',
+    'invert_onset_voicing_restriction': 'syllable rules',
+    'coda_voicing_restriction':         'syllable rules',
+    'invert_coda_voicing_restriction':  'syllable rules',
+}
+PROBABILITY_STAGES = {'onset': 'syllable components', 'coda': 'syllable components',
+                      'nucleus': 'nuclei', 'nucleus_monophthong': 'nuclei'}
+ATTRIBUTE_STAGES = {'valid_consonants': 'consonants', 'valid_vowels': 'nuclei', 'orthography': 'orthography'}
+
+# The stages which write to the language's log
+LOGGING_STAGES = ('consonants', 'nuclei', 'syllable rules', 'syllable components')
+
+# The changes Language.derive() can make
+DERIVE_CHANGES = ('drop_consonants', 'weights', 'glyphs')
+
+
+def sort_by_probability(probabilities):
+    ''' Syllable components from most to least probable. Ties go in id order, so that the order
+        never depends on where the components are in memory '''
+    if isinstance(probabilities, ComponentWeights):
+        return list(probabilities.get_sorted())
+    return sorted(probabilities, key=lambda component: (-probabilities[component], component.id_))
+
+
 # A data structure containing phoneme #s for different parts of the syllable
 # Syllable = namedtuple('Syllable', ['onset', 'nucleus', 'coda'])
 
@@ -154,6 +210,16 @@ class Word:
     def __len__(self):
         return len(self.phoneme_ids)
 
+    def copy_to(self, language):
+        ''' The same word in another language; the syllables and phonemes are shared, not copied '''
+        word = copy(self)
+        word.language = language
+        return word
+
+    def is_copy_of(self, word):
+        ''' Whether this is the word, or the word copied to another language (see copy_to) '''
+        return self is word or (self.syllables is word.syllables and self.phoneme_ids is word.phoneme_ids)
+
     def __str__(self):
         return self.language.orthography.phon_to_orth(word=self)
 
@@ -164,8 +230,8 @@ class Word:
         ''' Determine the "root" syllable of a word, currently by choosing the syllable
             with the most non-empty phonemes '''
 
-        phonemes_per_syllable = ((syllable.number_of_phonemes(), syllable) for syllable in self.syllables)
-        chosen_syllable = sorted(phonemes_per_syllable, reverse=True)[0][1]
+        # Ties go to the earliest syllable (comparing the syllables themselves would depend on where they are in memory)
+        chosen_syllable = max(self.syllables, key=lambda syllable: syllable.number_of_phonemes())
 
         return self.create_syllable_from_nearby_phonemes(chosen_syllable)
 
@@ -184,7 +250,7 @@ class Word:
         if syllable.onset.is_empty() and s_index > 0 and (not self.syllables[s_index - 1].coda.is_empty()):
             last_phoneme_of_previous_coda = self.syllables[s_index - 1].coda.phoneme_ids[-1]
             # Get the onset which matches the last phoneme from the previous coda
-            potential_onset = p.data.get_component_by_phoneme_ids(syllable_component_type='onset', 
+            potential_onset = self.language.phoneme_data.get_component_by_phoneme_ids(syllable_component_type='onset', 
                                                                     phoneme_ids=tuple([last_phoneme_of_previous_coda]))
             # Make sure that the new onset is valid in this language
             if potential_onset is not None and potential_onset in self.language.probabilities['onset']:
@@ -194,7 +260,7 @@ class Word:
         if syllable.coda.is_empty() and s_index < len(self.syllables) - 1 and (not self.syllables[s_index + 1].onset.is_empty()):
             first_phoneme_of_next_onset = self.syllables[s_index + 1].onset.phoneme_ids[0]
             # Get the coda which matches the first phoneme from the precedinbg onset
-            potential_coda = p.data.get_component_by_phoneme_ids(syllable_component_type='coda', 
+            potential_coda = self.language.phoneme_data.get_component_by_phoneme_ids(syllable_component_type='coda', 
                                                                     phoneme_ids=tuple([first_phoneme_of_next_onset]))
             # Make sure that the new coda is valid in this language
             if potential_coda is not None and potential_coda in self.language.probabilities['coda']:
@@ -231,8 +297,8 @@ class Word:
         at_end       = phoneme_index == len(self) - 1
 
         phoneme_position_info = {
-            'before_consonant': not at_end       and p.data.is_consonant(self.phoneme_ids[phoneme_index + 1]),
-            'after_consonant':  not at_beginning and p.data.is_consonant(self.phoneme_ids[phoneme_index - 1]), 
+            'before_consonant': not at_end       and self.language.phoneme_data.is_consonant(self.phoneme_ids[phoneme_index + 1]),
+            'after_consonant':  not at_beginning and self.language.phoneme_data.is_consonant(self.phoneme_ids[phoneme_index - 1]), 
             'at_beginning':     at_beginning, 
             'at_end':           at_end,
         }
@@ -250,56 +316,297 @@ class Word:
         return desc
 
 
-class Language:
-    def __init__(self):
-        self.properties = {}
+class StagedValues(dict):
+    ''' A dict of values which are each generated by one of a Language's stages. Looking up
+        a value generates its stage, if that hasn't happened yet '''
+    def __init__(self, language, stages):
+        dict.__init__(self)
+        self.language = language
+        self.stages = stages
 
-        self.valid_consonants = {c for c in p.CONSONANTS if c.id_ < 300}
-        self.valid_vowels = set([])
+    def __missing__(self, key):
+        stage = self.stages.get(key)
+        if stage is None or stage in self.language.generated_stages or stage in self.language.generating_stages:
+            raise KeyError(key)
 
-        self.probabilities = { 'onset': OrderedDict(), 'coda': OrderedDict(), 'nucleus': OrderedDict(), 'nucleus_monophthong': OrderedDict() }
+        self.language.generate_stage(stage)
+        return self[key]
 
-        self.vocabulary = {}
-        self.orthography = None
 
-        # Log some of the rules that get flagged for this language
-        self.log = []
+class VocabularyOverlay:
+    ''' A descendant language's vocabulary: its own words, over its parent's. A parent's word is copied into
+        the descendant (see Word.copy_to) the first time it's looked up, so a descendant only ever holds
+        the words it has used or changed '''
+    def __init__(self, parent_vocabulary, language):
+        self.parent_vocabulary = parent_vocabulary
+        self.language = language
+        self.words = {}
+        # Keys deleted here, which the parent still has
+        self.deleted = set()
+
+    def __getitem__(self, key):
+        if key not in self.words:
+            if key in self.deleted or key not in self.parent_vocabulary:
+                raise KeyError(key)
+            self.words[key] = self.parent_vocabulary[key].copy_to(self.language)
+        return self.words[key]
+
+    def __setitem__(self, key, word):
+        self.words[key] = word
+        self.deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.words.pop(key, None)
+        if key in self.parent_vocabulary:
+            self.deleted.add(key)
+
+    def __contains__(self, key):
+        return key in self.words or (key not in self.deleted and key in self.parent_vocabulary)
+
+    def __iter__(self):
+        for key in self.words:
+            yield key
+        for key in self.parent_vocabulary:
+            if key not in self.words and key not in self.deleted:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def peek(self, key, default=None):
+        ''' The word under the key without copying it in: the descendant's own word, or else its parent's '''
+        if key in self.words:
+            return self.words[key]
+        if key in self.deleted:
+            return default
+        return peek_word(self.parent_vocabulary, key, default)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def iteritems(self):
+        return ((key, self[key]) for key in self)
+
+
+def peek_word(vocabulary, key, default=None):
+    ''' The word under a key of a vocabulary, without copying a parent's word into a descendant's vocabulary '''
+    return vocabulary.peek(key, default) if isinstance(vocabulary, VocabularyOverlay) else vocabulary.get(key, default)
+
+
+class Language(object):
+    def __init__(self, seed=None, phoneme_data=None):
+        # Words are drawn from here. Each stage of generating the language has a random source of its own,
+        # so a seed always gives the same language and the same words
+        self.rng = RandomSource(seed)
+        self.seed = self.rng.seed
+
+        # The compiled phonotactic rules this language draws its onsets and codas from
+        self.phoneme_data = phoneme_data if phoneme_data is not None else p.data
+
+        # Properties and probabilities are filled in by the stage they come from, the first time they're needed.
+        # valid_consonants, valid_vowels and orthography are also generated on first access (see __getattr__), as is log
+        self.properties = StagedValues(language=self, stages=PROPERTY_STAGES)
+        self.probabilities = StagedValues(language=self, stages=PROBABILITY_STAGES)
+
+        self.vocabulary = {}
+        # The language this one was derived from, and how many languages have been derived from this one (see derive)
+        self.parent = None
+        self.descendants = 0
+        # Vocabulary words by their phonemes, and how close a new word can be to them (see reject_similar_words).
+        # A descendant searches its ancestors' indexes as well as its own, which only has the words added to it
+        self.word_index = None
+        self.inherited_word_indexes = ()
+        self.similar_word_distance = None
+        # Compiled from the probabilities the first time it's needed (see get_automaton)
+        self.automaton = None
+
+        self.generated_stages = set()
+        self.generating_stages = set()
+        # The random source and log of the stage being generated
+        self.stage_rng = None
+        self.stage_log = None
+        # Log some of the rules that get flagged for this language, by stage
+        self.stage_logs = {}
+
+    @property
+    def log(self):
+        ''' The rules flagged while generating the language, in stage order whichever order the stages were
+            generated in. Generates the stages which log; a tuple, as it's rebuilt from stage_logs every time '''
+        for stage in LOGGING_STAGES:
+            self.generate_stage(stage)
+        return tuple(text for stage in GENERATION_STAGES for text in self.stage_logs.get(stage, ()))
+
+    def __getattr__(self, name):
+        ''' Generate the stage an attribute comes from, if it hasn't been generated yet '''
+        stage = ATTRIBUTE_STAGES.get(name)
+        if stage is None or stage in self.generated_stages or stage in self.generating_stages:
+            raise AttributeError(name)
+
+        self.generate_stage(stage)
+        return getattr(self, name)
 
     def generate_language_properties(self):
         ''' Determine the phonemes which are valid in this language and the 
             frequency at which they occur '''
-        
+        for stage in GENERATION_STAGES:
+            self.generate_stage(stage)
+
+    def generate_stage(self, stage):
+        ''' Generate one stage of the language (after the stages it depends on), unless it already has been.
+            Each stage draws from its own random source, seeded from the language's seed and the stage's
+            name, so a stage comes out the same whichever order the stages are generated in '''
+        if stage in self.generated_stages or stage in self.generating_stages:
+            return
+
+        for dependency in STAGE_DEPENDENCIES[stage]:
+            self.generate_stage(dependency)
+
+        outer_stage_rng, outer_stage_log = self.stage_rng, self.stage_log
+        self.generating_stages.add(stage)
+        self.stage_rng = RandomSource(seed=derive_seed(self.seed, stage))
+        self.stage_log = self.stage_logs[stage] = []
+
+        # If the stage fails (say on a bad rule file) it's left ungenerated, so the next access tries it again
+        # and gets the same error, rather than __getattr__ taking it to be in progress
+        try:
+            {
+                'consonants':           self.generate_valid_consonants,
+                'nuclei':               self.generate_valid_nuclei,
+                'syllable rules':       self.generate_syllable_rules,
+                'syllable components':  self.generate_syllable_components,
+                'orthography':          self.generate_orthography,
+            }[stage]()
+            self.generated_stages.add(stage)
+        finally:
+            self.generating_stages.remove(stage)
+            self.stage_rng, self.stage_log = outer_stage_rng, outer_stage_log
+
+    def derive(self, changes=None, seed=None):
+        ''' A descendant of the language, with changes (any of DERIVE_CHANGES):
+
+                drop_consonants     phoneme ids of consonants to lose, along with the onsets and codas they're in
+                weights             {component type: {component: weight}}; new components are added, and a weight
+                                    of 0 drops the component (other than the empty onset / coda)
+                glyphs              {phoneme id: Glyph, or letters} to spell differently
+
+            Whatever the changes don't touch - inventories, probabilities, orthography, properties and
+            vocabulary - is shared with this language rather than copied, so a descendant costs memory for
+            its differences only. Inherited words keep their phonemes, even ones the descendant has dropped.
+            New words come from the descendant's own seed (by default, the next of this language's), and are
+            rejected for being too like another word if this language's are (see reject_similar_words) '''
+        changes = changes or {}
+        unknown_changes = set(changes) - set(DERIVE_CHANGES)
+        if unknown_changes:
+            raise ValueError('unknown changes: {0}'.format(', '.join(sorted(unknown_changes))))
+
+        self.generate_language_properties()
+        if seed is None:
+            self.descendants += 1
+            seed = derive_seed(self.seed, 'descendant {0}'.format(self.descendants))
+
+        language = Language(seed=seed, phoneme_data=self.phoneme_data)
+        language.parent = self
+        # Nothing gets generated; everything starts out as this language's
+        language.generated_stages.update(GENERATION_STAGES)
+        language.properties = self.properties
+        language.stage_logs = self.stage_logs
+        language.valid_consonants = self.valid_consonants
+        language.valid_vowels = self.valid_vowels
+        for key in PROBABILITY_STAGES:
+            language.probabilities[key] = self.probabilities[key]
+        language.orthography = self.orthography
+        language.vocabulary = VocabularyOverlay(parent_vocabulary=self.vocabulary, language=language)
+        if self.word_index is not None:
+            import bktree
+            language.similar_word_distance = self.similar_word_distance
+            language.inherited_word_indexes = self.inherited_word_indexes + (self.word_index,)
+            language.word_index = bktree.BKTree(distance=self.word_index.distance)
+
+        dropped_ids = set(changes.get('drop_consonants', ()))
+        if dropped_ids:
+            language.valid_consonants = p.PhonemeInventory(c for c in self.valid_consonants if c.id_ not in dropped_ids)
+            for component_type in ('onset', 'coda'):
+                language.probabilities[component_type] = language.probabilities[component_type].select(
+                    lambda component: component.is_empty() or all(c in language.valid_consonants for c in component.phonemes))
+
+        for component_type, weights in changes.get('weights', {}).iteritems():
+            if component_type not in ('onset', 'coda', 'nucleus'):
+                raise ValueError('weights can only be changed for onsets, codas and nuclei, not "{0}"'.format(component_type))
+
+            probabilities = language.probabilities[component_type].copy()
+            # In id order, so that the components which get added always go in the same order
+            for component, weight in sorted(weights.iteritems(), key=lambda item: item[0].id_):
+                if component in probabilities:
+                    probabilities.set_weight(component, weight)
+                elif not weight:
+                    continue
+                elif component_type != 'nucleus' and not all(c in language.valid_consonants for c in component.phonemes):
+                    raise ValueError('{0} has consonants the language doesn\'t'.format(component))
+                else:
+                    probabilities.add(component, weight)
+            language.probabilities[component_type] = probabilities.select(lambda component: component.is_empty() or probabilities[component])
+
+            if component_type == 'nucleus':
+                language.probabilities['nucleus_monophthong'] = language.probabilities['nucleus'].select(lambda nucleus: not nucleus.phonemes[0].is_diphthong())
+                language.valid_vowels = p.PhonemeInventory(nucleus.phonemes[0] for nucleus in language.probabilities['nucleus'])
+
+        glyphs = changes.get('glyphs')
+        if glyphs:
+            language.orthography = self.orthography.derive(parent_language=language)
+            for phoneme_id, glyph in glyphs.iteritems():
+                language.orthography.mapping[phoneme_id] = glyph if isinstance(glyph, orthography.Glyph) else orthography.Glyph(phoneme_id, glyph)
+
+        return language
+
+
+    def generate_valid_consonants(self):
+        ''' Drop consonants from the language, by whole groups and then at random '''
+        # An inventory rather than a set, so that the consonants are always gone through in id order
+        # (set order changes from process to process), and a seed gives the same language wherever it's generated
+        self.valid_consonants = p.PhonemeInventory(c for c in p.CONSONANTS if c.id_ < 300)
+
         # ------------------------- Drop some phonemes at the language level ----------------------- #
-        if chance(DROP_ENTIRE_METHOD_CHANCE):
-            method = random.choice(p.data.consonant_methods)
-            self.log.append('Dropping all {0}s'.format(method))
+        if self.stage_rng.chance(DROP_ENTIRE_METHOD_CHANCE):
+            method = self.stage_rng.choice(self.phoneme_data.consonant_methods)
+            self.stage_log.append('Dropping all {0}s'.format(method))
             self.drop_consonants(method=method)
 
-        if chance(DROP_DENTAL_CHANCE):
-            self.log.append('Dropping dentals')
+        if self.stage_rng.chance(DROP_DENTAL_CHANCE):
+            self.stage_log.append('Dropping dentals')
             self.drop_consonants(location='dental')
 
-        if chance(DROP_ENTIRE_LOCATION_CHANCE):
-            location = random.choice(p.data.consonant_locations)
-            self.log.append('Dropping all {0}s'.format(location))
+        if self.stage_rng.chance(DROP_ENTIRE_LOCATION_CHANCE):
+            location = self.stage_rng.choice(self.phoneme_data.consonant_locations)
+            self.stage_log.append('Dropping all {0}s'.format(location))
             self.drop_consonants(location=location)
 
-        if chance(DROP_ENTIRE_VOICING_CHANCE):
-            voicings = random.choice((0, 1))
+        if self.stage_rng.chance(DROP_ENTIRE_VOICING_CHANCE):
+            voicings = self.stage_rng.choice((0, 1))
             self.properties['language_voicing_restriction'] = voicings
-            self.log.append('Dropping with voicing of {0}'.format(voicings))
+            self.stage_log.append('Dropping with voicing of {0}'.format(voicings))
             self.drop_consonants(voicing=voicings)
         else:
             self.properties['language_voicing_restriction'] = None
 
 
         # Figure out if this language distinguishes between aspirated / unaspirated plosives
-        plosive_types = weighted_random(PLOSIVE_TYPES)
+        plosive_types = self.stage_rng.weighted_choice(PLOSIVE_TYPES)
         if      plosive_types == 'unaspirated': self.drop_consonants(method='plosive', special='aspirated')
         elif    plosive_types == 'aspirated':   self.drop_consonants(method='plosive', special=None)
         elif    plosive_types == 'aspirated and unaspirated': pass
         self.properties['plosive_types'] = plosive_types
-        self.log.append('Allow {0} plosives'.format(plosive_types))
+        self.stage_log.append('Allow {0} plosives'.format(plosive_types))
 
         
         # ------------------- Figure out which non-english phonemes to drop ------------------- #
@@ -308,9 +615,9 @@ class Language:
         non_english_phonemes = [c for c in self.valid_consonants if not c.is_english()]
 
         # Chance of forcing only english phonemes (so, drop all non-english ones)
-        if chance(FORCE_ENGLISH_PHONEMES_CHANCE):
+        if self.stage_rng.chance(FORCE_ENGLISH_PHONEMES_CHANCE):
             self.properties['non_english_phoneme_chances'] = 0
-            self.log.append("All phonemes must be English")
+            self.stage_log.append("All phonemes must be English")
             # Actually drop the phonemes
             for c in non_english_phonemes:
                 self.valid_consonants.remove(c)
@@ -318,12 +625,12 @@ class Language:
         # Otherwise, a language gets a random rate of dropping a non-english phoneme,
         # and then will go through and drop non-english phonemes at that rate
         else:
-            drop_non_english_phoneme_chance = random.choice(DROP_NON_ENGLISH_PHONEME_CHANCES)
+            drop_non_english_phoneme_chance = self.stage_rng.choice(DROP_NON_ENGLISH_PHONEME_CHANCES)
             self.properties['non_english_phoneme_chances'] = 100 - drop_non_english_phoneme_chance
-            self.log.append("{0}% chance of dropping non-english phonemes".format(drop_non_english_phoneme_chance))
+            self.stage_log.append("{0}% chance of dropping non-english phonemes".format(drop_non_english_phoneme_chance))
             # Actually drop the phonemes
             for c in non_english_phonemes:
-                if chance(drop_non_english_phoneme_chance):
+                if self.stage_rng.chance(drop_non_english_phoneme_chance):
                     self.valid_consonants.remove(c)
 
         # ------------------------------------------------------------------------------------- #
@@ -331,69 +638,68 @@ class Language:
 
         # There is a chance for one or more random consonants to be removed as well
         if len(self.valid_consonants) >= DROP_RANDOM_CONSONANT_THRESHHOLD and \
-                                            chance(DROP_RANDOM_CONSONANT_CHANCE):
+                                            self.stage_rng.chance(DROP_RANDOM_CONSONANT_CHANCE):
 
-            for i in xrange(random.choice(DROP_RANDOM_CONSONANT_AMOUNTS)):
-                random_consonant = random.choice(tuple(self.valid_consonants))
+            for i in xrange(self.stage_rng.choice(DROP_RANDOM_CONSONANT_AMOUNTS)):
+                random_consonant = self.stage_rng.choice(list(self.valid_consonants))
                 self.valid_consonants.remove(random_consonant)
 
-        # Finally, choose some valid nuclei (vowels) in this language
-        self.generate_valid_nuclei()
-        # ---------------------------- End language-level phoneme rules ------------------------------- #
-
+    def generate_syllable_rules(self):
+        ''' Pick the restrictions on which onsets and codas can be formed '''
 
         # Some languages have a chance of disallowing complex onsets or complex codas in their syllables
-        self.properties['no_complex_onsets'] = 1 if chance(DROP_COMPLEX_ONSETS_CHANCE) else 0
-        self.properties['no_complex_codas']  = 1 if chance(DROP_COMPLEX_CODAS_CHANCE)  else 0
+        self.properties['no_complex_onsets'] = 1 if self.stage_rng.chance(DROP_COMPLEX_ONSETS_CHANCE) else 0
+        self.properties['no_complex_codas']  = 1 if self.stage_rng.chance(DROP_COMPLEX_CODAS_CHANCE)  else 0
         # Chance of no onset / coda compared to other clusters (a multiplier of 1 means that this onset has a 50% chance
         #  of occuring relative to <any> other onset!
-        self.properties['no_onset_multiplier'] = random.choice(NO_ONSET_MULTIPLIERS)
-        self.properties['no_coda_multiplier']  = random.choice(NO_CODA_MULTIPLIERS)
+        self.properties['no_onset_multiplier'] = self.stage_rng.choice(NO_ONSET_MULTIPLIERS)
+        self.properties['no_coda_multiplier']  = self.stage_rng.choice(NO_CODA_MULTIPLIERS)
 
         # ---------- Does the onset have a restriction in voicing? ---------- #
-        if chance(ONSET_RESTRICT_VOICING_CHANCE) and self.properties['language_voicing_restriction'] is None:
-            self.properties['onset_voicing_restriction']        = roll(0, 1)
-            self.properties['invert_onset_voicing_restriction'] = roll(0, 1)
+        if self.stage_rng.chance(ONSET_RESTRICT_VOICING_CHANCE) and self.properties['language_voicing_restriction'] is None:
+            self.properties['onset_voicing_restriction']        = self.stage_rng.roll(0, 1)
+            self.properties['invert_onset_voicing_restriction'] = self.stage_rng.roll(0, 1)
         else:
             self.properties['onset_voicing_restriction']        = None
             self.properties['invert_onset_voicing_restriction'] = None
         # ------------------------------------------------------------------- #
 
         # ---------- Does the coda have a restriction in voicing? ----------- #
-        if chance(CODA_RESTRICT_VOICING_CHANCE) and not self.properties['onset_voicing_restriction'] \
+        if self.stage_rng.chance(CODA_RESTRICT_VOICING_CHANCE) and not self.properties['onset_voicing_restriction'] \
                                                 and self.properties['language_voicing_restriction'] is None:
-            self.properties['coda_voicing_restriction']        = roll(0, 1)
-            self.properties['invert_coda_voicing_restriction'] = roll(0, 1)
+            self.properties['coda_voicing_restriction']        = self.stage_rng.roll(0, 1)
+            self.properties['invert_coda_voicing_restriction'] = self.stage_rng.roll(0, 1)
         else:
             self.properties['coda_voicing_restriction']        = None
             self.properties['invert_coda_voicing_restriction'] = None
         # ------------------------------------------------------------------- #
 
-        # Now, figure out probabilities for each of the onsets and codas
+    def generate_syllable_components(self):
+        ''' Figure out probabilities for each of the onsets and codas '''
         self.generate_valid_onsets()
         self.generate_valid_codas()
 
 
         ## ------------------------- Log some info ---------------------------- ##
         onset_description, coda_description = self.describe_syllable_level_rules()
-        self.log.extend( [onset_description, coda_description] )
-
-        self.log.append( 'No onset mutiplier: {0}'.format(self.properties['no_onset_multiplier']) )
-        self.log.append( 'No coda mutiplier: {0}'.format(self.properties['no_coda_multiplier']) )
+        self.stage_log.extend( [onset_description, coda_description] )
 
-        self.log.append( 'Consonants: {0}; Vowels: {1}\n'.format(len(self.valid_consonants), len(self.probabilities['nucleus'])) )
+        self.stage_log.append( 'No onset mutiplier: {0}'.format(self.properties['no_onset_multiplier']) )
+        self.stage_log.append( 'No coda mutiplier: {0}'.format(self.properties['no_coda_multiplier']) )
 
-        ## -------------------------- Set orthography -------------------------------- ##
+        self.stage_log.append( 'Consonants: {0}; Vowels: {1}\n'.format(len(self.valid_consonants), len(self.probabilities['nucleus'])) )
 
-        self.orthography = orthography.Orthography(parent_language=self)
+    def generate_orthography(self):
+        self.orthography = orthography.Orthography(parent_language=self, rng=self.stage_rng)
 
 
     def generate_valid_onsets(self):
         ''' Contains some logic for choosing valid onsets for a language, by picking systematic features to disallow '''
+        self.probabilities['onset'] = ComponentWeights(self.phoneme_data)
         invalid_consonants = self.get_matching_consonants(voicing=self.properties['onset_voicing_restriction'],
                                                           exclude_matches=self.properties['invert_onset_voicing_restriction'])
 
-        for onset in p.data.all_syllable_components['onset']:
+        for onset in self.phoneme_data.all_syllable_components['onset']:
             # Can't allow the debug empty consonant, or onsets containing invalid consonants
             if onset.is_empty() or not all(onset_consonant in self.valid_consonants for onset_consonant in onset.phonemes):
                 continue
@@ -407,19 +713,20 @@ class Language:
                 continue
 
             # ------ Gauntlet has been run, this onset can now be added to the list ------ #
-            self.probabilities['onset'][onset] = self.get_component_probability(component_type='onset', component=onset)
+            self.probabilities['onset'].add(onset, self.get_component_probability(component_type='onset', component=onset))
             
 
-        probability_of_no_onset = int(sum(self.probabilities['onset'].values()) * self.properties['no_onset_multiplier'])
-        self.probabilities['onset'][p.data.empty_onset] = probability_of_no_onset
+        probability_of_no_onset = int(self.probabilities['onset'].get_total() * self.properties['no_onset_multiplier'])
+        self.probabilities['onset'].add(self.phoneme_data.empty_onset, probability_of_no_onset)
 
 
     def generate_valid_codas(self):
         ''' Contains some logic for choosing valid codas for a language, by picking systematic features to disallow '''
+        self.probabilities['coda'] = ComponentWeights(self.phoneme_data)
         invalid_consonants = self.get_matching_consonants(voicing=self.properties['coda_voicing_restriction'],
                                                           exclude_matches=self.properties['invert_coda_voicing_restriction'])
 
-        for coda in p.data.all_syllable_components['coda']:
+        for coda in self.phoneme_data.all_syllable_components['coda']:
             # Can't allow the debug empty consonant, or codas containing invalid consonants
             if coda.is_empty() or not all(coda_consonant in self.valid_consonants for coda_consonant in coda.phonemes):
                 continue
@@ -433,29 +740,31 @@ class Language:
                 continue
 
             # ------ Gauntlet has been run, this coda can now be added to the list ------ #
-            self.probabilities['coda'][coda] = self.get_component_probability(component_type='coda', component=coda)
+            self.probabilities['coda'].add(coda, self.get_component_probability(component_type='coda', component=coda))
 
 
-        probability_of_no_coda = int(sum(self.probabilities['coda'].values()) * self.properties['no_coda_multiplier'])
-        self.probabilities['coda'][p.data.empty_coda] = probability_of_no_coda
+        probability_of_no_coda = int(self.probabilities['coda'].get_total() * self.properties['no_coda_multiplier'])
+        self.probabilities['coda'].add(self.phoneme_data.empty_coda, probability_of_no_coda)
 
 
     def generate_valid_nuclei(self):
         ''' Contains some logic for choosing which vowels will be used in this language '''
+        self.probabilities['nucleus'] = ComponentWeights(self.phoneme_data)
+        self.valid_vowels = p.PhonemeInventory()
 
         # -------- Set some initial parameters -------- #
-        drop_all_diphtongs = chance(DROP_ALL_DIPHTHONGS_CHANCE)
+        drop_all_diphtongs = self.stage_rng.chance(DROP_ALL_DIPHTHONGS_CHANCE)
 
-        if drop_all_diphtongs:  drop_all_lax_monophthongs = chance(DROP_ALL_LAX_MONPHTHONGS_CHANCE)
+        if drop_all_diphtongs:  drop_all_lax_monophthongs = self.stage_rng.chance(DROP_ALL_LAX_MONPHTHONGS_CHANCE)
         else:                   drop_all_lax_monophthongs = 0
 
         if not drop_all_diphtongs and \
-           not drop_all_lax_monophthongs: drop_all_rounded = chance(DROP_ALL_ROUNDED_CHANCE)
+           not drop_all_lax_monophthongs: drop_all_rounded = self.stage_rng.chance(DROP_ALL_ROUNDED_CHANCE)
         else:                             drop_all_rounded = 0
         # ------- End setting initial parameters ------- #
 
         # Set vowel probabilities, can vary on preceding and following cluster
-        for nucleus in p.data.all_syllable_components['nucleus']:
+        for nucleus in self.phoneme_data.all_syllable_components['nucleus']:
             # Nuclei will always have 1 phoneme - the vowel
             vowel = nucleus.phonemes[0]
 
@@ -467,28 +776,29 @@ class Language:
                 continue
 
             # Drop random vowels
-            if not vowel.is_diphthong() and chance(DROP_RANDOM_MONOPHTHONG_CHANCE):
+            if not vowel.is_diphthong() and self.stage_rng.chance(DROP_RANDOM_MONOPHTHONG_CHANCE):
                 continue
-            if vowel.is_diphthong() and chance(DROP_RANDOM_DIPHTHONG_CHANCE):
+            if vowel.is_diphthong() and self.stage_rng.chance(DROP_RANDOM_DIPHTHONG_CHANCE):
                 continue
 
-            self.probabilities['nucleus'][nucleus] = self.get_component_probability(component_type='nucleus', component=nucleus)
+            self.probabilities['nucleus'].add(nucleus, self.get_component_probability(component_type='nucleus', component=nucleus))
 
         # -------- Cleanup - ensure a language has at least MIN_NUM_VOWELS vowels ------------ #
 
         # If somehow we've ended up with a ridiculously low number of vowels,
         # this loop ensures we'll be brought up to above 5 vowels total
         while len(self.probabilities['nucleus']) < MIN_NUM_VOWELS:
-            random_new_nucleus = random.choice(tuple(p.data.all_syllable_components['nucleus']))
+            random_new_nucleus = self.stage_rng.choice(tuple(self.phoneme_data.all_syllable_components['nucleus']))
             if random_new_nucleus not in self.probabilities['nucleus']:
-                self.probabilities['nucleus'][random_new_nucleus] = \
-                                        self.get_component_probability(component_type='nucleus', component=random_new_nucleus)
+                self.probabilities['nucleus'].add(random_new_nucleus,
+                                        self.get_component_probability(component_type='nucleus', component=random_new_nucleus))
 
         
         # -------- Cleanup - ensure a diphthong does not occur as the most probable vowel type ------------ #
 
-        sorted_nuclei_probabilities = sorted([(self.probabilities['nucleus'][nucleus], nucleus) 
-                                            for nucleus in self.probabilities['nucleus']], reverse=True)
+        # Equally probable nuclei go in id order (comparing the nuclei themselves would depend on where they are in memory)
+        sorted_nuclei_probabilities = [(self.probabilities['nucleus'][nucleus], nucleus) for nucleus in
+                                        sort_by_probability(self.probabilities['nucleus'])]
 
         most_probable_vowel_nucleus = sorted_nuclei_probabilities[0][1]
         
@@ -498,22 +808,22 @@ class Language:
                     if not nucleus.phonemes[0].is_diphthong())
 
         if most_probable_vowel_nucleus != most_probable_monophthong_nucleus:
-            self.log.append( "Flipping {0} with {1}".format(most_probable_vowel_nucleus, most_probable_monophthong_nucleus) )
+            self.stage_log.append( "Flipping {0} with {1}".format(most_probable_vowel_nucleus, most_probable_monophthong_nucleus) )
             # Flip the probabilities
-            self.probabilities['nucleus'][most_probable_monophthong_nucleus], self.probabilities['nucleus'][most_probable_vowel_nucleus] = \
-                self.probabilities['nucleus'][most_probable_vowel_nucleus], self.probabilities['nucleus'][most_probable_monophthong_nucleus]
+            nuclei = self.probabilities['nucleus']
+            most_probable_vowel_probability = nuclei[most_probable_vowel_nucleus]
+            nuclei.set_weight(most_probable_vowel_nucleus, nuclei[most_probable_monophthong_nucleus])
+            nuclei.set_weight(most_probable_monophthong_nucleus, most_probable_vowel_probability)
 
         # ----------- Cleanup - Build a list of just nuclei with monophthongs for later use  --------------- #
 
-        self.probabilities['nucleus_monophthong'] = {nucleus: self.probabilities['nucleus'][nucleus]
-                                                        for nucleus in self.probabilities['nucleus'] 
-                                                            if not nucleus.phonemes[0].is_diphthong() }
+        self.probabilities['nucleus_monophthong'] = self.probabilities['nucleus'].select(lambda nucleus: not nucleus.phonemes[0].is_diphthong())
 
         # ---------------------------------------- End Cleanup --------------------------------------------- #
 
         # ------------- Put aside a set of the vowels contained within the syllable components ------------- #
 
-        for nucleus in self.probabilities['nucleus'].keys():
+        for nucleus in self.probabilities['nucleus']:
             self.valid_vowels.add(nucleus.phonemes[0])
 
     def get_component_probability(self, component_type, component):
@@ -524,20 +834,20 @@ class Language:
 
         # ------------------------------ Onset ------------------------------ #
         if component_type == 'onset':
-            if not component.is_complex():  probability = int(random.lognormvariate(3, 1.2)) 
-            elif   component.is_complex():  probability = int(random.lognormvariate(3, 1.2) * COMPLEX_ONSET_PROBABILITY_MULTIPLIER)
+            if not component.is_complex():  probability = int(self.stage_rng.lognormvariate(3, 1.2)) 
+            elif   component.is_complex():  probability = int(self.stage_rng.lognormvariate(3, 1.2) * COMPLEX_ONSET_PROBABILITY_MULTIPLIER)
 
         # ------------------------------ Coda ------------------------------- #
         elif component_type == 'coda':
-            if not component.is_complex():  probability = int(random.lognormvariate(3, 1.2))
-            elif   component.is_complex():  probability = int(random.lognormvariate(3, 1.2) * COMPLEX_CODA_PROBABILITY_MULTIPLIER)
+            if not component.is_complex():  probability = int(self.stage_rng.lognormvariate(3, 1.2))
+            elif   component.is_complex():  probability = int(self.stage_rng.lognormvariate(3, 1.2) * COMPLEX_CODA_PROBABILITY_MULTIPLIER)
 
         # ------------------------------ Nucleus ----------------------------- #
         elif component_type == 'nucleus':
             vowel = component.phonemes[0]
             
-            if not vowel.is_diphthong():    probability = int(random.lognormvariate(3, 1.2))
-            elif   vowel.is_diphthong():    probability = int(random.lognormvariate(3, 1.2) * DIPHTHONG_PROBABILITY_MULTIPLIER)
+            if not vowel.is_diphthong():    probability = int(self.stage_rng.lognormvariate(3, 1.2))
+            elif   vowel.is_diphthong():    probability = int(self.stage_rng.lognormvariate(3, 1.2) * DIPHTHONG_PROBABILITY_MULTIPLIER)
 
         return clamp(minimum=MIN_COMPONENT_PROBABILITY, num=probability, maximum=MAX_COMPONENT_PROBABILITY)
 
@@ -604,17 +914,17 @@ class Language:
 
         # At the beginning of the word, any onset is valid
         if previous_coda is None:
-            return weighted_random(self.probabilities['onset'])
+            return self.rng.weighted_choice(self.probabilities['onset'])
         # Otherwise, if the previous coda was complex, we'll assign an empty onset
         elif previous_coda.is_complex():
-            return p.data.empty_onset
+            return self.phoneme_data.empty_onset
         # No onsets for syllables in the middle of the word if the previous syllable has a coda
         elif syllable_position == 1 and not previous_coda.is_empty():
-            return p.data.empty_onset
+            return self.phoneme_data.empty_onset
         # If this onset follows a coda (even a simple one), there is a chance that we'll ignore the
         # force an empty onset - this helps with readability, especially in longer words
-        elif not previous_coda.is_empty() and chance(FORCE_EMPTY_ONSET_AFTER_ANY_CODA_CHANCE):
-            return p.data.empty_onset
+        elif not previous_coda.is_empty() and self.rng.chance(FORCE_EMPTY_ONSET_AFTER_ANY_CODA_CHANCE):
+            return self.phoneme_data.empty_onset
 
         # Otherwise, generate an onset with some restrictions
         # Stash the previous coda's last phoneme in case we need to check it multiple times
@@ -622,7 +932,7 @@ class Language:
 
         # Loop through and generate onsets until one matches all criteria
         while True:
-            onset = weighted_random(self.probabilities['onset'])
+            onset = self.rng.weighted_choice(self.probabilities['onset'])
             # Can't start one syllable off with the same phoneme that the previous ended with
             if onset.phoneme_ids[-1] == previous_coda_last_phoneme:
                 continue
@@ -639,11 +949,11 @@ class Language:
 
         # No onsets for syllables in the middle of the word if the previous syllable has a coda
         if syllable_position == 1:
-            return p.data.empty_coda
+            return self.phoneme_data.empty_coda
 
         # Loop through until a valid coda is generated
         while True:
-            coda = weighted_random(self.probabilities['coda'])
+            coda = self.rng.weighted_choice(self.probabilities['coda'])
             # No /l/ or /r/ in codas when the onset contains one of these
             if onset.has_any_phoneme( (221, 224) ) and coda.has_any_phoneme( (221, 224) ):
                 continue
@@ -665,11 +975,11 @@ class Language:
 
         # Diphthongs cannot occur in the middle of a word
         if syllable_position == 1:
-            return weighted_random(self.probabilities['nucleus_monophthong'])
+            return self.rng.weighted_choice(self.probabilities['nucleus_monophthong'])
 
         while True:
             # Generate the vowel based off of the combined weighings of the vowels surrounding it
-            nucleus = weighted_random(self.probabilities['nucleus'])
+            nucleus = self.rng.weighted_choice(self.probabilities['nucleus'])
             vowel = nucleus.phonemes[0]
 
             # A short vowel cannot occur if there is no consonant in the coda
@@ -697,27 +1007,108 @@ class Language:
         else:                       return 1    # Otherwise, it's in the middle
 
     def is_common_syllable_component(self, target_syllable_component, phoneme_id, top_phoneme_level):
-        ''' See if a syllable component is common in a language '''
+        ''' See if any of the phonemes (phoneme_id is a sequence of ids) are in one of the language's
+            top_phoneme_level + 1 most probable components of the type '''
+        return int(self.probabilities[target_syllable_component].has_phoneme_in_top(phoneme_id, top_phoneme_level + 1))
+
+
+    def get_automaton(self):
+        ''' The language's words as a finite-state automaton, for counting, ranking and sampling them (see automaton.py) '''
+        if self.automaton is None:
+            import automaton
+            self.automaton = automaton.WordAutomaton(language=self)
+        return self.automaton
 
-        
-        sorted_probabilities = sorted([(self.probabilities[target_syllable_component][component], component)
-                                            for component in self.probabilities[target_syllable_component]], reverse=True)
-        for probability, component in sorted_probabilities[0:top_phoneme_level+1]:
-            if component.has_any_phoneme(phoneme_id):
-                return 1
-        return 0
+
+    def score(self, word):
+        ''' The log probability of the language making this word (given its number of syllables), or -inf if it
+            can't. The word can also be a word of another language, or a sequence of phoneme ids '''
+        return self.get_automaton().log_probability(word)
+
+    def score_many(self, words):
+        ''' score() of each of the words, as a numpy array; much faster than scoring them one at a time '''
+        return self.get_automaton().log_probabilities(words)
+
+    def get_features(self):
+        ''' The language's feature vectors, for finding similar languages (see similarity.py) '''
+        import similarity
+        return similarity.get_features(self)
 
 
     def get_word(self, meaning):
         ''' Gets a word from the dictionary, creating it if it doesn't exist '''
         if meaning not in self.vocabulary:
-            self.create_word(meaning=meaning, number_of_syllables=random.choice((1, 2)))
+            self.create_word(meaning=meaning, number_of_syllables=self.rng.choice((1, 2)))
 
         return self.vocabulary[meaning]
 
 
+    def reject_similar_words(self, distance, weighted=False):
+        ''' From now on, redraw any word made for a meaning which is within this phoneme edit distance of a
+            word already in the vocabulary (see bktree.py). None to allow them again.
+
+            A descendant whose parent rejects similar words (with the same weighting) searches the parent's
+            index too, so only its own words are indexed here; its inherited words are never copied in '''
+        import bktree
+        self.similar_word_distance = distance
+        self.word_index = None
+        self.inherited_word_indexes = ()
+
+        if distance is not None:
+            self.word_index = bktree.BKTree(distance=bktree.PhonemeDistance(weighted=weighted))
+            keys = self.vocabulary
+            parent_index = self.parent.word_index if self.parent is not None else None
+            if parent_index is not None and parent_index.distance.weighted == weighted:
+                self.inherited_word_indexes = self.parent.inherited_word_indexes + (parent_index,)
+                keys = self.vocabulary.words
+
+            for key in sorted(keys):
+                word = peek_word(self.vocabulary, key)
+                self.word_index.add(word.phoneme_ids, (key, word))
+
+    def has_similar_word(self, word, key):
+        ''' Whether a vocabulary word other than the one under the key is within the similar word distance '''
+        for word_index in self.inherited_word_indexes + (self.word_index,):
+            for _, _, values in word_index.find_within(word.phoneme_ids, self.similar_word_distance):
+                for other_key, other_word in values:
+                    if other_key == key:
+                        continue
+                    # Words which have since been replaced in the vocabulary don't count
+                    vocabulary_word = peek_word(self.vocabulary, other_key)
+                    if vocabulary_word is not None and vocabulary_word.is_copy_of(other_word):
+                        return True
+        return False
+
+    def find_similar_words(self, distance, weighted=False):
+        ''' Every pair of vocabulary words within the phoneme edit distance of each other, as
+            (key, key of the other word, distance) '''
+        import bktree
+        return bktree.find_near_duplicates(((peek_word(self.vocabulary, key).phoneme_ids, key) for key in sorted(self.vocabulary)),
+                                           distance=distance, weighted=weighted)
+
+    def add_to_vocabulary(self, key, word):
+        self.vocabulary[key] = word
+        if self.word_index is not None:
+            self.word_index.add(word.phoneme_ids, (key, word))
+
+
     def create_word(self, meaning, etymology=None, number_of_syllables=2):
         ''' Generate a word in the language, using the appropriate phoneme frequencies '''
+        word = self.draw_word(meaning=meaning, number_of_syllables=number_of_syllables)
+
+        if meaning and self.word_index is not None:
+            for _ in xrange(MAX_SIMILAR_WORD_REDRAWS):
+                if not self.has_similar_word(word, key=meaning):
+                    break
+                word = self.draw_word(meaning=meaning, number_of_syllables=number_of_syllables)
+
+        # Add to vocabulary if it has a meaning
+        if meaning:
+            self.add_to_vocabulary(meaning, word)
+
+        return word
+
+    def draw_word(self, meaning, number_of_syllables):
         syllables = []
         # Set to None so that the first onset knows that it's word-initial (no coda comes before the first syllable)
         coda = None
@@ -732,13 +1123,7 @@ class Language:
 
             syllables.append(Syllable(onset=onset, nucleus=nucleus, coda=coda))
 
-        word = Word(meaning=meaning, language=self, syllables=syllables)
-
-        # Add to vocabulary if it has a meaning
-        if meaning:
-            self.vocabulary[meaning] = word
-
-        return word
+        return Word(meaning=meaning, language=self, syllables=syllables)
 
 
     def create_compound_word(self, meaning, english_morphemes):
@@ -756,7 +1141,7 @@ class Language:
             # If the word is short enough, the entire thing may be appended
             if original_word.number_of_non_empty_phonemes() <= MAX_COMPOUND_WORD_PHONEMES_PER_SECTION \
                         and len(syllables) <= MAX_COMPOUND_WORD_SYLLABLES_BEFORE_FORCE_USING_WORD_ROOT\
-                        and chance(USE_FULL_WORD_FOR_COMPOUND_WORD_CHANCE):
+                        and self.rng.chance(USE_FULL_WORD_FOR_COMPOUND_WORD_CHANCE):
                 # !! Make sure to make a copy of the original word's syllables or weird stuff happens. Deepcopy appears to not be
                 # necessary... but it's probably a good idea
                 syllables = self.trim_syllables(current_syllables=deepcopy(original_word.syllables), all_current_syllables=syllables)
@@ -772,7 +1157,7 @@ class Language:
         # Create the word
         compound_word = Word(meaning=meaning, language=self, syllables=syllables, etymology=etymology)
         # Add to dictionary
-        self.vocabulary[english_morphemes] = compound_word
+        self.add_to_vocabulary(english_morphemes, compound_word)
 
         return compound_word
 
@@ -784,14 +1169,14 @@ class Language:
         # --- Make sure the current syllable's first phoneme is not the same as the previous syllable's last phoneme --- #
         if len(all_current_syllables) and all_current_syllables[-1].coda.phoneme_ids[-1] == current_syllables[0].onset.phoneme_ids[0]:
             # Keep the syllable the same, but with an empty onset
-            current_syllables = self.pop_and_replace_with_onset(current_syllables=current_syllables, new_onset=p.data.empty_onset)
+            current_syllables = self.pop_and_replace_with_onset(current_syllables=current_syllables, new_onset=self.phoneme_data.empty_onset)
             all_current_syllables.extend(current_syllables)
 
         # -- One the rare case there is an empty coda followed by an empty onset, add a consonant between them --- #
         elif len(all_current_syllables) and all_current_syllables[-1].coda.is_empty() and current_syllables[0].onset.is_empty():
             # Choose an onset from the list of this language's valid onsets. (Syllable position shouldn't matter for picking
             # an onset, but here we're choosing a value of 1 (middle of word) anyway. Loop to ensure an empty onset is not chosen!
-            dividing_onset = p.data.empty_onset
+            dividing_onset = self.phoneme_data.empty_onset
             while dividing_onset.is_empty():
                 dividing_onset = self.choose_valid_onset(previous_coda=all_current_syllables[-1].coda, syllable_position=1)
 
@@ -799,12 +1184,12 @@ class Language:
             all_current_syllables.extend(current_syllables)
 
         # --- If the previous coda is not complex, and the current onset is not complex, join without truncating anything --- #
-        elif len(all_current_syllables) and chance(50) and (not all_current_syllables[-1].coda.is_complex()) and (not current_syllables[0].onset.is_complex()):
+        elif len(all_current_syllables) and self.rng.chance(50) and (not all_current_syllables[-1].coda.is_complex()) and (not current_syllables[0].onset.is_complex()):
             all_current_syllables.extend(current_syllables)
 
         # --- If the previous coda is not empty, and the current onset is not empty, join after truncating current syllable's onset --- #
         elif len(all_current_syllables) and (not all_current_syllables[-1].coda.is_empty()) and (not current_syllables[0].onset.is_empty()):
-            current_syllables = self.pop_and_replace_with_onset(current_syllables=current_syllables, new_onset=p.data.empty_onset)
+            current_syllables = self.pop_and_replace_with_onset(current_syllables=current_syllables, new_onset=self.phoneme_data.empty_onset)
             all_current_syllables.extend(current_syllables)
 
         # --- Otherwise, join without truncating anything --- #
@@ -830,8 +1215,8 @@ class Language:
         table_data = []
 
         for component_type in ('onset', 'coda', 'nucleus'):
-            probabilities = sorted(((self.probabilities[component_type][syllable_component], syllable_component) 
-                for syllable_component in self.probabilities[component_type].keys()), reverse=True)
+            probabilities = [(self.probabilities[component_type][syllable_component], syllable_component) 
+                for syllable_component in sort_by_probability(self.probabilities[component_type])]
             
             table_data.append('{0: >4} {1}'.format(perc, syllable_component) for perc, syllable_component in probabilities)
 
@@ -852,8 +1237,8 @@ class Language:
         compound_word_choices = []
 
         while len(compound_word_choices) <= 12:
-            adj = random.choice(adjectives)
-            noun = random.choice(nouns)
+            adj = self.rng.choice(adjectives)
+            noun = self.rng.choice(nouns)
 
             compound_word = '{0} {1}'.format(adj, noun)
 
@@ -863,22 +1248,22 @@ class Language:
         return [self.create_compound_word(meaning=cw, english_morphemes=cw) for cw in compound_word_choices]
 
     def get_sample_vocabulary_words(self):
+        return [self.get_word(english_word) for english_word in self.rng.sample(SAMPLE_VOCABULARY_WORDS, SAMPLE_VOCABULARY_SIZE)]
 
-        sample_words = ['city', 'house', 'teacher', 'student', 'lawyer', 'doctor', 'patient', 'waiter', 'secretary',
-                        'priest', 'police', 'army', 'soldier', 'artist', 'author', 'manager', 'reporter', 'actor',
-                        'hat', 'dress', 'shirt', 'pants', 'shoes', 'coat', 'son', 'daughter', 'mother', 'father', 'baby',
-                        'man', 'woman', 'brother', 'sister', 'king', 'queen', 'president', 'boy', 'girl', 'child', 'human',
-                        'friend', 'cheese', 'bread', 'soup', 'cake', 'chicken', 'apple', 'banana', 'orange', 'lemon', 'corn',
-                        'rice', 'oil', 'seed', 'table', 'chair', 'bed', 'dream', 'window', 'door', 'book', 'key', 'letter',
-                        'note', 'bag', 'box', 'tool', 'dog', 'cat', 'fish', 'bird', 'cow', 'pig', 'mouse', 'horse']
 
-        return [self.get_word(english_word) for english_word in random.sample(sample_words, 20)]
+if __name__ == '__main__':
+    # With arguments, this is the batch generation tool (see cli.py); without, a quick demo
+    if len(sys.argv) > 1:
+        import cli
+        cli.main()
+        sys.exit()
 
+    seed = roll(0, 32000)
+    print ' -- Running with random seed', seed
 
-if __name__ == '__main__':
     print ''
 
-    t = Language()
+    t = Language(seed=seed)
     t.generate_language_properties()
 
     t.info_dump()
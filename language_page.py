@@ -0,0 +1,99 @@
+from __future__ import division, unicode_literals
+import os
+from random import randint as roll
+
+import lang_gen
+from singleflight import SingleFlight
+
+'''
+Builds the language page. Shared by the App Engine app (lang_gen_app.py) and the
+platform-neutral WSGI entry point (main.py).
+'''
+
+TEMPLATE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# Templates precompiled to python modules by build.py, which saves parsing them on a cold start
+COMPILED_TEMPLATE_DIRECTORY = os.path.join(TEMPLATE_DIRECTORY, 'build', 'templates')
+
+PAGE_TEMPLATE = 'index.html'
+
+LANGUAGE_ADJECTIVES = (
+    'noble', 'dignified', 'distinguished', 'extraordinary', 'great', 'magnificent', 'remarkable',
+    'magnanimous', 'meritorious', 'esteemed', 'eminent', 'illustrious', 'renowned', 'venerable',
+    'baffling', 'curious', 'mysterious', 'cryptic', 'enigmatic', 'inscrutiable', 'peculiar', 'marvelous',
+    'wondrous'
+)
+
+DESC_1_ADJECTIVES = ['captivating', 'stunning', 'breathtaking', 'fascinating']
+
+DESC_1_NOUNS = ['specimen', 'tongue', 'discovery']
+
+# A shared seed link tends to bring in many requests for the same language at once; only
+# the first of them generates the language, and the rest wait for it and reuse its result
+LANGUAGE_REQUESTS = SingleFlight()
+
+
+def create_jinja_environment(use_compiled_templates=True):
+    ''' The jinja environment for the page. Loads the precompiled templates if they have been built '''
+    import jinja2
+
+    if use_compiled_templates and os.path.isdir(COMPILED_TEMPLATE_DIRECTORY):
+        loader = jinja2.ModuleLoader(COMPILED_TEMPLATE_DIRECTORY)
+    else:
+        loader = jinja2.FileSystemLoader(TEMPLATE_DIRECTORY)
+
+    return jinja2.Environment(loader=loader, extensions=['jinja2.ext.autoescape'], autoescape=True)
+
+
+def get_requested_seed(seed):
+    ''' Use the seed from the query string (so that a language can be linked to), or pick a new one '''
+    if seed and seed.isdigit():
+        return int(seed)
+    return roll(0, 32000)
+
+
+def new_language(seed):
+    language = lang_gen.Language(seed=seed)
+    language.generate_language_properties()
+
+    name = language.create_word(meaning='Name of language', number_of_syllables=2)
+    vocabulary = language.get_sample_vocabulary_words()
+    # Split into 2 equal sublists for display
+    vocab1 = vocabulary[:int(len(vocabulary)/2)]
+    vocab2 = vocabulary[int(len(vocabulary)/2):]
+
+    compound_words = language.get_sample_word_sets()
+
+    onset_description, coda_description = language.describe_syllable_level_rules()
+
+    language_adjective = language.rng.choice(LANGUAGE_ADJECTIVES)
+    language_description = '{0} {1}'.format(language.rng.choice(DESC_1_ADJECTIVES), language.rng.choice(DESC_1_NOUNS))
+
+    return language, name, vocab1, vocab2, compound_words, onset_description, coda_description, language_adjective, language_description
+
+
+def get_template_values(seed):
+    ''' Everything displayed on the page for the language with this seed. Concurrent requests
+        for the same seed share a single generation '''
+    return LANGUAGE_REQUESTS.do(seed, build_template_values, seed)
+
+
+def build_template_values(seed):
+    ''' Generate the language for a seed, and everything about it which gets displayed on the page '''
+    language, name, vocab1, vocab2, compound_words, onset_description, coda_description, language_adjective, language_description = new_language(seed)
+
+    template_values = {
+        'seed': seed,
+        'name': name,
+        'adjective': language_adjective,
+        'language_description': language_description,
+        'vocab1': vocab1,
+        'vocab2': vocab2,
+        'compound_words': compound_words,
+        'descriptions': [onset_description, coda_description],
+        'number_of_consonants': len(language.valid_consonants),
+        'number_of_vowels':len(language.probabilities['nucleus']),
+        'consonants': sorted([language.orthography.mapping[consonant.id_].get_description() for consonant in language.valid_consonants], key=lambda desc_tuple: desc_tuple[0]),
+        'vowels': sorted([language.orthography.mapping[vowel.id_].get_description() for vowel in language.valid_vowels], key=lambda desc_tuple: desc_tuple[0]),
+    }
+
+    return template_values
@@ -0,0 +1,152 @@
+from __future__ import division, unicode_literals
+import re
+
+import phonemes as p
+
+'''
+Words encoded as byte strings, one byte per phoneme, so that whole vocabularies can be matched
+and rewritten with regular expressions and string operations that run in C rather than a
+python loop per word.
+
+A phoneme's byte is its id - PHONEME_ID_OFFSET: vowels (101-115) are bytes 1-15, consonants
+(201-299) bytes 101-199, and the empty onset / coda placeholders (300, 301) bytes 200 and 201.
+encode() leaves the placeholders out, as they aren't sounds. Byte 0 and the bytes above 201 are
+never phonemes, so they can be used to join and mark up encoded words (SEPARATOR, SLOT_MARKERS).
+encode_syllables() marks where each onset, nucleus and coda starts with SLOT_MARKERS, so that
+a word's syllables can be read back from the bytes.
+
+Patterns over encoded words describe phonemes the way the rule files describe consonants
+(see parse_phonemes()), and compile to regular expressions one byte per phoneme
+(compile_sequence()).
+'''
+
+PHONEME_ID_OFFSET = 100
+# Ids from here up are the empty onset / coda placeholders
+EMPTY_PHONEME_ID_BASE = 300
+
+# Joins the words of a lexicon into one string (see EncodedLexicon.join)
+SEPARATOR = b'\x00'
+# Put before each syllable component by encode_syllables()
+SLOT_MARKERS = {'onset': b'\xfc', 'nucleus': b'\xfd', 'coda': b'\xfe'}
+SLOTS = ('onset', 'nucleus', 'coda')
+
+# Phoneme descriptions can name a class of phonemes with these
+VOWEL_CLASS = 'V'
+CONSONANT_CLASS = 'C'
+# The start or end of a word, in a sequence
+WORD_BOUNDARY = '#'
+
+
+def encode_phoneme_id(phoneme_id):
+    return chr(phoneme_id - PHONEME_ID_OFFSET)
+
+
+# The byte of each phoneme id, by id; '' for the empty placeholders (and ids which aren't phonemes)
+ENCODED_PHONEME_IDS = [b''] * PHONEME_ID_OFFSET + [encode_phoneme_id(phoneme_id) for phoneme_id in xrange(PHONEME_ID_OFFSET, EMPTY_PHONEME_ID_BASE)] + [b''] * 2
+
+
+def encode(phoneme_ids):
+    ''' The byte string for a sequence of phoneme ids, without the empty placeholders '''
+    return b''.join(map(ENCODED_PHONEME_IDS.__getitem__, phoneme_ids))
+
+
+def decode(encoded):
+    ''' The phoneme ids of an encoded word '''
+    return tuple(ord(byte) + PHONEME_ID_OFFSET for byte in encoded)
+
+
+# For each slot, the SLOT_MARKER and phonemes of its components, by their phoneme ids; so many words share
+# each component that they're only encoded once
+ENCODED_COMPONENTS = {slot: {} for slot in SLOTS}
+
+def encode_syllables(syllables):
+    ''' The byte string for a word's syllables, each component marked with its SLOT_MARKER (empty ones too) '''
+    encoded_onsets, encoded_nuclei, encoded_codas = [ENCODED_COMPONENTS[slot] for slot in SLOTS]
+    encoded_components = []
+    for syllable in syllables:
+        for encoded, slot, phoneme_ids in ((encoded_onsets, 'onset', syllable.onset.phoneme_ids),
+                                           (encoded_nuclei, 'nucleus', syllable.nucleus.phoneme_ids),
+                                           (encoded_codas, 'coda', syllable.coda.phoneme_ids)):
+            if phoneme_ids not in encoded:
+                encoded[phoneme_ids] = SLOT_MARKERS[slot] + encode(phoneme_ids)
+            encoded_components.append(encoded[phoneme_ids])
+    return b''.join(encoded_components)
+
+
+class EncodedLexicon:
+    ''' Encoded words, each with a key (such as its meaning), in a fixed order '''
+    def __init__(self, keys, encoded_words):
+        self.keys = list(keys)
+        self.encoded_words = list(encoded_words)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def join(self):
+        ''' Every word in one string, each with a SEPARATOR before and after it '''
+        return SEPARATOR + SEPARATOR.join(self.encoded_words) + SEPARATOR
+
+    def split(self, joined):
+        ''' A lexicon with the same keys as this one, from a string made by join() (and then rewritten) '''
+        encoded_words = joined[1:-1].split(SEPARATOR)
+        if len(encoded_words) != len(self.keys):
+            raise ValueError('the joined lexicon has {0} words rather than {1}'.format(len(encoded_words), len(self.keys)))
+        return EncodedLexicon(self.keys, encoded_words)
+
+    def get_phoneme_ids(self, index):
+        return decode(self.encoded_words[index])
+
+
+def encode_vocabulary(vocabulary):
+    ''' An EncodedLexicon of a language's vocabulary (or any {key: Word}), in key order '''
+    keys = sorted(vocabulary)
+    return EncodedLexicon(keys, [encode(vocabulary[key].phoneme_ids) for key in keys])
+
+
+def encode_words(words):
+    ''' An EncodedLexicon of a list of words, keyed by their position '''
+    return EncodedLexicon(xrange(len(words)), [encode(word.phoneme_ids) for word in words])
+
+
+# ------------------------------------------ Patterns ------------------------------------------ #
+
+def is_consonant(phoneme):
+    return isinstance(phoneme, p.Consonant) and phoneme.id_ < EMPTY_PHONEME_ID_BASE
+
+
+def parse_phonemes(text):
+    ''' The phonemes a description stands for: "<location> <method> <voicing> [except <id> ...]" as in the
+        rule files, a phoneme id, VOWEL_CLASS or CONSONANT_CLASS '''
+    text = text.strip()
+    if text == VOWEL_CLASS:
+        return list(p.VOWELS)
+    if text == CONSONANT_CLASS:
+        return [consonant for consonant in p.CONSONANTS if is_consonant(consonant)]
+    if text.isdigit():
+        if int(text) not in p.PHONEMES_BY_ID or int(text) >= EMPTY_PHONEME_ID_BASE:
+            raise ValueError('there is no phoneme {0}'.format(text))
+        return [p.PHONEMES_BY_ID[int(text)]]
+
+    rule = p.parse_rule(text)
+    return [consonant for consonant in p.CONSONANT_INDEX.find(rule.location, rule.method, rule.voicing, rule.exceptions) if is_consonant(consonant)]
+
+
+def compile_phoneme_class(phonemes):
+    ''' A regular expression (a byte string, as phoneme bytes go above 127) matching any one of the phonemes '''
+    return b'[' + b''.join(re.escape(encode_phoneme_id(phoneme.id_)) for phoneme in phonemes) + b']'
+
+
+def compile_sequence(text, gap=b''):
+    ''' A regular expression for a "+" separated sequence of phoneme descriptions and WORD_BOUNDARY, one byte
+        each; the gap is put between the elements, to step over anything else the words are marked up with '''
+    elements = []
+    for element in text.split('+'):
+        element = element.strip()
+        if element == WORD_BOUNDARY:
+            elements.append(re.escape(SEPARATOR))
+        else:
+            phonemes = parse_phonemes(element)
+            if not phonemes:
+                raise ValueError('"{0}" doesn\'t describe any phonemes'.format(element))
+            elements.append(compile_phoneme_class(phonemes))
+    return gap.join(elements)
@@ -0,0 +1,302 @@
+from __future__ import division, unicode_literals
+import os
+import sys
+import time
+import types
+import random
+import argparse
+import threading
+import urllib2
+import multiprocessing
+from collections import OrderedDict
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+'''
+Local load-testing harness for the web app. Serves the WSGI app with a threaded server
+from the standard library (no App Engine sandbox needed), drives it with a number of
+concurrent clients, and reports throughput, latency percentiles, and the CPU / memory
+use of the server process.
+
+    python loadtest.py --clients 8 --duration 20
+'''
+
+# Modules which lang_gen_app imports from the App Engine SDK. They are unused, so empty
+# placeholder modules are enough to import the app outside of the sandbox
+APP_ENGINE_MODULES = ('google', 'google.appengine', 'google.appengine.api', 'google.appengine.api.users',
+                      'google.appengine.ext', 'google.appengine.ext.ndb')
+
+# The latency percentiles which get reported for each route
+REPORTED_PERCENTILES = (50, 95, 99)
+
+# How often (in seconds) the server process gets sampled for CPU and memory use
+RESOURCE_SAMPLE_INTERVAL = .25
+
+
+def stub_app_engine_modules():
+    ''' Insert empty modules for the App Engine SDK, unless the real SDK is available '''
+    try:
+        from google.appengine.api import users
+        from google.appengine.ext import ndb
+        return
+    except ImportError:
+        pass
+
+    for module_name in APP_ENGINE_MODULES:
+        module = sys.modules.setdefault(module_name, types.ModuleType(str(module_name)))
+        # Hook each stub up to its parent package so that "from x import y" works
+        if '.' in module_name:
+            parent_name, _, child_name = module_name.rpartition('.')
+            setattr(sys.modules[parent_name], str(child_name), module)
+
+
+class ThreadedWSGIServer(ThreadingMixIn, WSGIServer):
+    ''' The standard library WSGI server, handling each request in its own thread '''
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    ''' Don't print a line to stderr for every request that gets served '''
+    def log_message(self, format, *args):
+        pass
+
+
+def load_app(app_path):
+    ''' Import the WSGI app from a "module.attribute" path '''
+    stub_app_engine_modules()
+
+    module_name, _, attribute = app_path.partition('.')
+    module = __import__(module_name)
+    return getattr(module, attribute)
+
+
+def serve(app_path, host, port, ready):
+    ''' Run the app in a threaded WSGI server until the process is terminated '''
+    server = make_server(host, port, load_app(app_path), server_class=ThreadedWSGIServer, handler_class=QuietRequestHandler)
+    ready.set()
+    server.serve_forever()
+
+
+# ------------------------------------- Resource sampling ------------------------------------- #
+
+def read_process_usage(pid):
+    ''' Returns the (cpu seconds, resident memory in bytes) used by a process so far.
+        Reads from /proc, so this will only return numbers on Linux '''
+    try:
+        with open('/proc/{0}/stat'.format(pid)) as stat_file:
+            # The process name can contain spaces, so split after the closing parenthesis
+            fields = stat_file.read().rpartition(')')[2].split()
+        with open('/proc/{0}/statm'.format(pid)) as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+    except IOError:
+        return None
+
+    ticks_per_second = os.sysconf(str('SC_CLK_TCK'))
+    # utime and stime are the 14th and 15th fields of the stat file (12th and 13th after the name)
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks_per_second
+
+    return cpu_seconds, resident_pages * os.sysconf(str('SC_PAGE_SIZE'))
+
+
+class ResourceSampler(threading.Thread):
+    ''' Periodically samples the CPU and memory use of a process while the load test runs '''
+    def __init__(self, pid, interval=RESOURCE_SAMPLE_INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            usage = read_process_usage(self.pid)
+            if usage is None:
+                return
+            self.samples.append((time.time(), usage[0], usage[1]))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def summarize(self):
+        ''' Average CPU use (as a percentage of one core) and the average / peak resident memory '''
+        if len(self.samples) < 2:
+            return None
+
+        (start_time, start_cpu, _), (end_time, end_cpu, _) = self.samples[0], self.samples[-1]
+        rss = [sample[2] for sample in self.samples]
+
+        return {
+            'cpu_percent': 100 * (end_cpu - start_cpu) / (end_time - start_time),
+            'rss_mean_mb': sum(rss) / len(rss) / 2**20,
+            'rss_peak_mb': max(rss) / 2**20,
+        }
+
+
+# --------------------------------------- Load generation --------------------------------------- #
+
+class Route:
+    ''' A family of URLs on the app, with the latency of every request made to it '''
+    def __init__(self, name, path_generator):
+        self.name = name
+        self.path_generator = path_generator
+
+        self.latencies = []
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        ''' Forget the requests made so far, such as those of a warmup '''
+        with self.lock:
+            self.latencies = []
+            self.errors = 0
+
+    def record(self, latency, failed):
+        with self.lock:
+            if failed:  self.errors += 1
+            else:       self.latencies.append(latency)
+
+    def summarize(self, duration):
+        ''' Requests per second and latency percentiles (in milliseconds) for this route '''
+        latencies = sorted(self.latencies)
+        summary = OrderedDict()
+        summary['requests'] = len(latencies)
+        summary['errors'] = self.errors
+        summary['rps'] = len(latencies) / duration
+
+        for percentile in REPORTED_PERCENTILES:
+            summary['p{0}'.format(percentile)] = 1000 * get_percentile(latencies, percentile) if latencies else None
+
+        return summary
+
+
+def get_percentile(sorted_values, percentile):
+    ''' Nearest-rank percentile of an already sorted list '''
+    index = int(round(percentile / 100 * len(sorted_values) + .5)) - 1
+    return sorted_values[min(max(index, 0), len(sorted_values) - 1)]
+
+
+def build_routes(number_of_seeds):
+    ''' The routes which get exercised: a fresh random language, and languages linked to by seed.
+        Seeds are drawn from a fixed pool, so the same seed gets requested repeatedly (as happens
+        when a link to a language is shared) '''
+    seed_pool = [random.randint(0, 32000) for _ in xrange(number_of_seeds)]
+
+    return [
+        Route(name='/', path_generator=lambda: '/'),
+        Route(name='/?seed=<n>', path_generator=lambda: '/?seed={0}'.format(random.choice(seed_pool))),
+    ]
+
+
+def run_client(base_url, routes, deadline, timeout):
+    ''' Keep making requests against randomly chosen routes until the deadline '''
+    while time.time() < deadline:
+        route = random.choice(routes)
+        start = time.time()
+        try:
+            urllib2.urlopen(base_url + route.path_generator(), timeout=timeout).read()
+            failed = False
+        except Exception:
+            failed = True
+
+        route.record(latency=time.time() - start, failed=failed)
+
+
+def run_load_test(base_url, routes, clients, duration, timeout, server_pid=None):
+    ''' Drive the server with a number of concurrent clients for a fixed duration '''
+    sampler = ResourceSampler(pid=server_pid) if server_pid else None
+    if sampler: sampler.start()
+
+    deadline = time.time() + duration
+    threads = [threading.Thread(target=run_client, args=(base_url, routes, deadline, timeout)) for _ in xrange(clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    if sampler: sampler.stop()
+
+    return elapsed, (sampler.summarize() if sampler else None)
+
+
+def print_report(routes, elapsed, resource_summary):
+    def format_value(value):
+        if value is None:           return '-'
+        if isinstance(value, int):  return '{0}'.format(value)
+        return '{0:.1f}'.format(value)
+
+    summaries = [(route.name, route.summarize(duration=elapsed)) for route in routes]
+    columns = summaries[0][1].keys()
+
+    print '{: <14}'.format('route') + ''.join('{: >10}'.format(column) for column in columns)
+    for name, summary in summaries:
+        print '{: <14}'.format(name) + ''.join('{: >10}'.format(format_value(summary[column])) for column in columns)
+
+    total_requests = sum(summary['requests'] for _, summary in summaries)
+    print ''
+    print 'Total: {0} requests in {1:.1f}s ({2:.1f} requests/sec)'.format(total_requests, elapsed, total_requests / elapsed)
+
+    if resource_summary:
+        print 'Server: {cpu_percent:.0f}% cpu, {rss_mean_mb:.1f} MB mean rss, {rss_peak_mb:.1f} MB peak rss'.format(**resource_summary)
+
+
+def print_server_stats(base_url, timeout):
+    ''' Print the counters the server exposes (such as coalesced requests), if it has any '''
+    try:
+        stats = urllib2.urlopen(base_url + '/_stats', timeout=timeout).read()
+    except Exception:
+        return
+    print 'Server stats: {0}'.format(', '.join(stats.splitlines()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the language generator web app')
+    parser.add_argument('--app', default='lang_gen_app.app', help='WSGI app to serve, as module.attribute')
+    parser.add_argument('--url', default=None, help='Test an already running server instead of starting one')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--clients', type=int, default=4, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run the test for')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds of untimed requests before the test')
+    parser.add_argument('--seeds', type=int, default=50, help='Number of distinct seeds to request')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        base_url = 'http://127.0.0.1:{0}'.format(args.port)
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve, args=(args.app, '127.0.0.1', args.port, ready))
+        server.daemon = True
+        server.start()
+        if not ready.wait(30):
+            sys.exit('Server did not start')
+
+    try:
+        # The warmup requests the same seed pool as the test, so the languages it caches are the ones which get measured
+        routes = build_routes(args.seeds)
+        if args.warmup:
+            run_load_test(base_url, routes, args.clients, args.warmup, args.timeout)
+            for route in routes:
+                route.reset()
+
+        elapsed, resource_summary = run_load_test(base_url, routes, args.clients, args.duration, args.timeout,
+                                                  server_pid=server.pid if server else None)
+        print_report(routes, elapsed, resource_summary)
+        print_server_stats(base_url, args.timeout)
+
+    finally:
+        if server:
+            server.terminate()
+
+
+if __name__ == '__main__':
+    main()
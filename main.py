@@ -0,0 +1,128 @@
+from __future__ import division, unicode_literals
+import time
+MODULE_LOAD_START = time.time()
+
+import os
+import sys
+import logging
+import threading
+import urlparse
+from collections import OrderedDict
+
+'''
+Platform-neutral WSGI entry point for the language page, for any WSGI server:
+
+    gunicorn main:app
+
+Importing this module is cheap - the generator, the phoneme tables, and the template
+are only loaded when a request first needs them (or when /_ah/warmup is requested).
+Run "python build.py" before deploying, so that the template is precompiled and the
+phoneme tables can be loaded from a prebuilt artifact. Run "python main.py" to see
+how long each stage of a cold start takes.
+'''
+
+ROOT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Static files which app.yaml serves on App Engine, for servers which don't handle them separately
+STATIC_FILES = {
+    '/favicon.ico': ('favicon.ico', str('image/x-icon')),
+    '/stylesheets/main.css': (os.path.join('stylesheets', 'main.css'), str('text/css')),
+}
+
+
+class Startup:
+    ''' Loads each piece of the app the first time it's needed, and records how long each stage took '''
+    def __init__(self):
+        self.timings = OrderedDict()
+        self.lock = threading.RLock()
+
+        self.language_page = None
+        self.template = None
+
+    def timed(self, stage, loader):
+        start = time.time()
+        result = loader()
+        self.timings[stage] = time.time() - start
+        logging.info('Startup stage "%s" took %.1f ms', stage, 1000 * self.timings[stage])
+        return result
+
+    def get_language_page(self):
+        with self.lock:
+            if self.language_page is None:
+                # Import the phoneme tables on their own first, so that they get their own timing
+                self.timed('phoneme tables', lambda: __import__('phonemes'))
+                self.language_page = self.timed('generator', lambda: __import__('language_page'))
+            return self.language_page
+
+    def get_template(self):
+        with self.lock:
+            if self.template is None:
+                language_page = self.get_language_page()
+                self.template = self.timed('template', lambda: language_page.create_jinja_environment().get_template(language_page.PAGE_TEMPLATE))
+            return self.template
+
+    def load_all(self):
+        self.get_template()
+
+    def report(self):
+        ''' A printable breakdown of the time spent in each stage so far '''
+        lines = ['{0: <16} {1: >8.1f} ms'.format(stage, 1000 * seconds) for stage, seconds in self.timings.iteritems()]
+        lines.append('{0: <16} {1: >8.1f} ms'.format('total', 1000 * sum(self.timings.values())))
+        return '\n'.join(lines)
+
+
+startup = Startup()
+
+
+def render_language_page(environ):
+    seed = urlparse.parse_qs(environ.get('QUERY_STRING', '')).get('seed', [None])[0]
+
+    language_page = startup.get_language_page()
+    template_values = language_page.get_template_values(language_page.get_requested_seed(seed))
+
+    return startup.get_template().render(template_values).encode('utf-8')
+
+
+def app(environ, start_response):
+    path = environ.get('PATH_INFO') or '/'
+
+    if path == '/':
+        body = render_language_page(environ)
+        content_type = str('text/html; charset=utf-8')
+
+    # App Engine sends this before routing traffic to a new instance; other platforms can hit it too
+    elif path == '/_ah/warmup':
+        startup.load_all()
+        body, content_type = startup.report().encode('utf-8'), str('text/plain')
+
+    # Counts of language generations which were computed, versus coalesced into one already running
+    elif path == '/_stats':
+        stats = startup.get_language_page().LANGUAGE_REQUESTS.get_stats()
+        body = '\n'.join('{0}: {1}'.format(name, value) for name, value in sorted(stats.iteritems())).encode('utf-8')
+        content_type = str('text/plain')
+
+    elif path in STATIC_FILES:
+        file_name, content_type = STATIC_FILES[path]
+        with open(os.path.join(ROOT_DIRECTORY, file_name), 'rb') as static_file:
+            body = static_file.read()
+
+    else:
+        start_response(str('404 Not Found'), [(str('Content-Type'), str('text/plain'))])
+        return [b'Not found']
+
+    start_response(str('200 OK'), [(str('Content-Type'), content_type), (str('Content-Length'), str(len(body)))])
+    return [body]
+
+
+startup.timings['entry point'] = time.time() - MODULE_LOAD_START
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        from wsgiref.simple_server import make_server
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+        make_server('', port, app).serve_forever()
+
+    else:
+        startup.load_all()
+        print startup.report()
@@ -1,11 +1,10 @@
 # coding=Latin-1
 
 from __future__ import division, unicode_literals
-from random import randint as roll
-import random
 from collections import defaultdict, OrderedDict
+from copy import copy
 
-from helpers import weighted_random, chance, join_list
+from helpers import join_list
 import phonemes as p
 
 ## Vowels: English mapping
@@ -86,37 +85,37 @@ strange_f = chr(159)
 
 ## Groups of symbols
 
-RIGHT_ACCENTS = OrderedDict({
-    a_r: (105, 106, 107),
-    e_r: (102, 104),
-    i_r: (101, 102, 108),
-    o_r: (109, ), 
-    u_r: (103, 110, 111)
-})
-
-LEFT_ACCENTS =  OrderedDict({
-    a_l: (105, 106, 107),
-    e_l: (102, 104),
-    i_l: (101, 102, 108),
-    o_l: (109, ), 
-    u_l: (103, 110, 111)
-})
-
-CARROTS = OrderedDict({
-    a_c: (105, 106, 107),
-    e_c: (102, 104),
-    i_c: (101, 108), # 102:i_c
-    o_c: (109, ), 
-    u_c: (103, 110, 111),
-})
-
-UMLAUTS = OrderedDict({
-    a_u: (105, 106, 107),
-    e_u: (102, 104),
-    i_u: (101, 108), # 102:i_u
-    o_u: (109, ), 
-    u_u: (103, 110, 111),
-})
+RIGHT_ACCENTS = OrderedDict([
+    (a_r, (105, 106, 107)),
+    (e_r, (102, 104)),
+    (i_r, (101, 102, 108)),
+    (o_r, (109, )),
+    (u_r, (103, 110, 111)),
+])
+
+LEFT_ACCENTS =  OrderedDict([
+    (a_l, (105, 106, 107)),
+    (e_l, (102, 104)),
+    (i_l, (101, 102, 108)),
+    (o_l, (109, )),
+    (u_l, (103, 110, 111)),
+])
+
+CARROTS = OrderedDict([
+    (a_c, (105, 106, 107)),
+    (e_c, (102, 104)),
+    (i_c, (101, 108)), # 102:i_c
+    (o_c, (109, )),
+    (u_c, (103, 110, 111)),
+])
+
+UMLAUTS = OrderedDict([
+    (a_u, (105, 106, 107)),
+    (e_u, (102, 104)),
+    (i_u, (101, 108)), # 102:i_u
+    (o_u, (109, )),
+    (u_u, (103, 110, 111)),
+])
 
 
 
@@ -145,7 +144,18 @@ class Glyph:
         self.at_beginning     = at_beginning     if at_beginning     is not None else normal
         self.at_end           = at_end           if at_end           is not None else normal
 
-         
+    def __setattr__(self, name, value):
+        if self.__dict__.get('frozen'):
+            raise AttributeError('glyph {0} is shared with other orthographies; change a copy (see GlyphMapping.get_writable)'.format(self.phoneme_id))
+        self.__dict__[name] = value
+
+    def freeze(self):
+        self.__dict__['frozen'] = True
+
+    def copy(self):
+        ''' A copy which can be changed, even if this glyph is frozen '''
+        return Glyph(self.phoneme_id, self.normal, before_consonant=self.before_consonant, after_consonant=self.after_consonant,
+                     at_beginning=self.at_beginning, at_end=self.at_end)
 
     def get_glyph(self, position_info):
         ''' Get glyph depending on position in the word '''
@@ -268,14 +278,70 @@ PHONEMES_BY_GLYPH = defaultdict(list)
 
 for phoneme_id, glyph in PHONEMES_WRITTEN.iteritems():
     PHONEMES_BY_GLYPH[glyph.normal].append(phoneme_id)
+    # Every orthography starts from these glyphs, so none of them can be changed
+    glyph.freeze()
+
+
+class GlyphMapping:
+    ''' A phoneme id: Glyph mapping which reads through to a shared base table, and only keeps the
+        glyphs it changes (copy-on-write). The base glyphs are frozen, so a change can't leak from
+        one orthography into every other '''
+    def __init__(self, base):
+        self.base = base
+        self.overlay = {}
+
+    def __getitem__(self, phoneme_id):
+        if phoneme_id in self.overlay:
+            return self.overlay[phoneme_id]
+        return self.base[phoneme_id]
+
+    def __setitem__(self, phoneme_id, glyph):
+        self.overlay[phoneme_id] = glyph
+
+    def __contains__(self, phoneme_id):
+        return phoneme_id in self.overlay or phoneme_id in self.base
+
+    def __iter__(self):
+        for phoneme_id in self.base:
+            yield phoneme_id
+        for phoneme_id in self.overlay:
+            if phoneme_id not in self.base:
+                yield phoneme_id
+
+    def __len__(self):
+        return len(self.base) + sum(phoneme_id not in self.base for phoneme_id in self.overlay)
+
+    def get(self, phoneme_id, default=None):
+        return self[phoneme_id] if phoneme_id in self else default
+
+    def get_writable(self, phoneme_id):
+        ''' The glyph, copied into this mapping first if it's still the shared one (or has been frozen since,
+            because a descendant shares it) '''
+        if phoneme_id not in self.overlay or self.overlay[phoneme_id].__dict__.get('frozen'):
+            self.overlay[phoneme_id] = self[phoneme_id].copy()
+        return self.overlay[phoneme_id]
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[phoneme_id] for phoneme_id in self]
+
+    def items(self):
+        return [(phoneme_id, self[phoneme_id]) for phoneme_id in self]
+
+    def iteritems(self):
+        return ((phoneme_id, self[phoneme_id]) for phoneme_id in self)
 
 
 
 class Orthography:
     ''' Class to map phonemes to letters. Very shallow at the moment '''
-    def __init__(self, parent_language, parent_orthography=None):
+    def __init__(self, parent_language, parent_orthography=None, rng=None):
 
         self.parent_language = parent_language
+        # Orthographies are generated from the random source they're given, or their language's
+        self.rng = rng if rng is not None else parent_language.rng
         # The parent orthography this one is descended from, if any
         self.parent_orthography = parent_orthography
         # A list of languages which can be written in this orthography
@@ -288,8 +354,9 @@ class Orthography:
         glyph_bank = {'q', 'c', 'x', c_s, 'ph', 'dh', 'cn', 'kn', 'gn'}
         used_apostrophe = 0
 
-        # Allow specification of any symbols that are predefined
-        self.mapping = {phoneme: PHONEMES_WRITTEN[phoneme] for phoneme in PHONEMES_WRITTEN}
+        # Allow specification of any symbols that are predefined. Only the glyphs which get replaced or
+        # changed below are kept by the orthography (changes go through get_writable)
+        self.mapping = GlyphMapping(PHONEMES_WRITTEN)
 
         # aspirated_plosives = self.parent_language.get_matching_consonants(method='plosive', special='aspirated')
         # unaspirated_plosives = self.parent_language.get_matching_consonants(method='plosive', special=None)
@@ -298,7 +365,7 @@ class Orthography:
         #     self.syllable_division = '-'
 
         # Potentially replace aspirated plosives with an apostrophe after it's name
-        if chance(15) and not self.syllable_division:
+        if self.rng.chance(15) and not self.syllable_division:
             # used_apostrophe = 1
             self.mapping[251] = Glyph(251, 'p\'', before_consonant='p', at_end='p')  # ph
             self.mapping[252] = Glyph(252, 'b\'', before_consonant='b', at_end='b')  # bh
@@ -307,36 +374,36 @@ class Orthography:
             self.mapping[255] = Glyph(255, 'k\'', before_consonant='k', at_end='k')  # kh
             self.mapping[256] = Glyph(256, 'g\'', before_consonant='g', at_end='g')  # gh
 
-        if 'c' in glyph_bank and chance(40):
+        if 'c' in glyph_bank and self.rng.chance(40):
             glyph_bank.remove('c')
             self.mapping[205] = Glyph(205, 'c')
 
         # -------- /ny/ phoneme ------- #
-        if chance(25):
+        if self.rng.chance(25):
             self.mapping[230] = Glyph(230, 'kn', after_consonant='n', at_end='n') # cn
             self.mapping[231] = Glyph(231, 'gn', after_consonant='n', at_end='n') #
         
-        elif chance(5):
+        elif self.rng.chance(5):
             self.mapping[230] = Glyph(230, 'nh', after_consonant='n', at_end='n') 
             self.mapping[231] = Glyph(231, 'nh', after_consonant='n', at_end='n') 
         # ------------------------------ #
 
-        if chance(35):
+        if self.rng.chance(35):
             self.mapping[232] = Glyph(232, 'cy', before_consonant='c')
             self.mapping[233] = Glyph(233, 'gy', before_consonant='g')
 
-        if chance(45):
+        if self.rng.chance(45):
             self.mapping[236] = Glyph(236, 'x', after_consonant='h') # ch, x c_s  xh
-        elif chance(35):
+        elif self.rng.chance(35):
             self.mapping[236] = Glyph(236, 'ch', after_consonant='h')
             # self.mapping[237] =  # c_s  gh
 
-        if chance(25):
+        if self.rng.chance(25):
             self.mapping[215] = Glyph(215, 'x', before_consonant='sh')
             self.mapping[216] = Glyph(216, 'x', before_consonant='sh')
 
 
-        if chance(25):
+        if self.rng.chance(25):
             self.mapping[212] = Glyph(212, 'dh') # th
 
         # Chance of language putting placeholders where missing onsets / codas go
@@ -347,37 +414,37 @@ class Orthography:
         #     self.mapping[301] = Glyph(301, '-', before_consonant='', at_beginning='', at_end='')
 
         # Chance to give some variation to the "r" letter
-        if chance(35):
-            self.mapping[221].at_beginning = 'rh'
-        if chance(25) and not self.syllable_division:
-            self.mapping[221].normal = 'rr'
+        if self.rng.chance(35):
+            self.mapping.get_writable(221).at_beginning = 'rh'
+        if self.rng.chance(25) and not self.syllable_division:
+            self.mapping.get_writable(221).normal = 'rr'
 
         # Chance to give some variation to the "l" letter
-        if chance(5):
-            self.mapping[224].at_beginning = 'lh'
-        if chance(5):
-            self.mapping[224].at_end = 'll'
-        if chance(15 and not self.syllable_division):
-            self.mapping[224].normal = 'll'
+        if self.rng.chance(5):
+            self.mapping.get_writable(224).at_beginning = 'lh'
+        if self.rng.chance(5):
+            self.mapping.get_writable(224).at_end = 'll'
+        if self.rng.chance(15 and not self.syllable_division):
+            self.mapping.get_writable(224).normal = 'll'
 
         # Some variation for the "m" and "n" letters
-        if chance(15) and not self.syllable_division:
-            self.mapping[218].normal = 'mm'
-        if chance(15) and not self.syllable_division:
-            self.mapping[219].normal = 'nn'
+        if self.rng.chance(15) and not self.syllable_division:
+            self.mapping.get_writable(218).normal = 'mm'
+        if self.rng.chance(15) and not self.syllable_division:
+            self.mapping.get_writable(219).normal = 'nn'
         
 
         ## ------------------ Vowels -------------------- ##
 
 
-        if chance(85):
+        if self.rng.chance(85):
             diacritic_types = ['left_accent', 'right_accent', 'carrot', 'umlaut']
             chosen_types = []
 
-            number_of_diacritics = random.choice((1, 2, 2, 2, 3))
+            number_of_diacritics = self.rng.choice((1, 2, 2, 2, 3))
 
             for _ in xrange(number_of_diacritics):
-                diacritic = diacritic_types.pop(random.randrange(len(diacritic_types)))
+                diacritic = diacritic_types.pop(self.rng.randrange(len(diacritic_types)))
                 chosen_types.append(diacritic)
 
             if 'left_accent'  in chosen_types:  self.apply_diacritic_type(diacritic_dict=LEFT_ACCENTS)
@@ -385,7 +452,7 @@ class Orthography:
             if 'carrot'       in chosen_types:  self.apply_diacritic_type(diacritic_dict=CARROTS)
             if 'umlaut'       in chosen_types:  self.apply_diacritic_type(diacritic_dict=UMLAUTS)
 
-        if chance(10):
+        if self.rng.chance(10):
             self.mapping[105] = Glyph(105, ae)
 
 
@@ -409,11 +476,26 @@ class Orthography:
         #     self.replace_grapheme(phoneme_num=215, old='sh', new=strange_f, new_prob=1)
         #     self.replace_grapheme(phoneme_num=216, old='zh', new=strange_f, new_prob=1)
 
+    def derive(self, parent_language):
+        ''' A descendant orthography for a descendant language. It spells everything the way this one does
+            until its mapping is changed; changes are kept in its own overlay (see GlyphMapping). This one's glyphs
+            are frozen, as the descendant reads through to them, and it draws from its own language's random source '''
+        for glyph in self.mapping.values():
+            glyph.freeze()
+
+        descendant = copy(self)
+        descendant.parent_language = parent_language
+        descendant.rng = parent_language.rng
+        descendant.parent_orthography = self
+        descendant.languages = []
+        descendant.mapping = GlyphMapping(self.mapping)
+        return descendant
+
     def apply_diacritic_type(self, diacritic_dict):
         ''' Simple way to sprinkle in some diacritics into the vowels '''
         for letter, phoneme_ids in diacritic_dict.iteritems():
             for phoneme_id in phoneme_ids:
-                if chance(1, top=len(phoneme_ids)):
+                if self.rng.chance(1, top=len(phoneme_ids)):
                     self.mapping[phoneme_id] = Glyph(phoneme_id=phoneme_id, normal=letter)
                     continue
 
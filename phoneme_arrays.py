@@ -0,0 +1,202 @@
+from __future__ import division, unicode_literals
+import os
+import mmap
+import json
+import struct
+
+import numpy
+
+'''
+The syllable components of a set of phoneme data, encoded as flat arrays rather than as
+SyllableComponent objects:
+
+    component_type      by component id; the position of its type in COMPONENT_TYPES
+    phoneme_offsets     by component id; its phoneme ids are phoneme_ids[offsets[id]:offsets[id + 1]]
+    phoneme_ids         every component's phoneme ids, one after another
+    consonant_mask      components x CONSONANT_SLOTS; True where the consonant (id - CONSONANT_ID_BASE)
+                        appears in the component
+
+The arrays are written to a single file in build/ (see build.py), which any number of worker
+processes can memory map. The mapped arrays are read straight out of the shared page cache,
+with no copying and no per-process python objects, so attaching to them costs next to
+nothing however many workers there are. A process which has the PhonemeData gets the arrays
+with get_phoneme_arrays(); batch.py and similarity.py do, as they build Languages anyway.
+
+This module doesn't import phonemes, and attach_rule_set_arrays() only needs a rule set's
+name and digest, so a worker which is handed those and only needs the arrays never builds
+the PhonemeData object graph at all:
+
+    rule_set = p.data.rule_set                                                  # in the parent
+    arrays = attach_rule_set_arrays(rule_set.name, rule_set.digest)             # in the worker
+    onset_ids = arrays.get_component_ids('onset')
+'''
+
+COMPONENT_TYPES = ('onset', 'coda', 'nucleus')
+
+# Same place as the other phoneme artifacts (phonemes.PHONEME_DATA_ARTIFACT_DIRECTORY)
+ARRAY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build')
+
+# Consonant ids are 200-299; the consonant mask has a column for each of them
+CONSONANT_ID_BASE = 200
+CONSONANT_SLOTS = 100
+
+# Start of every array file, followed by the length of the JSON header which describes the arrays
+FILE_MAGIC = b'PHARR001'
+HEADER_LENGTH = struct.Struct(b'<I')
+# Arrays start on multiples of this many bytes
+ARRAY_ALIGNMENT = 16
+
+ARRAY_NAMES = ('component_type', 'phoneme_offsets', 'phoneme_ids', 'consonant_mask')
+
+
+class PhonemeArrays:
+    ''' Array-backed component tables. The arrays are read only when they're memory mapped '''
+    def __init__(self, rule_set_name, digest, arrays):
+        self.rule_set_name = rule_set_name
+        self.digest = digest
+
+        self.component_type = arrays['component_type']
+        self.phoneme_offsets = arrays['phoneme_offsets']
+        self.phoneme_ids = arrays['phoneme_ids']
+        self.consonant_mask = arrays['consonant_mask']
+
+    def __len__(self):
+        return len(self.component_type)
+
+    def get_component_ids(self, component_type):
+        ''' The ids of every component of a type, in id order '''
+        return numpy.flatnonzero(self.component_type == COMPONENT_TYPES.index(component_type))
+
+    def get_phoneme_ids(self, component_id):
+        return tuple(self.phoneme_ids[self.phoneme_offsets[component_id]:self.phoneme_offsets[component_id + 1]].tolist())
+
+    def get_lengths(self, component_ids):
+        ''' The number of phonemes in each of the components '''
+        return self.phoneme_offsets[component_ids + 1] - self.phoneme_offsets[component_ids]
+
+    def get_first_phoneme_ids(self, component_ids):
+        return self.phoneme_ids[self.phoneme_offsets[component_ids]]
+
+    def get_last_phoneme_ids(self, component_ids):
+        return self.phoneme_ids[self.phoneme_offsets[component_ids + 1] - 1]
+
+
+def encode_phoneme_data(phoneme_data):
+    ''' The PhonemeArrays for a PhonemeData '''
+    components = sorted([phoneme_data.empty_onset, phoneme_data.empty_coda] + phoneme_data.id_to_component.values(), key=lambda c: c.id_)
+    if [component.id_ for component in components] != range(len(components)):
+        raise ValueError('component ids of rule set "{0}" are not numbered 0 to {1}'.format(phoneme_data.rule_set.name, len(components) - 1))
+
+    arrays = {
+        'component_type':   numpy.array([COMPONENT_TYPES.index(component.type_) for component in components], dtype=numpy.int8),
+        'phoneme_offsets':  numpy.cumsum([0] + [len(component.phoneme_ids) for component in components]).astype(numpy.int32),
+        'phoneme_ids':      numpy.array([phoneme_id for component in components for phoneme_id in component.phoneme_ids], dtype=numpy.int16),
+        'consonant_mask':   numpy.zeros((len(components), CONSONANT_SLOTS), dtype=numpy.bool_),
+    }
+    for component in components:
+        for phoneme_id in component.phoneme_ids:
+            if phoneme_data.is_consonant(phoneme_id):
+                arrays['consonant_mask'][component.id_, phoneme_id - CONSONANT_ID_BASE] = True
+
+    return PhonemeArrays(rule_set_name=phoneme_data.rule_set.name, digest=phoneme_data.rule_set.digest, arrays=arrays)
+
+
+# ------------------------------------------ Files ------------------------------------------ #
+
+def get_array_path(rule_set):
+    return get_rule_set_array_path(rule_set.name, rule_set.digest)
+
+
+def get_rule_set_array_path(rule_set_name, digest, directory=ARRAY_DIRECTORY):
+    return os.path.join(directory, 'phoneme_arrays-{0}-{1}.bin'.format(rule_set_name, digest[:16]))
+
+
+def align(offset):
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+def save_phoneme_arrays(phoneme_arrays, path):
+    ''' Write the arrays out in a form which attach_phoneme_arrays() can map. The file is written
+        under a temporary name and moved into place, so a worker never maps a half-written file '''
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    arrays = [numpy.ascontiguousarray(getattr(phoneme_arrays, name)) for name in ARRAY_NAMES]
+
+    # The header's length depends on the offsets, which depend on the header's length, so
+    # leave room for offsets of any size (the header is padded out to a fixed size)
+    descriptions = [[name, array.dtype.str, list(array.shape), 0] for name, array in zip(ARRAY_NAMES, arrays)]
+    header_room = len(json.dumps({'rule_set': phoneme_arrays.rule_set_name, 'digest': phoneme_arrays.digest, 'arrays': descriptions})) + 20 * len(arrays)
+
+    offset = align(len(FILE_MAGIC) + HEADER_LENGTH.size + header_room)
+    for description, array in zip(descriptions, arrays):
+        description[3] = offset
+        offset = align(offset + array.nbytes)
+
+    header = json.dumps({'rule_set': phoneme_arrays.rule_set_name, 'digest': phoneme_arrays.digest, 'arrays': descriptions}).encode('utf-8')
+    header = header.ljust(header_room)
+
+    temporary_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(temporary_path, 'wb') as array_file:
+        array_file.write(FILE_MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+        for description, array in zip(descriptions, arrays):
+            array_file.seek(description[3])
+            array_file.write(array.tobytes())
+        array_file.truncate(offset)
+    os.rename(temporary_path, path)
+
+    return path
+
+
+def attach_phoneme_arrays(path):
+    ''' Memory map an array file written by save_phoneme_arrays(), or None if there isn't a valid one '''
+    try:
+        with open(path, 'rb') as array_file:
+            mapped = mmap.mmap(array_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if mapped[:len(FILE_MAGIC)] != FILE_MAGIC:
+        return None
+
+    header_start = len(FILE_MAGIC) + HEADER_LENGTH.size
+    header_length, = HEADER_LENGTH.unpack(mapped[len(FILE_MAGIC):header_start])
+    header = json.loads(mapped[header_start:header_start + header_length].decode('utf-8'))
+
+    arrays = {}
+    for name, dtype, shape, offset in header['arrays']:
+        dtype = numpy.dtype(str(dtype))
+        count = int(numpy.prod(shape))
+        arrays[name] = numpy.frombuffer(mapped, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    return PhonemeArrays(rule_set_name=header['rule_set'], digest=header['digest'], arrays=arrays)
+
+
+# Attached (or encoded) arrays, by rule set digest
+PHONEME_ARRAYS = {}
+
+def attach_rule_set_arrays(rule_set_name, digest, directory=ARRAY_DIRECTORY):
+    ''' The arrays of a rule set, mapped from the file build.py (or get_phoneme_arrays()) wrote for it, or
+        None if there isn't one for this digest. Works from the name and digest alone, without phonemes '''
+    if digest not in PHONEME_ARRAYS:
+        phoneme_arrays = attach_phoneme_arrays(get_rule_set_array_path(rule_set_name, digest, directory))
+        if phoneme_arrays is None or phoneme_arrays.digest != digest:
+            return None
+        PHONEME_ARRAYS[digest] = phoneme_arrays
+
+    return PHONEME_ARRAYS[digest]
+
+
+def get_phoneme_arrays(phoneme_data, save_artifact=False):
+    ''' The arrays for a set of phoneme data. They're mapped from the prebuilt file when there is one,
+        and otherwise encoded from the phoneme data (and written out, if save_artifact is set) '''
+    rule_set = phoneme_data.rule_set
+    if attach_rule_set_arrays(rule_set.name, rule_set.digest) is None:
+        phoneme_arrays = encode_phoneme_data(phoneme_data)
+        if save_artifact:
+            path = save_phoneme_arrays(phoneme_arrays, get_array_path(rule_set))
+            phoneme_arrays = attach_phoneme_arrays(path)
+
+        PHONEME_ARRAYS[rule_set.digest] = phoneme_arrays
+
+    return PHONEME_ARRAYS[rule_set.digest]
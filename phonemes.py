@@ -1,8 +1,10 @@
 # coding=Latin-1
 
 from __future__ import division, unicode_literals
+import os
+import hashlib
 import itertools
-from collections import Counter
+import cPickle as pickle
 
 ''' 
 This file deals with language building blocks (phonemes) and clusters of phonemes.
@@ -10,6 +12,15 @@ There are different valid clusters of phonemes depending on whether the cluster
 occurs at the start of a syllable (onset) or at the end of a syllable (coda). 
 '''
 
+ROOT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Phonotactic rule files define every onset and coda which a language can possibly have
+DEFAULT_RULE_FILE = os.path.join(ROOT_DIRECTORY, 'rules', 'default.rules')
+
+# Compiled rule sets get saved here (by build.py, or the first time a rule set is compiled),
+# so that new processes can load the syllable components instead of generating them again
+PHONEME_DATA_ARTIFACT_DIRECTORY = os.path.join(ROOT_DIRECTORY, 'build')
+
 # For lack of a better location, this maps the
 VOICING_DESCRIPTIONS = {0: ' unvoiced', 1:' voiced', 3:'', 'any':''}
 
@@ -69,8 +80,8 @@ class SyllableComponent:
     but many contain multiple phonemes. '''
     newid = itertools.count().next
 
-    def __init__(self, type_, phonemes, rule_set):
-        self.id_ = SyllableComponent.newid()
+    def __init__(self, type_, phonemes, rule_set, id_=None):
+        self.id_ = id_ if id_ is not None else SyllableComponent.newid()
         # can be onset, coda, or nucleus
         self.type_ = type_
         
@@ -111,11 +122,11 @@ class SyllableComponentGenerator:
         rule_descriptions = [rule.describe_rule() for rule in self.phoneme_properties]
         self.rule_set = ' followed by '.join(rule_descriptions)
 
-    def generate(self):
-        ''' Generates specific SyllableComponent objects from a set of
-            rules defined in self.property_list '''
+    def generate_clusters(self):
+        ''' Generates every cluster of consonants (as a tuple) which matches the rules
+            defined in self.phoneme_properties '''
         # array of arrays tracking all matching consonants
-        converted_to_consonants_mega_list = [find_consonants(property.location, property.method, property.voicing, property.exceptions) for property in self.phoneme_properties]
+        converted_to_consonants_mega_list = [CONSONANT_INDEX.find(property.location, property.method, property.voicing, property.exceptions) for property in self.phoneme_properties]
 
         # Take the 2D array defined in the input, and create all permutations that the rules generalize to.
         # For example, this will transform [[A, B], [C, D], [E]] into [[A, C, E], [A, D, E], [B, C, E], [B, D, E]]
@@ -123,12 +134,8 @@ class SyllableComponentGenerator:
         all_permutations = itertools.product(*converted_to_consonants_mega_list)
 
         # Filter out any cluster which contains repeated phonemes (Certain generalized rules can cause this to occur)
-        # and create the actual phoneme cluster object from this.
-        all_permutations_worked = [SyllableComponent(self.type_, tuple(permutation), self.rule_set) for permutation in all_permutations
-                                     if all((phoneme_occurence == 1 for phoneme_occurence in Counter(permutation).values())) ]
+        return [permutation for permutation in all_permutations if len(set(permutation)) == len(permutation)]
 
-        return all_permutations_worked        
-        
 
 class Rule:
     def __init__(self, location, method, voicing, exceptions):
@@ -152,7 +159,7 @@ class Rule:
         ## ------------------------------------------------------------------------------------------------------------------
         ## First - find all the consonants that match the input. If there's just one, we can call out the consonant directly
         ## ------------------------------------------------------------------------------------------------------------------
-        consonants = find_consonants(self.location, self.method, self.voicing, self.exceptions)
+        consonants = CONSONANT_INDEX.find(self.location, self.method, self.voicing, self.exceptions)
         if len(consonants) == 1:
             description = '/{0}/'.format(consonants[0].char)
 
@@ -191,6 +198,30 @@ def find_consonants(location, method, voicing, exclude_list):
                 ]
 
         
+class ConsonantIndex:
+    ''' Indexes consonants by location, method, and voicing, so that compiling a rule is a
+        few set intersections rather than a scan over every consonant '''
+    def __init__(self, consonants):
+        self.consonants = consonants
+        self.positions = {'location': {}, 'method': {}, 'voicing': {}}
+
+        for position, consonant in enumerate(consonants):
+            self.positions['location'].setdefault(consonant.location, set()).add(position)
+            self.positions['method'].setdefault(consonant.method, set()).add(position)
+            self.positions['voicing'].setdefault(consonant.voicing, set()).add(position)
+
+        self.all_positions = set(xrange(len(consonants)))
+
+    def find(self, location, method, voicing, exclude_list):
+        ''' Same as find_consonants(), returning the matches in the same order '''
+        matching_positions = set(self.all_positions)
+        for feature, value in (('location', location), ('method', method), ('voicing', voicing)):
+            if value != 'any':
+                matching_positions &= self.positions[feature].get(value, set())
+
+        return [self.consonants[position] for position in sorted(matching_positions) if self.consonants[position].id_ not in exclude_list]
+
+
 # List of consonants and their properties
 CONSONANTS = [ 
     Consonant(201, 'p',  'bilabial',     'plosive',     0, '"p"'),
@@ -273,6 +304,9 @@ CONSONANTS = [
 #     ]
 
 
+CONSONANT_INDEX = ConsonantIndex(CONSONANTS)
+
+
 VOWELS = [
 
     # -- Monophthongs -- #
@@ -300,269 +334,230 @@ VOWELS = [
 ]
 
 
-# A syllable onset is the consonant(s) which begin a syllable
-POSSIBLE_ONSETS = [
-    SyllableComponentGenerator( 'onset', Rule('bilabial', 'plosive', 0, []) ),
-    SyllableComponentGenerator( 'onset', Rule('bilabial', 'plosive', 1, []) ),
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'plosive', 0, []) ),
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'plosive', 1, []) ),
-    SyllableComponentGenerator( 'onset', Rule('velar', 'plosive', 0, []) ),
-    SyllableComponentGenerator( 'onset', Rule('velar', 'plosive', 1, []) ),
-    SyllableComponentGenerator( 'onset', Rule('post-alveolar', 'affricate', 0, []) ),
-    SyllableComponentGenerator( 'onset', Rule('post-alveolar', 'affricate', 1, []) ),
-    SyllableComponentGenerator( 'onset', Rule('labio-dental', 'fricative', 0, []) ),
-    SyllableComponentGenerator( 'onset', Rule('labio-dental', 'fricative', 1, []) ),
-    SyllableComponentGenerator( 'onset', Rule('dental', 'fricative', 0, []) ),
-    SyllableComponentGenerator( 'onset', Rule('dental', 'fricative', 1, []) ),
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'fricative', 0, []) ),
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'fricative', 1, []) ),
-    SyllableComponentGenerator( 'onset', Rule('post-alveolar', 'fricative', 0, []) ),
-    #SyllableComponentGenerator( [['post-alveolar', 'fricative', 1, []] ] ),
-    SyllableComponentGenerator( 'onset', Rule('glottal', 'fricative', 3, []) ),
-    SyllableComponentGenerator( 'onset', Rule('bilabial', 'nasal', 3, []) ),
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'nasal', 3, []) ),
-    #SyllableComponentGenerator( [['velar', 'nasal', 3, []] ] ),
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'approximant', 3, []) ),
-    SyllableComponentGenerator( 'onset', Rule('palatal', 'approximant', 3, []) ),
-    SyllableComponentGenerator( 'onset', Rule('velar', 'approximant', 3, []) ), # w  -- originally had been commented out
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'lateral', 3, []) ),
-
-    # ---------------------------------------------------------- #
-    SyllableComponentGenerator( 'onset', Rule('any', 'plosive', 'any', []),
-                                Rule('any', 'approximant', 'any', [222, 223]) ),
-
-    SyllableComponentGenerator( 'onset', Rule('any', 'plosive', 'any', []),
-                                Rule('any', 'lateral', 'any', [222, 223]) ),
-    # ---------------------------------------------------------- #
-
-    # ---------------------------------------------------------- #
-    SyllableComponentGenerator( 'onset', Rule('any', 'fricative', 0, [213, 216]),
-                                Rule('any', 'approximant', 'any', [222, 223]) ),
-
-    SyllableComponentGenerator( 'onset', Rule('any', 'fricative', 0, [216]),
-                                Rule('any', 'lateral', 'any', [222, 223]) ),
-    # ---------------------------------------------------------- #
-
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'fricative', 0, []),
-                                Rule('any', 'plosive', 0, []) ),
-
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'fricative', 0, []), 
-                                Rule('any', 'nasal', 'any', [220]) ),
-
-    #SyllableComponentGenerator( [[213, 'any', []], ['fricative', 'any', 0, [211, 212, 213, 215, 216]] ] ),
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'fricative', 0, []), 
-                                Rule('any', 'fricative', 0, [211, 213, 215]) ),
-
-    # ---------------------------------------------------------- #
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'fricative', 0, []), 
-                                Rule('any', 'plosive', 0, []), 
-                                Rule('any', 'approximant', 'any', [222, 223]) ),
-    # spl
-    # SyllableComponentGenerator( Rule('alveolar', 'fricative', 0, []),
-    #                    Rule('any', 'plosive', 0, [203, 205]),
-    #                    Rule('any', 'lateral', 'any', [222, 223]) )
-    # ---------------------------------------------------------- #
-    
-    SyllableComponentGenerator( 'onset', Rule('palatal',  'nasal',     0, []) ),  # ɲ̊
-    SyllableComponentGenerator( 'onset', Rule('palatal',  'nasal',     1, []) ),  # ɲ
-    SyllableComponentGenerator( 'onset', Rule('palatal',  'stop',      0, []) ),  # c
-    SyllableComponentGenerator( 'onset', Rule('palatal',  'stop',      1, []) ),  # ɟ
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'affricate', 0, []) ),  # ts
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'affricate', 1, []) ),  # dz
-    SyllableComponentGenerator( 'onset', Rule('velar',    'fricative', 0, []) ),  # x
-    SyllableComponentGenerator( 'onset', Rule('velar',    'fricative', 1, []) ),  # ɣ
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'trill',     1, []) ),  # r
-    SyllableComponentGenerator( 'onset', Rule('bilabial', 'trill',     1, []) ),  # B
-    SyllableComponentGenerator( 'onset', Rule('glottal',  'stop',      0, []) )   # ʔ
-    ]
+# Every phoneme, by id
+PHONEMES_BY_ID = {phoneme.id_: phoneme for phoneme in itertools.chain(CONSONANTS, VOWELS)}
 
 
-# A syllable coda is the consonant(s) which end a syllable
-POSSIBLE_CODAS =  [
-    SyllableComponentGenerator( 'coda', Rule('bilabial', 'plosive', 0, []) ),
-    SyllableComponentGenerator( 'coda', Rule('bilabial', 'plosive', 1, []) ),
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'plosive', 0, []) ),
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'plosive', 1, []) ),
-    SyllableComponentGenerator( 'coda', Rule('velar', 'plosive', 0, []) ),
-    SyllableComponentGenerator( 'coda', Rule('velar', 'plosive', 1, []) ),
-    SyllableComponentGenerator( 'coda', Rule('post-alveolar', 'affricate', 0, []) ),
-    SyllableComponentGenerator( 'coda', Rule('post-alveolar', 'affricate', 1, []) ),
-    SyllableComponentGenerator( 'coda', Rule('labio-dental', 'fricative', 0, []) ),
-    SyllableComponentGenerator( 'coda', Rule('labio-dental', 'fricative', 1, []) ),
-    SyllableComponentGenerator( 'coda', Rule('dental', 'fricative', 0, []) ),
-    SyllableComponentGenerator( 'coda', Rule('dental', 'fricative', 1, []) ),
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'fricative', 0, []) ),
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'fricative', 1, []) ),
-    SyllableComponentGenerator( 'coda', Rule('post-alveolar', 'fricative', 0, []) ),
-    SyllableComponentGenerator( 'coda', Rule('post-alveolar', 'fricative', 1, []) ),
-    # SyllableComponentGenerator( Rule('glottal', 'fricative', 3, []) ), # /h/
-    SyllableComponentGenerator( 'coda', Rule('bilabial', 'nasal', 3, []) ),
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'nasal', 3, []) ),
-    SyllableComponentGenerator( 'coda', Rule('velar', 'nasal', 3, []) ),
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'approximant', 3, []) ),
-    # SyllableComponentGenerator( Rule('palatal', 'approximant', 3, []) ), #/j/  (like in pure, cute, ...)
-    #SyllableComponentGenerator( [['velar', 'approximant', 3, []] ] ), #w
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'lateral', 3, []) ),
-
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'lateral', 3, []), 
-                               Rule('any', 'plosive', 'any', []) ),
-
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'lateral', 3,  []), 
-                               Rule('any', 'affricate', 'any', []) ),
-
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'approximant', 3, []), 
-                               Rule('any', 'plosive', 'any', []) ),
-
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'approximant', 3, []), 
-                               Rule('any', 'affricate', 'any', []) ),
-
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'lateral', 3, []),
-                               Rule('any', 'fricative', 'any', [216, 217]) ),
-
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'approximant', 3,  []), 
-                               Rule('any', 'fricative', 'any', [216, 217]) ),
-
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'lateral', 3, []), 
-                               Rule('any', 'nasal', 'any', [220]) ),
-
-    # -------  In rhotic varieties, /r/ + nasal or lateral: /rm/, /rn/, /rl/
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'approximant', 3, []), 
-                               Rule('any', 'nasal', 'any', [220]) ),
-
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'approximant', 3, []), 
-                               Rule('any', 'lateral', 'any', []) ),
-    # ----------------------------------------------------------------------
-
-    # ------- Nasal + homorganic stop or affricate: /mp/, /nt/, /nd/, /ntʃ/, /ndʒ/, /ŋk/
-    # SyllableComponentGenerator( Rule('any', 'nasal', 'any', [220]),
-    #                    Rule('any', 'plosive', 'any', []) ),  ## homorganic?
-    #
-    # SyllableComponentGenerator( Rule('any', 'nasal', 'any', [220]),
-    #                    Rule('any', 'affricate', 'any', []) ),## homorganic?
-
-    # /nt/, /nd/
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'nasal', 'any', []),
-                               Rule('alveolar', 'plosive', 'any', []) ),
-
-    SyllableComponentGenerator( 'coda', Rule('bilabial', 'nasal', 'any', []),
-                               Rule('bilabial', 'plosive', 0, []) ),
-    # ----------------------------------------------------------------------
-
-    # ------- Nasal + fricative: /mf/, /mθ/, /nθ/, /ns/, /nz/, /ŋθ/ in some varieties
-    # TODO - worth including?
-    # SyllableComponentGenerator( Rule('any', 'nasal', 'any', [220]),
-    #                    Rule('any', 'fricative', 'any', [216, 217]) ),
-    #
-    # ----------------------------------------------------------------------
-
-    # ------- Voiceless fricative plus voiceless stop: /ft/, /sp/, /st/, /sk/
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'fricative', 0, []),
-                               Rule('any', 'plosive', 0, []) ),
-
-    SyllableComponentGenerator( 'coda', Rule('labio-dental', 'fricative', 0, []),
-                               Rule('alveolar', 'plosive', 0, []) ),
-    # ----------------------------------------------------------------------
-
-    # ------- "Two voiceless stops: /pt/ , /kt/ ------- #
-    # It appears as though only the above are valid, so this is being de-generalized for now
-    # into the next two rules
-    #SyllableComponentGenerator( Rule('any', 'plosive', 0, []),
-    #                   Rule('any', 'plosive', 0, []) ),
-    # /pt/
-    SyllableComponentGenerator( 'coda', Rule('bilabial', 'plosive', 0, []),
-                               Rule('alveolar', 'plosive', 0, []) ),
-    # /kt/
-    SyllableComponentGenerator( 'coda', Rule('velar', 'plosive', 0, []),
-                               Rule('alveolar', 'plosive', 0, []) ),
-    # ------- ------- ------- ------- ------- ------- ---
-
-    # ------- "Stop plus voiceless fricative:  /pθ/, /ps/, /tθ/, /ts/, /dθ/, /ks/ ------- #
-    # It looks like the below rule is too generalized; so this is being de-generalized for now
-    # SyllableComponentGenerator( Rule('any', 'plosive', 'any', []),
-    #                    Rule('any', 'fricative', 0, [216]) )
-
-    # /ps/, /ts/   -- NO /tθ/ because that looks weird
-    SyllableComponentGenerator( 'coda', Rule('any', 'plosive', 0, [205]),
-                               Rule('any', 'fricative', 0, [209, 215, 211]) ),
-    # /pθ/
-    SyllableComponentGenerator( 'coda', Rule('any', 'plosive', 0, [205]),
-                               Rule('dental', 'fricative', 0, [209, 215]) ),
-    # /ks/
-    SyllableComponentGenerator( 'coda', Rule('velar', 'plosive', 0, []),
-                               Rule('alveolar', 'fricative', 0, []) ),
-    # /dθ/
-    SyllableComponentGenerator( 'coda', Rule('alveolar', 'plosive', 1, []),
-                               Rule('dental', 'fricative', 0, []) ),
-
-
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'affricate', 0, []) ),  # ts
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'affricate', 1, []) ),  # dz
-    SyllableComponentGenerator( 'onset', Rule('velar',    'fricative', 0, []) ),  # x
-    SyllableComponentGenerator( 'onset', Rule('velar',    'fricative', 1, []) ),  # ɣ
-    SyllableComponentGenerator( 'onset', Rule('alveolar', 'trill',     1, []) ),  # r
-    SyllableComponentGenerator( 'onset', Rule('bilabial', 'trill',     1, []) )  # B
-    ]
+class PhonemeInventory:
+    ''' A set of phonemes, kept as a bitmask over their ids. Unlike a set of phoneme objects (which
+        iterates in an order that depends on where the objects are in memory), an inventory always
+        iterates in id order, so anything drawn from it depends only on the random seed '''
+    def __init__(self, phonemes=()):
+        self.mask = 0
+        for phoneme in phonemes:
+            self.add(phoneme)
+
+    def __contains__(self, phoneme):
+        return bool(self.mask >> phoneme.id_ & 1)
+
+    def __len__(self):
+        return bin(self.mask).count('1')
+
+    def __iter__(self):
+        mask = self.mask
+        while mask:
+            lowest_bit = mask & -mask
+            yield PHONEMES_BY_ID[lowest_bit.bit_length() - 1]
+            mask ^= lowest_bit
+
+    def __eq__(self, other):
+        return isinstance(other, PhonemeInventory) and self.mask == other.mask
+
+    def __ne__(self, other):
+        return not self == other
+
+    def add(self, phoneme):
+        self.mask |= 1 << phoneme.id_
+
+    def remove(self, phoneme):
+        if phoneme not in self:
+            raise KeyError(phoneme)
+        self.mask ^= 1 << phoneme.id_
+
+    def ids(self):
+        return [phoneme.id_ for phoneme in self]
+
+
+class RuleSet:
+    ''' A phonotactic profile: the rules which generate every possible onset and coda. The
+        digest identifies the rules (and the phoneme definitions they were compiled against) '''
+    def __init__(self, name, onset_generators, coda_generators, digest):
+        self.name = name
+        self.onset_generators = onset_generators
+        self.coda_generators = coda_generators
+        self.digest = digest
+
+
+def parse_rule(text):
+    ''' Parse a single consonant description, "<location> <method> <voicing> [except <id> ...]" '''
+    description, _, exceptions = text.partition(' except ')
+    location, method, voicing = description.split()
+
+    return Rule(location, method, int(voicing) if voicing.isdigit() else voicing, [int(phoneme_id) for phoneme_id in exceptions.split()])
+
+
+def load_rule_set(path=DEFAULT_RULE_FILE):
+    ''' Read a phonotactic rule file (see rules/default.rules for the format) '''
+    with open(path, 'rb') as rule_file:
+        contents = rule_file.read()
+
+    generators = {'onset': [], 'coda': []}
+
+    for line_number, line in enumerate(contents.decode('utf-8').splitlines(), start=1):
+        line = line.partition('#')[0].strip()
+        if not line:
+            continue
+
+        try:
+            component_type, _, rules = line.partition(':')
+            generators[component_type.strip()].append(SyllableComponentGenerator(component_type.strip(), *[parse_rule(rule) for rule in rules.split('+')]))
+        except (KeyError, ValueError):
+            raise ValueError('{0}, line {1}: could not parse rule "{2}"'.format(path, line_number, line))
+
+    digest = hashlib.sha1(contents + get_source_digest()).hexdigest()
+
+    return RuleSet(name=os.path.splitext(os.path.basename(path))[0], onset_generators=generators['onset'],
+                   coda_generators=generators['coda'], digest=digest)
 
 
 class PhonemeData:
-    def __init__(self):
+    def __init__(self, rule_set):
 
+        self.rule_set = rule_set
 
         self.consonant_methods = ('plosive', 'affricate', 'fricative', 'nasal', 'approximant', 'lateral')
         self.consonant_locations = ('bilabial', 'alveolar', 'velar', 'post-alveolar', 'labio-dental', 
                                     'dental', 'glottal', 'palatal')
 
+        # Components are numbered from 0 within each rule set
+        self.next_component_id = 0
         
         self.id_to_component = {}
-        self.id_to_phoneme = {phoneme.id_: phoneme for phoneme in itertools.chain(CONSONANTS, VOWELS)}
+        self.id_to_phoneme = dict(PHONEMES_BY_ID)
 
         self.all_syllable_components = {'onset': [], 'coda': [], 'nucleus': []}
+        # Lookup of each component by its phoneme ids
+        self.components_by_phoneme_ids = {'onset': {}, 'coda': {}, 'nucleus': {}}
 
         # Word-initial empty syllable onset
         self.empty_onset = SyllableComponent(type_='onset', phonemes=tuple(c for c in CONSONANTS if c.id_==300), 
-                                             rule_set='empty word-initial onset')
+                                             rule_set='empty word-initial onset', id_=self.get_new_component_id())
         # Word-final empty syllable coda
         self.empty_coda =  SyllableComponent(type_='coda',  phonemes=tuple(c for c in CONSONANTS if c.id_==301), 
-                                             rule_set='empty word-final coda')
+                                             rule_set='empty word-final coda', id_=self.get_new_component_id())
 
         self.generate_data_structures()
 
+    def get_new_component_id(self):
+        self.next_component_id += 1
+        return self.next_component_id - 1
+
+    def add_component(self, type_, phonemes, rule_set):
+        ''' Add a syllable component, unless an earlier (overlapping) rule already generated it '''
+        phoneme_ids = tuple(phoneme.id_ for phoneme in phonemes)
+        if phoneme_ids in self.components_by_phoneme_ids[type_]:
+            return
+
+        component = SyllableComponent(type_=type_, phonemes=phonemes, rule_set=rule_set, id_=self.get_new_component_id())
+        self.all_syllable_components[type_].append(component)
+        self.components_by_phoneme_ids[type_][phoneme_ids] = component
+        self.id_to_component[component.id_] = component
+
     def generate_data_structures(self):
 
         ## Onsets ##
-        for onset_rules in POSSIBLE_ONSETS:
-            for onset in onset_rules.generate():
-                self.all_syllable_components['onset'].append(onset)
-                self.id_to_component[onset.id_] = onset
+        for onset_rules in self.rule_set.onset_generators:
+            for cluster in onset_rules.generate_clusters():
+                self.add_component(type_='onset', phonemes=cluster, rule_set=onset_rules.rule_set)
         
         ## Codas ##
-        for coda_rules in POSSIBLE_CODAS:
-            for coda in coda_rules.generate():
-                self.all_syllable_components['coda'].append(coda)
-                self.id_to_component[coda.id_] = coda
+        for coda_rules in self.rule_set.coda_generators:
+            for cluster in coda_rules.generate_clusters():
+                self.add_component(type_='coda', phonemes=cluster, rule_set=coda_rules.rule_set)
         
         ## Vowels ##
         # This is slightly different from Onets and Codas since vowels do not need a 
         # SyllableComponentGenerator; thus the SyllableComponent definition is created here.
         for vowel in VOWELS:
-            nucleus = SyllableComponent(type_='nucleus', phonemes=(vowel, ), rule_set='vowel')
-            self.all_syllable_components['nucleus'].append(nucleus)
-            self.id_to_component[nucleus.id_] = nucleus
+            self.add_component(type_='nucleus', phonemes=(vowel, ), rule_set='vowel')
 
     def get_component_by_phoneme_ids(self, syllable_component_type, phoneme_ids):
-        for component in self.all_syllable_components[syllable_component_type]:
-            if component.phoneme_ids == phoneme_ids:
-                return component
-
-        else:
-            return None
-            # print 'ERROR - {0} of {1} not found'.format(syllable_component_type, phoneme_ids)
+        return self.components_by_phoneme_ids[syllable_component_type].get(phoneme_ids)
 
     def is_consonant(self, phoneme_id):
         return 200 <= phoneme_id <= 299
 
 
-data = PhonemeData()
+def get_source_digest():
+    ''' Hash of this file, so that rules compiled against an older version of the phonemes are never loaded '''
+    with open(os.path.splitext(os.path.abspath(__file__))[0] + '.py', 'rb') as source_file:
+        return hashlib.sha1(source_file.read()).hexdigest()
+
+
+def get_phoneme_persistent_id(obj):
+    ''' Consonants and vowels are pickled by id, so that the loaded syllable components
+        point at the same phoneme objects as CONSONANTS and VOWELS '''
+    if isinstance(obj, (Consonant, Vowel)):
+        return obj.id_
+    return None
+
+
+def get_artifact_path(rule_set):
+    return os.path.join(PHONEME_DATA_ARTIFACT_DIRECTORY, 'phoneme_data-{0}-{1}.pickle'.format(rule_set.name, rule_set.digest[:16]))
+
+
+def save_phoneme_data(phoneme_data):
+    ''' Write compiled phoneme tables out, so that they can be loaded by load_phoneme_data() '''
+    path = get_artifact_path(phoneme_data.rule_set)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    with open(path, 'wb') as artifact:
+        pickler = pickle.Pickler(artifact, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = get_phoneme_persistent_id
+        pickler.dump(phoneme_data)
+
+    return path
+
+
+def load_phoneme_data(rule_set):
+    ''' Load the prebuilt phoneme tables for a rule set, or None if they haven't been built '''
+    try:
+        with open(get_artifact_path(rule_set), 'rb') as artifact:
+            unpickler = pickle.Unpickler(artifact)
+            unpickler.persistent_load = PHONEMES_BY_ID.__getitem__
+            phoneme_data = unpickler.load()
+
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return None
+
+    return phoneme_data
+
+
+# Compiled rule sets, by digest. Several rule sets can be in use side by side
+COMPILED_RULE_SETS = {}
+
+def compile_rule_set(rule_set, save_artifact=False):
+    ''' Compile a rule set into its phoneme tables. Each distinct rule set is only compiled once per
+        process, and is loaded from a prebuilt artifact instead of compiled when one exists '''
+    if rule_set.digest not in COMPILED_RULE_SETS:
+        phoneme_data = load_phoneme_data(rule_set)
+        if phoneme_data is None:
+            phoneme_data = PhonemeData(rule_set)
+            if save_artifact:
+                save_phoneme_data(phoneme_data)
+
+        COMPILED_RULE_SETS[rule_set.digest] = phoneme_data
+
+    return COMPILED_RULE_SETS[rule_set.digest]
+
+
+def get_phoneme_data(rule_file=DEFAULT_RULE_FILE):
+    ''' The phoneme tables for a rule file '''
+    return compile_rule_set(load_rule_set(rule_file))
+
+
+data = get_phoneme_data()
 
 
 
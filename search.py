@@ -0,0 +1,323 @@
+from __future__ import division, unicode_literals
+import os
+import sys
+import time
+import types
+import hashlib
+import argparse
+import itertools
+import cPickle as pickle
+import multiprocessing
+from collections import Counter, deque
+
+import lang_gen
+import phonemes as p
+from helpers import parse_seed_range
+
+'''
+Finds language seeds whose languages match a predicate, such as "no complex codas, at least
+20 consonants, aspirated plosives and no diphthongs":
+
+    search(lambda s: s['no_complex_codas'] and s['consonants'] >= 20 and
+                     s['plosive_types'] == 'aspirated' and s['diphthongs'] == 0,
+           seeds=xrange(100000), processes=1)
+
+The predicate gets a Summary of the language - its properties, inventory sizes, and log.
+Each candidate is generated one stage at a time (see lang_gen.GENERATION_STAGES), and the
+predicate is tried after every stage. Reading a value from a later stage raises
+NotYetGenerated, which moves the candidate on to the next stage, so most candidates are
+rejected long before their onsets, codas and orthography are generated. Put the checks
+on early values first to get the most out of this.
+
+Summaries are kept in a SearchIndex, which can be saved between runs. A repeated query only
+generates the seeds whose summaries don't go far enough to decide it.
+
+    python search.py --seeds 0-100000 --where "s['consonants'] >= 20 and s['diphthongs'] == 0"
+'''
+
+# Stages a candidate can be generated up to; nothing can be filtered on the orthography
+SEARCH_STAGES = lang_gen.GENERATION_STAGES[:-1]
+
+# How many seeds each worker checks at a time
+SEEDS_PER_TASK = 500
+# How many tasks are queued up for each worker at a time
+TASKS_QUEUED_PER_PROCESS = 2
+
+SEARCH_INDEX_DIRECTORY = os.path.join(p.ROOT_DIRECTORY, 'build')
+
+
+class NotYetGenerated(KeyError):
+    ''' The predicate needs a value from a stage which hasn't been generated yet '''
+    pass
+
+
+class Summary(dict):
+    ''' The values a predicate can test, for the stages of a language generated so far. Values from
+        later stages raise NotYetGenerated, and unknown names raise a KeyError once every stage is in '''
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.stages = 0
+
+    def __missing__(self, key):
+        if self.stages < len(SEARCH_STAGES):
+            raise NotYetGenerated(key)
+        raise KeyError(key)
+
+    def __reduce__(self):
+        return (Summary, (dict(self),), {'stages': self.stages})
+
+
+def summarize_stage(language, stage):
+    ''' The values a stage adds to a language's Summary '''
+    if stage == 'consonants':
+        return {
+            'language_voicing_restriction': language.properties['language_voicing_restriction'],
+            'plosive_types':                language.properties['plosive_types'],
+            'non_english_phoneme_chances':  language.properties['non_english_phoneme_chances'],
+            'consonants':                   len(language.valid_consonants),
+            'consonant_log':                tuple(language.stage_logs['consonants']),
+        }
+
+    elif stage == 'nuclei':
+        diphthongs = sum(nucleus.phonemes[0].is_diphthong() for nucleus in language.probabilities['nucleus'])
+        return {
+            'vowels':       len(language.probabilities['nucleus']),
+            'diphthongs':   diphthongs,
+            'monophthongs': len(language.probabilities['nucleus']) - diphthongs,
+        }
+
+    elif stage == 'syllable rules':
+        return {key: language.properties[key] for key in (
+            'no_complex_onsets', 'no_complex_codas', 'no_onset_multiplier', 'no_coda_multiplier',
+            'onset_voicing_restriction', 'invert_onset_voicing_restriction',
+            'coda_voicing_restriction', 'invert_coda_voicing_restriction')}
+
+    elif stage == 'syllable components':
+        return {
+            # Not counting the empty onset / coda
+            'onsets':   len(language.probabilities['onset']) - 1,
+            'codas':    len(language.probabilities['coda']) - 1,
+            'log':      tuple(language.log),
+        }
+
+
+def evaluate(predicate, summary):
+    ''' True or False if the predicate can be decided from the summary, or None if it needs later stages '''
+    try:
+        return bool(predicate(summary))
+    except NotYetGenerated:
+        return None
+
+
+def check_seed(predicate, seed, summary=None, phoneme_data=None):
+    ''' Decide whether a seed's language matches, generating only as many stages as it takes.
+        Returns (matched, the stage it was decided at (or None if the summary was enough), summary) '''
+    if summary is not None:
+        matched = evaluate(predicate, summary)
+        if matched is not None:
+            return matched, None, summary
+
+    language = lang_gen.Language(seed=seed, phoneme_data=phoneme_data)
+    summary = Summary()
+
+    for stage in SEARCH_STAGES:
+        language.generate_stage(stage)
+        summary.update(summarize_stage(language, stage))
+        summary.stages += 1
+
+        matched = evaluate(predicate, summary)
+        if matched is not None:
+            return matched, stage, summary
+
+
+def check_seeds(task):
+    ''' Worker: check a list of seeds, each with its indexed summary (or None) '''
+    predicate, seeds_and_summaries, rule_file = task
+    phoneme_data = p.get_phoneme_data(rule_file) if rule_file else None
+
+    return [(seed,) + check_seed(predicate, seed, summary=summary, phoneme_data=phoneme_data) for seed, summary in seeds_and_summaries]
+
+
+class Expression:
+    ''' A predicate written as a python expression over the summary "s". Unlike a lambda, this can be
+        sent to worker processes '''
+    def __init__(self, source):
+        self.source = source
+        self.code = None
+
+    def __call__(self, summary):
+        if self.code is None:
+            self.code = compile(self.source, '<predicate>', 'eval')
+        return eval(self.code, {}, {'s': summary})
+
+    def __getstate__(self):
+        return {'source': self.source, 'code': None}
+
+
+# ------------------------------------------ Index ------------------------------------------ #
+
+def get_generator_modules():
+    ''' lang_gen and every module of this package it imports, directly or through one of the others, by name '''
+    modules = {}
+    pending = [lang_gen]
+    while pending:
+        module = pending.pop()
+        if module.__name__ in modules:
+            continue
+        modules[module.__name__] = module
+
+        for value in vars(module).itervalues():
+            # "import x" gives a module, and "from x import y" something from module x
+            imported = value if isinstance(value, types.ModuleType) else sys.modules.get(getattr(value, '__module__', None) or '')
+            module_file = getattr(imported, '__file__', None)
+            if module_file and os.path.dirname(os.path.abspath(module_file)) == p.ROOT_DIRECTORY:
+                pending.append(imported)
+    return modules
+
+
+def get_index_digest(phoneme_data):
+    ''' Summaries depend on the rule set, the generator code and summarize_stage(), so an index is only
+        reused if none of them changed '''
+    digest = hashlib.sha1(phoneme_data.rule_set.digest)
+    modules = get_generator_modules()
+    for name in sorted(modules) + [__name__]:
+        with open(os.path.splitext(sys.modules[name].__file__)[0] + '.py', 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+
+class SearchIndex:
+    ''' Summaries of the seeds which have been checked, by seed '''
+    def __init__(self, phoneme_data=None):
+        phoneme_data = phoneme_data if phoneme_data is not None else p.data
+        self.digest = get_index_digest(phoneme_data)
+        self.path = os.path.join(SEARCH_INDEX_DIRECTORY, 'search_index-{0}-{1}.pickle'.format(phoneme_data.rule_set.name, self.digest[:16]))
+        self.summaries = {}
+
+    def load(self):
+        ''' Load the saved summaries, if there are any for this rule set and generator '''
+        try:
+            with open(self.path, 'rb') as index_file:
+                self.summaries = pickle.load(index_file)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            pass
+        return self
+
+    def save(self):
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as index_file:
+            pickle.dump(self.summaries, index_file, pickle.HIGHEST_PROTOCOL)
+
+    def update(self, seed, summary):
+        ''' Keep the summary which covers the most stages '''
+        if seed not in self.summaries or self.summaries[seed].stages < summary.stages:
+            self.summaries[seed] = summary
+
+
+# ------------------------------------------ Search ------------------------------------------ #
+
+class CheckedTask:
+    ''' A task which was checked without the pool, with the same get() as the pool's results '''
+    def __init__(self, results):
+        self.results = results
+
+    def get(self):
+        return self.results
+
+
+def scan(predicate, seeds, processes=None, index=None, rule_file=None):
+    ''' A generator of (seed, matched, the stage it was decided at) for every seed, in order.
+        The predicate has to be picklable (such as an Expression) unless processes is 1 '''
+    phoneme_data = p.get_phoneme_data(rule_file) if rule_file else None
+    if index is None:
+        index = SearchIndex(phoneme_data=phoneme_data)
+
+    def generate_tasks():
+        seeds_and_summaries = []
+        for seed in seeds:
+            seeds_and_summaries.append((seed, index.summaries.get(seed)))
+            if len(seeds_and_summaries) == SEEDS_PER_TASK:
+                yield predicate, seeds_and_summaries, rule_file
+                seeds_and_summaries = []
+        if seeds_and_summaries:
+            yield predicate, seeds_and_summaries, rule_file
+
+    pool = []
+
+    def submit(task):
+        ''' Tasks which the index can decide entirely are checked right away, and the rest are sent to
+            the pool. The pool is only started once something needs generating '''
+        _, seeds_and_summaries, _ = task
+        if processes == 1 or all(summary is not None and evaluate(predicate, summary) is not None for _, summary in seeds_and_summaries):
+            return CheckedTask(check_seeds(task))
+
+        if not pool:
+            pool.append(multiprocessing.Pool(processes=processes))
+        return pool[0].apply_async(check_seeds, (task,))
+
+    # Only a few tasks per worker are queued at a time, rather than the whole seed range up front,
+    # so that a search which stops early doesn't leave a backlog of work to tear down
+    tasks = generate_tasks()
+    pending = deque(submit(task) for task in itertools.islice(tasks, TASKS_QUEUED_PER_PROCESS * (processes or multiprocessing.cpu_count())))
+    try:
+        while pending:
+            task_results = pending.popleft().get()
+            for task in itertools.islice(tasks, 1):
+                pending.append(submit(task))
+
+            for seed, matched, stage, summary in task_results:
+                index.update(seed, summary)
+                yield seed, matched, stage
+    finally:
+        if pool:
+            pool[0].terminate()
+
+
+def search(predicate, seeds, limit=None, processes=None, index=None, rule_file=None):
+    ''' The seeds (in order) whose languages match the predicate, up to limit of them '''
+    matches = []
+    for seed, matched, _ in scan(predicate, seeds, processes=processes, index=index, rule_file=rule_file):
+        if matched:
+            matches.append(seed)
+            if len(matches) == limit:
+                break
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find language seeds matching a predicate')
+    parser.add_argument('--where', required=True, help='Python expression over the language summary "s", such as "s[\'consonants\'] >= 20"')
+    parser.add_argument('--seeds', type=parse_seed_range, default=parse_seed_range('0-32000'), help='Seed range to search, such as 0-32000')
+    parser.add_argument('--limit', type=int, default=None, help='Stop after this many matches')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: one per core)')
+    parser.add_argument('--rules', default=None, help='Rule file the languages use')
+    parser.add_argument('--no-index', action='store_true', help='Don\'t load or save the index of seed summaries')
+    args = parser.parse_args()
+
+    phoneme_data = p.get_phoneme_data(args.rules) if args.rules else None
+    index = SearchIndex(phoneme_data=phoneme_data)
+    if not args.no_index:
+        index.load()
+
+    start = time.time()
+    matches = []
+    decided_at = Counter()
+    for seed, matched, stage in scan(Expression(args.where), args.seeds, processes=args.processes, index=index, rule_file=args.rules):
+        decided_at[stage or 'index'] += 1
+        if matched:
+            matches.append(seed)
+            if len(matches) == args.limit:
+                break
+    elapsed = time.time() - start
+
+    if not args.no_index:
+        index.save()
+
+    print 'Matching seeds: {0}'.format(' '.join(str(seed) for seed in matches) or 'none')
+    print 'Checked {0} seeds in {1:.2f}s; decided at: {2}'.format(sum(decided_at.values()), elapsed,
+        ', '.join('{0} {1}'.format(stage, decided_at[stage]) for stage in ('index',) + SEARCH_STAGES if decided_at[stage]))
+
+
+if __name__ == '__main__':
+    main()
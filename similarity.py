@@ -0,0 +1,332 @@
+from __future__ import division, unicode_literals
+import os
+import time
+import zlib
+import argparse
+import multiprocessing
+from collections import OrderedDict
+
+import numpy
+
+import lang_gen
+import phonemes as p
+import phoneme_arrays
+from helpers import parse_seed_range
+
+'''
+Finds languages which are alike. Each language is reduced to a few compact feature vectors
+(see LanguageFeatures):
+
+    consonant_bits      bitset of the consonants it has, packed into 64-bit words
+    vowel_bits          bitset of the vowels it has
+    glyph_bits          bitset of how it spells its phonemes: each (phoneme, position, letters)
+                        choice of its orthography is hashed to one of GLYPH_BITS bits
+    component_weights   the probabilities of its onsets, codas and nuclei, by component id,
+                        scaled to unit length
+
+Two languages' similarity is a weighted mean (FEATURE_WEIGHTS) of the Jaccard similarity of
+each of their bitsets - popcount of the intersection over popcount of the union - and the
+cosine similarity of their component weights. A SimilarityIndex keeps the features of many
+languages as numpy matrices, one row per language, and answers:
+
+    nearest()           the k most similar languages to one language; one pass over the rows
+    similar_pairs()     every pair of languages at least so similar
+    near_duplicates()   the languages to prune from a catalog, as they're too like another
+
+similar_pairs() works through the rows a block at a time, so it never holds all N x N pairs,
+but its memory still grows with the number of languages N: besides the index's own matrices,
+it keeps the unpacked consonant bits (N x CONSONANT_BITS float32s), and each block's consonant
+intersections and candidates are BLOCK_SIZE x N. That's O(BLOCK_SIZE x N), a couple of hundred
+MB at 100000 languages. Most pairs are ruled out cheaply first: the consonants alone bound the
+similarity from above, and their Jaccard for a whole block is a single matrix product (of the
+unpacked bitsets). Only the pairs that survive have their other features compared.
+
+    python similarity.py --seeds 0-9999 --nearest 42
+    python similarity.py --seeds 0-99999 --duplicates 0.9 --processes 4
+'''
+
+# Consonant ids are 200-299 and vowel ids 100-199
+CONSONANT_ID_BASE = 200
+VOWEL_ID_BASE = 100
+# Bits in each bitset; multiples of 64
+CONSONANT_BITS = 128
+VOWEL_BITS = 64
+GLYPH_BITS = 256
+
+# The ways a glyph can be written, depending on its position in the word (see orthography.Glyph)
+GLYPH_FORMS = ('normal', 'before_consonant', 'after_consonant', 'at_beginning', 'at_end')
+
+# How much each feature counts towards the similarity of two languages
+FEATURE_WEIGHTS = (
+    ('consonants', .35),
+    ('vowels',     .15),
+    ('components', .3),
+    ('glyphs',     .2),
+)
+
+# Rows compared at a time by similar_pairs()
+BLOCK_SIZE = 256
+# Slack in similar_pairs()'s first, float32 pass, so it never rules out a pair the exact comparison would keep
+ROUNDING_MARGIN = 1e-4
+# Languages each worker generates at a time for build_index()
+LANGUAGES_PER_TASK = 100
+
+# Popcount of every byte
+POPCOUNT_TABLE = numpy.array([bin(byte).count('1') for byte in xrange(256)], dtype=numpy.uint8)
+
+
+def pack_bits(mask, bits):
+    ''' A bitmask (a python int) as an array of 64-bit words, lowest bits first '''
+    return numpy.array([mask >> shift & 0xFFFFFFFFFFFFFFFF for shift in xrange(0, bits, 64)], dtype=numpy.uint64)
+
+
+def popcount(words):
+    ''' The number of set bits in each row of an array of 64-bit words '''
+    words = numpy.ascontiguousarray(words)
+    return POPCOUNT_TABLE[words.view(numpy.uint8)].sum(axis=-1, dtype=numpy.int32)
+
+
+def jaccard(bits, other_bits):
+    ''' The Jaccard similarity of (rows of) bitsets. Two empty bitsets are alike '''
+    intersection = popcount(bits & other_bits)
+    union = popcount(bits | other_bits)
+    return numpy.where(union > 0, intersection / numpy.maximum(union, 1), 1.)
+
+
+def hash_glyph_choice(phoneme_id, form, letters):
+    ''' The bit a glyph choice sets. crc32 rather than hash(), which differs between processes '''
+    return zlib.crc32('{0} {1} {2}'.format(phoneme_id, form, letters).encode('utf-8')) % GLYPH_BITS
+
+
+class LanguageFeatures:
+    ''' The feature vectors of a language '''
+    def __init__(self, consonant_bits, vowel_bits, glyph_bits, component_weights):
+        self.consonant_bits = consonant_bits
+        self.vowel_bits = vowel_bits
+        self.glyph_bits = glyph_bits
+        self.component_weights = component_weights
+
+
+def get_features(language):
+    ''' The LanguageFeatures of a language '''
+    consonant_mask = language.valid_consonants.mask >> CONSONANT_ID_BASE
+    vowel_mask = language.valid_vowels.mask >> VOWEL_ID_BASE & ((1 << (CONSONANT_ID_BASE - VOWEL_ID_BASE)) - 1)
+
+    # Only the spellings of the phonemes the language has matter
+    glyph_mask = 0
+    for phoneme in list(language.valid_consonants) + list(language.valid_vowels):
+        glyph = language.orthography.mapping.get(phoneme.id_)
+        if glyph is not None:
+            for form in GLYPH_FORMS:
+                glyph_mask |= 1 << hash_glyph_choice(phoneme.id_, form, getattr(glyph, form))
+
+    # Each component type's probabilities sum to 1, so that no type outweighs the others
+    component_weights = numpy.zeros(len(phoneme_arrays.get_phoneme_arrays(language.phoneme_data)), dtype=numpy.float32)
+    for component_type in ('onset', 'coda', 'nucleus'):
+        probabilities = language.probabilities[component_type]
+        component_weights[probabilities.get_ids()] = probabilities.get_weights() / (probabilities.get_total() or 1)
+    component_weights /= numpy.linalg.norm(component_weights) or 1
+
+    return LanguageFeatures(consonant_bits=pack_bits(consonant_mask, CONSONANT_BITS), vowel_bits=pack_bits(vowel_mask, VOWEL_BITS),
+                            glyph_bits=pack_bits(glyph_mask, GLYPH_BITS), component_weights=component_weights)
+
+
+def get_seed_features(task):
+    ''' Worker: the features of the languages of a list of seeds '''
+    seeds, rule_file = task
+    phoneme_data = p.get_phoneme_data(rule_file) if rule_file else None
+    return [get_features(lang_gen.Language(seed=seed, phoneme_data=phoneme_data)) for seed in seeds]
+
+
+# ------------------------------------------ Index ------------------------------------------ #
+
+class SimilarityIndex:
+    ''' The features of many languages, as matrices with a row per language, and a key (usually
+        the seed) for each row. Languages can be added at any time; the matrices are rebuilt on
+        the next query '''
+    def __init__(self):
+        self.keys = []
+        self.features = []
+        self.matrices = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, language, key=None):
+        self.add_features(get_features(language), key=key if key is not None else language.seed)
+
+    def add_features(self, features, key):
+        self.keys.append(key)
+        self.features.append(features)
+        self.matrices = None
+
+    def get_matrices(self):
+        if self.matrices is None:
+            self.matrices = {
+                'consonants':   numpy.array([features.consonant_bits for features in self.features], dtype=numpy.uint64).reshape(-1, CONSONANT_BITS // 64),
+                'vowels':       numpy.array([features.vowel_bits for features in self.features], dtype=numpy.uint64).reshape(-1, VOWEL_BITS // 64),
+                'glyphs':       numpy.array([features.glyph_bits for features in self.features], dtype=numpy.uint64).reshape(-1, GLYPH_BITS // 64),
+                'components':   numpy.array([features.component_weights for features in self.features], dtype=numpy.float32),
+            }
+        return self.matrices
+
+    def get_row_features(self, row):
+        matrices = self.get_matrices()
+        return LanguageFeatures(consonant_bits=matrices['consonants'][row], vowel_bits=matrices['vowels'][row],
+                                glyph_bits=matrices['glyphs'][row], component_weights=matrices['components'][row])
+
+    def get_similarities(self, features, rows=slice(None)):
+        ''' The similarity of a language's features to (some of) the indexed languages '''
+        matrices = self.get_matrices()
+        weights = dict(FEATURE_WEIGHTS)
+        return (weights['consonants'] * jaccard(matrices['consonants'][rows], features.consonant_bits) +
+                weights['vowels'] * jaccard(matrices['vowels'][rows], features.vowel_bits) +
+                weights['glyphs'] * jaccard(matrices['glyphs'][rows], features.glyph_bits) +
+                weights['components'] * matrices['components'][rows].dot(features.component_weights))
+
+    def nearest(self, query, k=10):
+        ''' The k indexed languages most like the query (a key in the index, a Language or
+            LanguageFeatures), most similar first, as (key, similarity). A key doesn't match itself '''
+        if isinstance(query, lang_gen.Language):
+            features, own_row = get_features(query), None
+        elif isinstance(query, LanguageFeatures):
+            features, own_row = query, None
+        else:
+            own_row = self.keys.index(query)
+            features = self.get_row_features(own_row)
+
+        similarities = self.get_similarities(features)
+        if own_row is not None:
+            similarities[own_row] = -numpy.inf
+
+        k = min(k, len(self) - (own_row is not None))
+        if k <= 0:
+            return []
+        # Equally similar languages are listed in index order
+        best = numpy.argpartition(-similarities, k - 1)[:k]
+        best = best[numpy.lexsort((best, -similarities[best]))]
+        return [(self.keys[row], float(similarities[row])) for row in best]
+
+    def similar_pairs(self, threshold, block_size=BLOCK_SIZE):
+        ''' A generator of every pair of indexed languages with a similarity of at least the threshold, as
+            (key, key of an earlier language, similarity), in index order '''
+        matrices = self.get_matrices()
+        weights = dict(FEATURE_WEIGHTS)
+
+        # Even with every other feature the same, a pair needs at least this consonant Jaccard
+        minimum_consonant_jaccard = max(0, (threshold - (1 - weights['consonants'])) / weights['consonants'])
+
+        # The intersection of two bitsets is the dot product of their bits. unpackbits() shuffles the
+        # bits within each word, but the same way for every row
+        consonants = numpy.unpackbits(matrices['consonants'].view(numpy.uint8), axis=1).astype(numpy.float32)
+        consonant_counts = consonants.sum(axis=1)
+
+        for start in xrange(0, len(self), block_size):
+            end = min(start + block_size, len(self))
+
+            # Each row of the block against every row before it. A Jaccard of at least m means
+            # intersection * (1 + m) >= m * (count + other count), which needs no division
+            intersections = consonants[start:end].dot(consonants[:end].T)
+            candidates = intersections * (1 + minimum_consonant_jaccard) >= minimum_consonant_jaccard * (
+                consonant_counts[start:end, None] + consonant_counts[None, :end]) - ROUNDING_MARGIN
+            candidates[:, start:end] &= numpy.tri(end - start, end - start, -1, dtype=numpy.bool_)
+
+            block_rows, other_rows = numpy.nonzero(candidates)
+            rows = block_rows + start
+            similarities = (weights['consonants'] * jaccard(matrices['consonants'][rows], matrices['consonants'][other_rows]) +
+                            weights['vowels'] * jaccard(matrices['vowels'][rows], matrices['vowels'][other_rows]) +
+                            weights['glyphs'] * jaccard(matrices['glyphs'][rows], matrices['glyphs'][other_rows]) +
+                            weights['components'] * numpy.einsum('ij,ij->i', matrices['components'][rows], matrices['components'][other_rows]))
+
+            similar = similarities >= threshold
+            for row, other_row, similarity in zip(rows[similar], other_rows[similar], similarities[similar]):
+                yield self.keys[row], self.keys[other_row], float(similarity)
+
+    def near_duplicates(self, threshold, block_size=BLOCK_SIZE):
+        ''' The languages to prune so that no two which are left have a similarity of at least the threshold, as
+            {key: key of the earlier language it duplicates}, in index order. Earlier languages are the ones kept '''
+        rows = {key: row for row, key in enumerate(self.keys)}
+        similar_earlier_keys = {}
+        for key, other_key, _ in self.similar_pairs(threshold, block_size=block_size):
+            similar_earlier_keys.setdefault(key, []).append(other_key)
+
+        duplicates = OrderedDict()
+        for key in sorted(similar_earlier_keys, key=rows.get):
+            kept = [other_key for other_key in similar_earlier_keys[key] if other_key not in duplicates]
+            if kept:
+                duplicates[key] = min(kept, key=rows.get)
+        return duplicates
+
+    def save(self, path):
+        matrices = self.get_matrices()
+        with open(path, 'wb') as index_file:
+            numpy.savez(index_file, keys=numpy.array(self.keys), **matrices)
+
+    def load(self, path):
+        ''' Add the languages of an index written by save() '''
+        saved = numpy.load(path)
+        for row, key in enumerate(saved['keys'].tolist()):
+            self.add_features(LanguageFeatures(consonant_bits=saved['consonants'][row], vowel_bits=saved['vowels'][row],
+                                               glyph_bits=saved['glyphs'][row], component_weights=saved['components'][row]), key=key)
+        return self
+
+
+def build_index(seeds, processes=1, rule_file=None):
+    ''' A SimilarityIndex of the languages of the seeds, keyed by seed '''
+    seeds = list(seeds)
+    tasks = [(seeds[start:start + LANGUAGES_PER_TASK], rule_file) for start in xrange(0, len(seeds), LANGUAGES_PER_TASK)]
+
+    if processes == 1:
+        results = (get_seed_features(task) for task in tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes=processes)
+        results = pool.imap(get_seed_features, tasks)
+
+    index = SimilarityIndex()
+    try:
+        for (task_seeds, _), task_features in zip(tasks, results):
+            for seed, features in zip(task_seeds, task_features):
+                index.add_features(features, key=seed)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find similar languages')
+    parser.add_argument('--seeds', type=parse_seed_range, default=parse_seed_range('0-9999'), help='Seed range of the languages, such as 0-9999')
+    parser.add_argument('--nearest', type=int, default=None, help='List the languages most like this seed\'s')
+    parser.add_argument('-k', type=int, default=10, help='How many languages --nearest lists')
+    parser.add_argument('--duplicates', type=float, default=None, help='List the languages to prune as near-duplicates at this similarity')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes to generate the languages (0 for one per core)')
+    parser.add_argument('--rules', default=None, help='Rule file the languages use')
+    parser.add_argument('--index', default=None, help='Load the features from this file if it exists, and save them to it if not')
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.index and os.path.exists(args.index):
+        index = SimilarityIndex().load(args.index)
+    else:
+        index = build_index(args.seeds, processes=args.processes or None, rule_file=args.rules)
+        if args.index:
+            index.save(args.index)
+    print 'Indexed {0} languages in {1:.2f}s'.format(len(index), time.time() - start)
+
+    if args.nearest is not None:
+        query = args.nearest if args.nearest in index.keys else lang_gen.Language(seed=args.nearest,
+            phoneme_data=p.get_phoneme_data(args.rules) if args.rules else None)
+        for key, similarity in index.nearest(query, k=args.k):
+            print '{0:>8} {1:.4f}'.format(key, similarity)
+
+    if args.duplicates is not None:
+        start = time.time()
+        duplicates = index.near_duplicates(args.duplicates)
+        for key, kept_key in duplicates.iteritems():
+            print '{0:>8} duplicates {1}'.format(key, kept_key)
+        print '{0} of {1} languages are near-duplicates ({2:.2f}s)'.format(len(duplicates), len(index), time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
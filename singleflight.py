@@ -0,0 +1,67 @@
+from __future__ import division, unicode_literals
+import sys
+import threading
+
+'''
+Request coalescing ("single-flight"). When several threads ask for the same key at once,
+only the first one runs the function - the others wait for it to finish and get the same
+result (or the same exception). Once the call completes the key is forgotten, so this
+deduplicates concurrent work without caching anything.
+'''
+
+
+class Call:
+    ''' A call which is in flight. Waiters block on the event until the result is in '''
+    def __init__(self):
+        self.finished = threading.Event()
+        self.result = None
+        self.exc_info = None
+        # How many other callers ended up waiting on this call
+        self.waiters = 0
+
+    def get_result(self):
+        self.finished.wait()
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.result
+
+
+class SingleFlight:
+    ''' Deduplicates concurrent calls for the same key, and counts how many were coalesced '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+        # Number of calls which actually ran the function, and number which reused another's result
+        self.computed = 0
+        self.coalesced = 0
+
+    def do(self, key, function, *args, **kwargs):
+        ''' Run function(*args, **kwargs), unless a call for this key is already in flight,
+            in which case wait for that call and return its result instead '''
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                is_leader = False
+            else:
+                call = self.calls[key] = Call()
+                self.computed += 1
+                is_leader = True
+
+        if is_leader:
+            try:
+                call.result = function(*args, **kwargs)
+            except Exception:
+                call.exc_info = sys.exc_info()
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call.finished.set()
+
+        return call.get_result()
+
+    def get_stats(self):
+        with self.lock:
+            return {'computed': self.computed, 'coalesced': self.coalesced, 'in_flight': len(self.calls)}
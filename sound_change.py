@@ -0,0 +1,264 @@
+from __future__ import division, unicode_literals
+import re
+import io
+import sys
+import time
+import argparse
+from itertools import compress, count, imap
+from operator import ne
+
+import lang_gen
+import phonemes as p
+import lexicon
+from lexicon import is_consonant, parse_phonemes, compile_sequence
+from lang_gen import Syllable, Word
+
+'''
+Sound changes, applied to a whole vocabulary at once. Each change is one line of the form
+
+    <target> > <replacement> [/ <before> _ <after>]
+
+where the target is a phoneme, described like the consonants of a rule file ("<location>
+<method> <voicing> [except <id> ...]", see rules/default.rules), or a phoneme id, or V (any
+vowel) or C (any consonant). The replacement is:
+
+    a description        the target's features, with every one that isn't "any" swapped for the
+                         description's, so "any plosive 0 > any fricative any" turns /p/ into /f/
+                         and /t/ into /s/. Targets with no consonant for the new features are
+                         left alone
+    a phoneme id         that phoneme, whatever the target was
+    -                    nothing; the target is dropped
+
+The optional environment says what has to come before and after the target: phonemes as
+above, separated by "+" when there's more than one, or # for the start or end of the word. So
+
+    any plosive 1 > any plosive 0 / _ #                 word-final plosives lose their voicing
+    alveolar nasal 3 > bilabial any any / _ bilabial any any
+    V > - / V + C _ C + V                               a vowel between two syllables drops out
+
+Words are encoded one byte per phoneme (see lexicon.py) and joined into a single string, and
+each change is compiled to one regular expression over it, with the environment as fixed-width
+lookbehind and lookahead. Every change is a single substitution over the whole vocabulary, so
+a few dozen changes over a few hundred thousand words take a fraction of a second; only the
+words which came out different are then split back into syllables (see syllabify()).
+'''
+
+# The replacement which drops the target
+DELETION = '-'
+
+
+def get_replacement(phoneme, text):
+    ''' The phoneme id a replacement turns the phoneme into, None if it drops it, or the phoneme's own id
+        if the replacement doesn't apply to it '''
+    text = text.strip()
+    if text == DELETION:
+        return None
+    if text.isdigit():
+        return parse_phonemes(text)[0].id_
+    if not is_consonant(phoneme):
+        return phoneme.id_
+
+    rule = p.parse_rule(text)
+    location, method, voicing = [getattr(phoneme, feature) if getattr(rule, feature) == 'any' else getattr(rule, feature)
+                                 for feature in ('location', 'method', 'voicing')]
+    candidates = [consonant for consonant in p.CONSONANT_INDEX.find(location, method, voicing, rule.exceptions) if is_consonant(consonant)]
+    if not candidates:
+        return phoneme.id_
+
+    # Keep the phoneme's special feature (such as aspiration) if there's a consonant with it, otherwise go without
+    for special in (phoneme.special, None):
+        for consonant in candidates:
+            if consonant.special == special:
+                return consonant.id_
+    return candidates[0].id_
+
+
+class SoundChange:
+    ''' One sound change, compiled to a regular expression over a joined EncodedLexicon '''
+    def __init__(self, text):
+        self.text = text.strip()
+
+        change, _, environment = self.text.partition('/')
+        target, separator, replacement = change.partition('>')
+        if not separator:
+            raise ValueError('could not parse sound change "{0}"'.format(self.text))
+
+        # The byte of each phoneme the change applies to, and the bytes it becomes ('' if it's dropped)
+        self.replacements = {}
+        for phoneme in parse_phonemes(target):
+            new_phoneme_id = get_replacement(phoneme, replacement)
+            if new_phoneme_id != phoneme.id_:
+                self.replacements[lexicon.encode_phoneme_id(phoneme.id_)] = lexicon.encode_phoneme_id(new_phoneme_id) if new_phoneme_id is not None else b''
+
+        before, after = '', ''
+        if environment.strip():
+            before, separator, after = environment.partition('_')
+            if not separator:
+                raise ValueError('the environment of sound change "{0}" has no "_"'.format(self.text))
+
+        # Byte strings throughout, as phoneme bytes go above 127. The target comes first, with the lookbehind
+        # taking it in as well as what's before it, so that the regular expression engine only has to check
+        # the environment where there's a target
+        target_pattern = b'[' + b''.join(re.escape(byte) for byte in sorted(self.replacements)) + b']'
+        pattern = b'(' + target_pattern + b')'
+        pattern += b'(?<=' + compile_sequence(before) + target_pattern + b')' if before.strip() else b''
+        pattern += b'(?=' + compile_sequence(after) + b')' if after.strip() else b''
+        self.pattern = re.compile(pattern) if self.replacements else None
+
+        # Every target changing into the same thing can be replaced in one go
+        self.uniform_replacement = self.replacements.values()[0] if len(set(self.replacements.values())) == 1 else None
+
+    def __str__(self):
+        return self.text
+
+    def apply(self, joined):
+        ''' The joined lexicon, with this change made everywhere it applies '''
+        if self.pattern is None:
+            return joined
+
+        if self.uniform_replacement is not None:
+            return self.pattern.sub(self.uniform_replacement.replace(b'\\', br'\\'), joined)
+
+        # Splitting on the pattern puts each matched target between the parts of the string around it, so they
+        # can all be swapped for their replacements without a python call per match
+        parts = self.pattern.split(joined)
+        parts[1::2] = map(self.replacements.__getitem__, parts[1::2])
+        return b''.join(parts)
+
+
+def parse_sound_changes(text):
+    ''' SoundChanges from lines of text; blank lines and anything after a ";" are ignored '''
+    sound_changes = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        line = line.partition(';')[0].strip()
+        if not line:
+            continue
+        try:
+            sound_changes.append(SoundChange(line))
+        except ValueError as error:
+            raise ValueError('line {0}: {1}'.format(line_number, error))
+    return sound_changes
+
+
+def load_sound_changes(path):
+    ''' Read a sound change file (see rules/example.changes) '''
+    with open(path, 'rb') as sound_change_file:
+        contents = sound_change_file.read().decode('utf-8')
+    try:
+        return parse_sound_changes(contents)
+    except ValueError as error:
+        raise ValueError('{0}, {1}'.format(path, error))
+
+
+def apply_sound_changes(encoded_lexicon, sound_changes):
+    ''' The lexicon after each of the sound changes in turn, and the indexes of the words which changed '''
+    joined = encoded_lexicon.join()
+    for sound_change in sound_changes:
+        joined = sound_change.apply(joined)
+    changed_lexicon = encoded_lexicon.split(joined)
+
+    changed = list(compress(count(), imap(ne, encoded_lexicon.encoded_words, changed_lexicon.encoded_words)))
+    return changed_lexicon, changed
+
+
+# ------------------------------------------ Syllables ------------------------------------------ #
+
+def split_cluster(cluster, phoneme_data):
+    ''' The coda and onset a run of consonants between two vowels splits into, giving the onset as many
+        of the consonants as it can take; None if there's no way to split it '''
+    for split in xrange(len(cluster) + 1):
+        coda = phoneme_data.get_component_by_phoneme_ids('coda', cluster[:split]) if split else phoneme_data.empty_coda
+        onset = phoneme_data.get_component_by_phoneme_ids('onset', cluster[split:]) if split < len(cluster) else phoneme_data.empty_onset
+        if coda is not None and onset is not None:
+            return coda, onset
+    return None
+
+
+def syllabify(phoneme_ids, phoneme_data):
+    ''' The syllables of a word's phoneme ids (without the empty placeholders), with a syllable for every
+        vowel; None if the consonants between them can't be made into onsets and codas of the phoneme data '''
+    vowel_positions = [position for position, phoneme_id in enumerate(phoneme_ids) if not phoneme_data.is_consonant(phoneme_id)]
+    if not vowel_positions:
+        return None
+
+    onset = phoneme_data.get_component_by_phoneme_ids('onset', phoneme_ids[:vowel_positions[0]]) if vowel_positions[0] else phoneme_data.empty_onset
+    if onset is None:
+        return None
+
+    syllables = []
+    for position, next_position in zip(vowel_positions, vowel_positions[1:] + [None]):
+        nucleus = phoneme_data.get_component_by_phoneme_ids('nucleus', phoneme_ids[position:position + 1])
+        if nucleus is None:
+            return None
+
+        if next_position is None:
+            coda = phoneme_data.get_component_by_phoneme_ids('coda', phoneme_ids[position + 1:]) if position + 1 < len(phoneme_ids) else phoneme_data.empty_coda
+            next_onset = None
+        else:
+            split = split_cluster(phoneme_ids[position + 1:next_position], phoneme_data)
+            coda, next_onset = split if split is not None else (None, None)
+        if coda is None:
+            return None
+
+        syllables.append(Syllable(onset=onset, nucleus=nucleus, coda=coda))
+        onset = next_onset
+
+    return syllables
+
+
+def evolve(language, sound_changes, changes=None, seed=None):
+    ''' A descendant of the language (see Language.derive, which is given the changes and seed) whose words
+        have gone through the sound changes. Returns the descendant, the keys of the words which changed, and
+        the keys of the words which were lost because they could no longer be split into syllables.
+
+        A changed word may have phonemes or clusters the language never had; it only has to be possible
+        under the language's phoneme data. Words which didn't change stay shared with the language '''
+    encoded_lexicon = lexicon.encode_vocabulary(language.vocabulary)
+    changed_lexicon, changed = apply_sound_changes(encoded_lexicon, sound_changes)
+
+    descendant = language.derive(changes=changes, seed=seed)
+    changed_keys, lost_keys = [], []
+    for index in changed:
+        key = changed_lexicon.keys[index]
+        syllables = syllabify(changed_lexicon.get_phoneme_ids(index), language.phoneme_data)
+        if syllables is None:
+            del descendant.vocabulary[key]
+            lost_keys.append(key)
+        else:
+            word = language.vocabulary[key]
+            descendant.vocabulary[key] = Word(meaning=word.meaning, language=descendant, syllables=syllables, etymology=word.etymology)
+            changed_keys.append(key)
+
+    return descendant, changed_keys, lost_keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply sound changes to a language\'s vocabulary')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the language')
+    parser.add_argument('--words', type=int, default=1000, help='How many words to generate for it')
+    parser.add_argument('--changes', default='rules/example.changes', help='Sound change file')
+    parser.add_argument('--show', type=int, default=20, help='How many changed words to list')
+    args = parser.parse_args()
+
+    sound_changes = load_sound_changes(args.changes)
+    # Words are spelled with characters outside ascii, so they can't go through print when stdout is piped
+    output_file = io.open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+
+    with output_file:
+        language = lang_gen.Language(seed=args.seed)
+        start = time.time()
+        for i in xrange(args.words):
+            language.create_word(meaning='word {0}'.format(i), number_of_syllables=language.rng.roll(1, 3))
+        output_file.write('Generated {0} words in {1:.2f}s\n'.format(len(language.vocabulary), time.time() - start))
+
+        start = time.time()
+        descendant, changed_keys, lost_keys = evolve(language, sound_changes)
+        output_file.write('Applied {0} sound changes in {1:.2f}s: {2} words changed, {3} lost\n'.format(
+            len(sound_changes), time.time() - start, len(changed_keys), len(lost_keys)))
+
+        for key in changed_keys[:args.show]:
+            output_file.write('{0:>12}  {1:<16} {2}\n'.format(key, unicode(language.vocabulary[key]), unicode(descendant.vocabulary[key])))
+
+
+if __name__ == '__main__':
+    main()
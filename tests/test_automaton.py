@@ -0,0 +1,91 @@
+from __future__ import division, unicode_literals
+import math
+import itertools
+import unittest
+
+import lang_gen
+
+
+class WordAutomatonTest(unittest.TestCase):
+    ''' Counting, ranking and the most probable words, checked against enumerating the paths directly '''
+    SEEDS = (0, 3, 7)
+    # Has the fewest one syllable words of the seeds, so every one of them is unranked
+    SMALL_SEED = 7
+
+    def get_paths(self, automaton, number_of_syllables):
+        ''' Every path through the automaton's allowed transitions, the slow way '''
+        def extend(path, state, positions):
+            if not positions:
+                yield path
+                return
+            position = positions[0]
+            for onset in xrange(len(automaton.onsets)):
+                if not automaton.onset_allowed[position][state, onset]:
+                    continue
+                for coda in xrange(len(automaton.codas)):
+                    if not automaton.coda_allowed[position][onset, coda]:
+                        continue
+                    for nucleus in automaton.allowed_nuclei[position]:
+                        for extended_path in extend(path + [(onset, coda, nucleus)], coda, positions[1:]):
+                            yield extended_path
+
+        return extend([], automaton.start, automaton.get_positions(number_of_syllables))
+
+    def count_paths(self, automaton, number_of_syllables):
+        ''' The number of paths, counted from each state rather than listed one by one '''
+        counts = {}
+        def count_from(state, positions):
+            if not positions:
+                return 1
+            if (state, len(positions)) not in counts:
+                position = positions[0]
+                counts[state, len(positions)] = sum(len(automaton.allowed_nuclei[position]) * count_from(coda, positions[1:])
+                                                    for onset in xrange(len(automaton.onsets)) if automaton.onset_allowed[position][state, onset]
+                                                    for coda in xrange(len(automaton.codas)) if automaton.coda_allowed[position][onset, coda])
+            return counts[state, len(positions)]
+
+        return count_from(automaton.start, automaton.get_positions(number_of_syllables))
+
+    def test_count(self):
+        for seed in self.SEEDS:
+            automaton = lang_gen.Language(seed=seed).get_automaton()
+            self.assertEqual(automaton.count(1), sum(1 for _ in self.get_paths(automaton, 1)))
+            for number_of_syllables in (1, 2):
+                self.assertEqual(automaton.count(number_of_syllables), self.count_paths(automaton, number_of_syllables))
+
+    def test_every_rank(self):
+        automaton = lang_gen.Language(seed=self.SMALL_SEED).get_automaton()
+        # Every one syllable word, each once
+        words = [automaton.unrank(rank, 1) for rank in xrange(automaton.count(1))]
+        self.assertEqual(sorted(automaton.get_path_components(word) for word in words), sorted(self.get_paths(automaton, 1)))
+        self.assertEqual([automaton.rank(word) for word in words], range(automaton.count(1)))
+
+    def test_rank_round_trip(self):
+        for seed in self.SEEDS:
+            automaton = lang_gen.Language(seed=seed).get_automaton()
+            for number_of_syllables in (1, 2, 3):
+                count = automaton.count(number_of_syllables)
+                for rank in (0, 1, count // 3, count // 2 + 1, count - 1):
+                    self.assertEqual(automaton.rank(automaton.unrank(rank, number_of_syllables)), rank)
+
+    def test_most_probable(self):
+        for seed in self.SEEDS:
+            automaton = lang_gen.Language(seed=seed).get_automaton()
+            for number_of_syllables in (1, 2):
+                top = list(itertools.islice(automaton.iterate_most_probable(number_of_syllables), 200))
+                log_probabilities = [log_probability for log_probability, _ in top]
+                for log_probability, next_log_probability in zip(log_probabilities, log_probabilities[1:]):
+                    self.assertGreaterEqual(log_probability, next_log_probability - 1e-12)
+                for log_probability, word in top:
+                    self.assertAlmostEqual(log_probability, automaton.log_probability(word), places=9)
+                self.assertEqual(len(set(automaton.rank(word) for _, word in top)), len(top))
+
+            # The best of all the one syllable words
+            every_log_probability = sorted((math.log(automaton.get_path_probability(path)) for path in self.get_paths(automaton, 1)), reverse=True)
+            top = [log_probability for log_probability, _ in itertools.islice(automaton.iterate_most_probable(1), 100)]
+            for log_probability, expected in zip(top, every_log_probability):
+                self.assertAlmostEqual(log_probability, expected, places=9)
+
+
+if __name__ == '__main__':
+    unittest.main()
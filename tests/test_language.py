@@ -0,0 +1,91 @@
+from __future__ import division, unicode_literals
+import pickle
+import unittest
+
+import lang_gen
+
+
+class LanguageLogTest(unittest.TestCase):
+    ''' Language.log is generated on first access, and can't be changed through '''
+    def setUp(self):
+        self.language = lang_gen.Language(seed=3)
+
+    def test_read_only(self):
+        with self.assertRaises(AttributeError):
+            self.language.log = ['replaced']
+        with self.assertRaises(AttributeError):
+            self.language.log.append('appended')
+
+    def test_same_after_pickling(self):
+        # Pickled before any stage is generated, so the copy generates them itself
+        language_copy = pickle.loads(pickle.dumps(self.language, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(language_copy.log, self.language.log)
+        self.assertEqual(language_copy.valid_consonants.mask, self.language.valid_consonants.mask)
+
+
+class FailedStageTest(unittest.TestCase):
+    ''' A stage which raises is left as it was, and generated afresh on the next access '''
+    def setUp(self):
+        self.language = lang_gen.Language(seed=3)
+
+        def fail():
+            raise RuntimeError('bad rules')
+        self.language.generate_orthography = fail
+
+    def get_spellings(self, language):
+        return [(phoneme_id, language.orthography.mapping[phoneme_id].normal) for phoneme_id in sorted(language.orthography.mapping.keys())]
+
+    def test_error_is_raised_again(self):
+        for attempt in xrange(2):
+            with self.assertRaises(RuntimeError):
+                self.language.orthography
+        self.assertIsNone(self.language.stage_rng)
+        self.assertIsNone(self.language.stage_log)
+
+    def test_retry(self):
+        with self.assertRaises(RuntimeError):
+            self.language.orthography
+        del self.language.generate_orthography
+        self.assertEqual(self.get_spellings(self.language), self.get_spellings(lang_gen.Language(seed=3)))
+
+
+class DerivedWordIndexTest(unittest.TestCase):
+    ''' A descendant rejects words like its parent's without copying the parent's words in '''
+    def setUp(self):
+        self.parent = lang_gen.Language(seed=1)
+        for i in xrange(300):
+            self.parent.create_word(meaning='parent {0}'.format(i))
+        self.parent.reject_similar_words(1)
+        self.descendant = self.parent.derive()
+
+    def test_setting_is_inherited(self):
+        self.assertEqual(self.descendant.similar_word_distance, 1)
+        self.assertEqual(self.descendant.inherited_word_indexes, (self.parent.word_index,))
+
+    def test_inherited_words_are_not_copied(self):
+        for i in xrange(50):
+            self.descendant.create_word(meaning='descendant {0}'.format(i))
+        self.assertEqual(len(self.descendant.vocabulary.words), 50)
+        self.assertEqual(len(self.descendant.word_index), 50)
+
+        self.descendant.reject_similar_words(1)
+        self.assertEqual(len(self.descendant.vocabulary.words), 50)
+        self.assertEqual(len(self.descendant.word_index), 50)
+
+    def test_parent_words_count(self):
+        # A parent word with no other word near it, so that it's the only one which can count
+        key, word = next((key, word) for key, word in sorted(self.parent.vocabulary.items())
+                         if not self.parent.has_similar_word(word, key=key))
+        self.assertTrue(self.descendant.has_similar_word(word, key='another meaning'))
+
+        # Still the same word once it's been copied into the descendant
+        self.descendant.vocabulary[key]
+        self.assertTrue(self.descendant.has_similar_word(word, key='another meaning'))
+
+        # But not once the descendant has lost it, though the parent still has it
+        del self.descendant.vocabulary[key]
+        self.assertFalse(self.descendant.has_similar_word(word, key='another meaning'))
+        self.assertTrue(self.parent.has_similar_word(word, key='another meaning'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+from __future__ import division, unicode_literals
+import unittest
+
+import lang_gen
+
+
+class DerivedOrthographyTest(unittest.TestCase):
+    ''' A descendant's glyph changes never reach its parent '''
+    def setUp(self):
+        self.parent = lang_gen.Language(seed=0)
+        self.parent.generate_language_properties()
+        self.descendant = self.parent.derive(changes={'glyphs': {201: 'q'}})
+        # One of the glyphs the parent's orthography changed from the shared table
+        self.phoneme_id = sorted(self.parent.orthography.mapping.overlay)[0]
+
+    def test_shared_glyphs_are_frozen(self):
+        with self.assertRaises(AttributeError):
+            self.descendant.orthography.mapping[self.phoneme_id].normal = 'leak'
+
+    def test_writable_glyphs_are_copies(self):
+        normal = self.parent.orthography.mapping[self.phoneme_id].normal
+        self.descendant.orthography.mapping.get_writable(self.phoneme_id).normal = 'descendant'
+        self.assertEqual(self.parent.orthography.mapping[self.phoneme_id].normal, normal)
+
+        self.parent.orthography.mapping.get_writable(self.phoneme_id).normal = 'parent'
+        self.assertEqual(self.descendant.orthography.mapping[self.phoneme_id].normal, 'descendant')
+
+    def test_own_random_source(self):
+        self.assertIs(self.descendant.orthography.rng, self.descendant.rng)
+
+
+if __name__ == '__main__':
+    unittest.main()
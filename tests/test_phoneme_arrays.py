@@ -0,0 +1,49 @@
+from __future__ import division, unicode_literals
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+import numpy
+
+import phonemes as p
+import phoneme_arrays
+
+# Run in a fresh interpreter, so that nothing has imported phonemes before attaching
+ATTACH_SCRIPT = '''
+import sys
+import phoneme_arrays
+arrays = phoneme_arrays.attach_rule_set_arrays(sys.argv[1], sys.argv[2], directory=sys.argv[3])
+sys.stdout.write('{0} {1} {2}'.format(len(arrays), arrays.phoneme_ids.sum(), 'phonemes' in sys.modules))
+'''
+
+
+class AttachRuleSetArraysTest(unittest.TestCase):
+    ''' A worker can attach a rule set's arrays from its name and digest alone '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rule_set = p.data.rule_set
+        self.arrays = phoneme_arrays.encode_phoneme_data(p.data)
+        phoneme_arrays.save_phoneme_arrays(self.arrays, phoneme_arrays.get_rule_set_array_path(self.rule_set.name, self.rule_set.digest, self.directory))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_attach_without_phonemes(self):
+        output = subprocess.check_output([sys.executable, '-c', ATTACH_SCRIPT, self.rule_set.name, self.rule_set.digest, self.directory],
+                                         cwd=os.path.dirname(os.path.abspath(phoneme_arrays.__file__)))
+        self.assertEqual(output.decode('utf-8'), '{0} {1} False'.format(len(self.arrays), self.arrays.phoneme_ids.sum()))
+
+    def test_attached_arrays_match(self):
+        attached = phoneme_arrays.attach_phoneme_arrays(phoneme_arrays.get_rule_set_array_path(self.rule_set.name, self.rule_set.digest, self.directory))
+        for name in phoneme_arrays.ARRAY_NAMES:
+            numpy.testing.assert_array_equal(getattr(attached, name), getattr(self.arrays, name))
+
+    def test_unknown_digest(self):
+        self.assertIsNone(phoneme_arrays.attach_rule_set_arrays(self.rule_set.name, '0' * 40, directory=self.directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
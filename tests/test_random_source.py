@@ -0,0 +1,45 @@
+from __future__ import division, unicode_literals
+import copy
+import pickle
+import unittest
+
+import lang_gen
+from random_source import RandomSource
+
+
+class RandomSourceCopyTest(unittest.TestCase):
+    ''' Copies of a source, part way through a block, carry on with the same variates as the original '''
+    def check_copies(self, block_size):
+        source = RandomSource(seed=5, block_size=block_size)
+        for _ in xrange(1000):
+            source.random()
+
+        copies = [copy.deepcopy(source), pickle.loads(pickle.dumps(source)), pickle.loads(pickle.dumps(source, pickle.HIGHEST_PROTOCOL))]
+        expected = [source.random() for _ in xrange(3000)]
+        for source_copy in copies:
+            self.assertEqual([source_copy.random() for _ in xrange(3000)], expected)
+
+    def test_copies_within_a_block(self):
+        self.check_copies(block_size=4096)
+
+    def test_copies_across_blocks(self):
+        self.check_copies(block_size=7)
+
+    def test_copies_before_the_first_draw(self):
+        source = RandomSource(seed=5)
+        source_copy = pickle.loads(pickle.dumps(copy.deepcopy(source)))
+        self.assertEqual([source_copy.random() for _ in xrange(10)], [source.random() for _ in xrange(10)])
+
+    def test_language_copies(self):
+        language = lang_gen.Language(seed=3)
+        for i in xrange(20):
+            language.create_word(meaning='word {0}'.format(i))
+
+        copies = [copy.deepcopy(language), pickle.loads(pickle.dumps(language, pickle.HIGHEST_PROTOCOL))]
+        expected = [language.create_word(meaning='more {0}'.format(i)).phoneme_ids for i in xrange(30)]
+        for language_copy in copies:
+            self.assertEqual([language_copy.create_word(meaning='more {0}'.format(i)).phoneme_ids for i in xrange(30)], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+from __future__ import division, unicode_literals
+import unittest
+
+import cli
+
+
+class ReproducibleOutputTest(unittest.TestCase):
+    ''' The batch tool writes the same records whatever the hash seed and number of workers (see
+        cli.REPRODUCIBILITY_CHECK_RUNS), each run in a fresh process '''
+    def check(self, arguments):
+        reports = []
+        self.assertTrue(cli.check_reproducible(arguments, report=reports.append), '\n'.join(reports))
+        self.assertEqual(len(reports), len(cli.REPRODUCIBILITY_CHECK_RUNS))
+
+    def test_words(self):
+        self.check(['--seeds', '0-9', '--words', '20', '--compounds'])
+
+    def test_words_across_tasks(self):
+        self.check(['--seeds', '0-1', '--words', str(cli.WORDS_PER_TASK + 10)])
+
+    def test_languages(self):
+        self.check(['--seeds', '0-19', '--words', '0', '--format', 'csv'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,17 @@
+from __future__ import division, unicode_literals
+import unittest
+
+import search
+
+
+class IndexDigestTest(unittest.TestCase):
+    ''' A saved search index is only reused with the code that made its summaries '''
+    def test_generator_modules(self):
+        modules = search.get_generator_modules()
+        for name in ('lang_gen', 'phonemes', 'orthography', 'component_weights', 'helpers', 'random_source'):
+            self.assertIn(name, modules)
+        self.assertNotIn('numpy', modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+from __future__ import division, unicode_literals
+import os
+import unittest
+
+import lang_gen
+import lexicon
+import sound_change
+
+
+SOUND_CHANGE_FILE = os.path.join(os.path.dirname(os.path.abspath(sound_change.__file__)), 'rules', 'example.changes')
+# Word boundary in the environments of ReferenceSoundChange
+BOUNDARY = '#'
+
+
+class ReferenceSoundChange:
+    ''' A sound change applied to one word's phoneme ids a phoneme at a time, the slow and obvious way '''
+    def __init__(self, text):
+        change, _, environment = text.partition('/')
+        target, _, replacement = change.partition('>')
+        self.replacements = {phoneme.id_: sound_change.get_replacement(phoneme, replacement) for phoneme in lexicon.parse_phonemes(target)}
+
+        before, _, after = environment.partition('_')
+        self.before = [self.parse_element(text) for text in before.split('+')] if before.strip() else []
+        self.after = [self.parse_element(text) for text in after.split('+')] if after.strip() else []
+
+    def parse_element(self, text):
+        return BOUNDARY if text.strip() == BOUNDARY else set(phoneme.id_ for phoneme in lexicon.parse_phonemes(text))
+
+    def matches(self, padded, position, elements):
+        ''' Whether the elements are at the position of the padded phoneme ids '''
+        return 0 <= position and position + len(elements) <= len(padded) and all(
+            padded[position + i] == BOUNDARY if element == BOUNDARY else padded[position + i] in element
+            for i, element in enumerate(elements))
+
+    def apply(self, phoneme_ids):
+        padded = [BOUNDARY] + list(phoneme_ids) + [BOUNDARY]
+        changed = []
+        for position in xrange(1, len(padded) - 1):
+            phoneme_id = padded[position]
+            if (self.replacements.get(phoneme_id, phoneme_id) != phoneme_id and
+                    self.matches(padded, position - len(self.before), self.before) and self.matches(padded, position + 1, self.after)):
+                if self.replacements[phoneme_id] is not None:
+                    changed.append(self.replacements[phoneme_id])
+            else:
+                changed.append(phoneme_id)
+        return tuple(changed)
+
+
+class ApplySoundChangesTest(unittest.TestCase):
+    ''' Changes made to a whole lexicon at once come out as they would word by word '''
+    @classmethod
+    def setUpClass(cls):
+        cls.sound_changes = sound_change.load_sound_changes(SOUND_CHANGE_FILE)
+        cls.words = []
+        for seed in xrange(5):
+            language = lang_gen.Language(seed=seed)
+            cls.words.extend(language.draw_word(meaning=None, number_of_syllables=1 + i % 3) for i in xrange(200))
+        cls.encoded_lexicon = lexicon.encode_words(cls.words)
+        cls.changed_lexicon, cls.changed = sound_change.apply_sound_changes(cls.encoded_lexicon, cls.sound_changes)
+
+    def test_word_by_word(self):
+        for index in xrange(len(self.words)):
+            word_lexicon, word_changed = sound_change.apply_sound_changes(lexicon.encode_words(self.words[index:index + 1]), self.sound_changes)
+            self.assertEqual(word_lexicon.get_phoneme_ids(0), self.changed_lexicon.get_phoneme_ids(index))
+            self.assertEqual(bool(word_changed), index in self.changed)
+
+    def test_reference(self):
+        reference_changes = [ReferenceSoundChange(change.text) for change in self.sound_changes]
+        for index in xrange(len(self.words)):
+            phoneme_ids = self.encoded_lexicon.get_phoneme_ids(index)
+            for reference_change in reference_changes:
+                phoneme_ids = reference_change.apply(phoneme_ids)
+            self.assertEqual(phoneme_ids, self.changed_lexicon.get_phoneme_ids(index))
+
+    def test_some_words_change(self):
+        self.assertTrue(0 < len(self.changed) < len(self.words))
+
+    def test_syllabify_round_trip(self):
+        for index, word in enumerate(self.words):
+            syllables = sound_change.syllabify(self.encoded_lexicon.get_phoneme_ids(index), word.language.phoneme_data)
+            self.assertIsNotNone(syllables)
+            self.assertEqual(lexicon.encode(lang_gen.Word(None, word.language, syllables).phoneme_ids), lexicon.encode(word.phoneme_ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
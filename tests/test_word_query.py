@@ -0,0 +1,89 @@
+from __future__ import division, unicode_literals
+import unittest
+
+import lang_gen
+import lexicon
+import word_query
+
+
+# Word boundary in the sequences of the reference checks
+BOUNDARY = '#'
+
+
+def get_phoneme_ids(text):
+    return set(phoneme.id_ for phoneme in lexicon.parse_phonemes(text))
+
+
+def get_real_phoneme_ids(phoneme_ids):
+    ''' Without the empty onset / coda placeholders '''
+    return [phoneme_id for phoneme_id in phoneme_ids if phoneme_id < lexicon.EMPTY_PHONEME_ID_BASE]
+
+
+def has_in_slot(word, position, slot, text):
+    ''' Whether the slot of a syllable of the word has one of the phonemes, checked syllable by syllable '''
+    syllables = {'first': word.syllables[:1], 'second': word.syllables[1:2], 'third': word.syllables[2:3],
+                 'last': word.syllables[-1:], 'any': word.syllables}[position]
+    components = [getattr(syllable, slot) for syllable in syllables]
+    if text == word_query.EMPTY:
+        return any(component.is_empty() for component in components)
+    phoneme_ids = get_phoneme_ids(text)
+    return any(phoneme_id in phoneme_ids for component in components for phoneme_id in get_real_phoneme_ids(component.phoneme_ids))
+
+
+def has_sequence(word, text):
+    ''' Whether the word's phonemes (between boundaries) have the sequence somewhere, checked position by position '''
+    elements = [BOUNDARY if element.strip() == BOUNDARY else get_phoneme_ids(element) for element in text.split('+')]
+    padded = [BOUNDARY] + get_real_phoneme_ids(word.phoneme_ids) + [BOUNDARY]
+    return any(all(padded[start + i] == BOUNDARY if element == BOUNDARY else padded[start + i] in element
+                   for i, element in enumerate(elements))
+               for start in xrange(len(padded) - len(elements) + 1))
+
+
+# Queries, and the same test of a single word
+QUERIES = (
+    ('first onset velar plosive any',           lambda word: has_in_slot(word, 'first', 'onset', 'velar plosive any')),
+    ('last coda any nasal 3',                   lambda word: has_in_slot(word, 'last', 'coda', 'any nasal 3')),
+    ('any coda empty',                          lambda word: has_in_slot(word, 'any', 'coda', 'empty')),
+    ('first onset empty',                       lambda word: has_in_slot(word, 'first', 'onset', 'empty')),
+    ('second nucleus V',                        lambda word: has_in_slot(word, 'second', 'nucleus', 'V')),
+    ('third onset C',                           lambda word: has_in_slot(word, 'third', 'onset', 'C')),
+    ('has any nasal 3 + any plosive any',       lambda word: has_sequence(word, 'any nasal 3 + any plosive any')),
+    ('starts with V',                           lambda word: has_sequence(word, '# + V')),
+    ('ends with C + C',                         lambda word: has_sequence(word, 'C + C + #')),
+    ('has V + V',                               lambda word: has_sequence(word, 'V + V')),
+    ('syllables 2-3',                           lambda word: 2 <= len(word.syllables) <= 3),
+    ('first onset velar plosive any and not last coda empty and syllables 3',
+        lambda word: has_in_slot(word, 'first', 'onset', 'velar plosive any') and not has_in_slot(word, 'last', 'coda', 'empty') and len(word.syllables) == 3),
+)
+
+
+class WordQueryTest(unittest.TestCase):
+    ''' Queries over a WordIndex find the same words as checking each word on its own '''
+    @classmethod
+    def setUpClass(cls):
+        cls.words = []
+        for seed in xrange(5):
+            language = lang_gen.Language(seed=seed)
+            cls.words.extend(language.draw_word(meaning=None, number_of_syllables=1 + i % 4) for i in xrange(400))
+
+    def check(self, index):
+        for text, matches in QUERIES:
+            expected = set(position for position, word in enumerate(self.words) if matches(word))
+            self.assertEqual(set(index.find(text)), expected, text)
+            self.assertEqual(index.count(text), len(expected), text)
+
+    def test_queries(self):
+        self.check(word_query.index_words(self.words))
+
+    def test_queries_across_chunks(self):
+        # Chunks of a size which doesn't divide the number of words
+        chunk_size = word_query.INDEX_CHUNK_SIZE
+        word_query.INDEX_CHUNK_SIZE = 333
+        try:
+            self.check(word_query.index_words(self.words))
+        finally:
+            word_query.INDEX_CHUNK_SIZE = chunk_size
+
+
+if __name__ == '__main__':
+    unittest.main()
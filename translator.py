@@ -0,0 +1,129 @@
+from __future__ import division, unicode_literals
+import re
+import io
+import sys
+import time
+import random
+import argparse
+
+import lang_gen
+from dictionary import PREPOSITIONS, ARTICLES
+
+'''
+Translates running English text into a generated language. Text is read and written in
+chunks, so arbitrarily large inputs are translated in constant memory. Each distinct
+English token is only rendered once - after that its translation is a dictionary lookup.
+'''
+
+# Splits text into alternating [separator, word, separator, word, ..., separator] pieces.
+# Apostrophes inside a word ("don't", "king's") keep it as a single token
+WORD_SPLIT = re.compile(r"([A-Za-z]+(?:'[A-Za-z]+)*)")
+
+# Articles don't map one to one; both "a" and "an" become the same word
+ARTICLE_MEANINGS = {'a': 'a', 'an': 'a', 'the': 'the'}
+
+# Size of the chunks (in characters) the input is read in
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class RenderedTokens(dict):
+    ''' Maps an English token (with its capitalization) to its rendered translation,
+        translating the token the first time it's looked up '''
+    def __init__(self, translator):
+        dict.__init__(self)
+        self.translator = translator
+
+    def __missing__(self, token):
+        rendered = self[token] = self.translator.translate_token(token)
+        return rendered
+
+
+class Translator:
+    ''' Translates English text into a language, creating words for it as they're needed '''
+    def __init__(self, language):
+        self.language = language
+        self.rendered_tokens = RenderedTokens(translator=self)
+
+    def get_word_for_meaning(self, meaning):
+        ''' Prepositions and articles are short, frequent words, so they always get a single syllable '''
+        if meaning in ARTICLE_MEANINGS:
+            meaning = ARTICLE_MEANINGS[meaning]
+        if meaning not in self.language.vocabulary and (meaning in PREPOSITIONS or meaning in ARTICLES):
+            self.language.create_word(meaning=meaning, number_of_syllables=1)
+
+        return self.language.get_word(meaning=meaning)
+
+    def translate_token(self, token):
+        ''' Render a single English word, keeping its capitalization '''
+        word = self.get_word_for_meaning(meaning=token.lower())
+        translation = self.language.orthography.phon_to_orth(word=word)
+
+        if len(token) > 1 and token.isupper():  return translation.upper()
+        elif token[0].isupper():                 return translation[0].upper() + translation[1:]
+        else:                                    return translation
+
+    def translate_text(self, text):
+        ''' Translate a piece of text in which no word is split across the end '''
+        pieces = WORD_SPLIT.split(text)
+        pieces[1::2] = map(self.rendered_tokens.__getitem__, pieces[1::2])
+        return ''.join(pieces)
+
+    def translate_stream(self, chunks):
+        ''' A generator which translates an iterable of text chunks. Any word which runs over the
+            end of a chunk is held back until the next chunk, so words are never split '''
+        carry = ''
+        for chunk in chunks:
+            text = carry + chunk
+            # Everything after the last non-letter could be the start of a word that continues in the next chunk
+            split_at = len(text)
+            while split_at and (text[split_at - 1].isalpha() or text[split_at - 1] == "'"):
+                split_at -= 1
+
+            carry = text[split_at:]
+            if split_at:
+                yield self.translate_text(text[:split_at])
+
+        if carry:
+            yield self.translate_text(carry)
+
+    def translate_file(self, input_file, output_file, chunk_size=DEFAULT_CHUNK_SIZE):
+        ''' Translate one file into another, chunk by chunk. Returns the number of characters read '''
+        characters_read = [0]
+
+        def read_chunks():
+            for chunk in iter(lambda: input_file.read(chunk_size), ''):
+                characters_read[0] += len(chunk)
+                yield chunk
+
+        for translated_chunk in self.translate_stream(read_chunks()):
+            output_file.write(translated_chunk)
+
+        return characters_read[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Translate English text into a generated language')
+    parser.add_argument('input', nargs='?', default='-', help='Text file to translate (default: stdin)')
+    parser.add_argument('--output', '-o', default='-', help='Where to write the translation (default: stdout)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the language to translate into')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randint(0, 32000)
+    language = lang_gen.Language(seed=seed)
+    language.generate_language_properties()
+
+    input_file = io.open(sys.stdin.fileno() if args.input == '-' else args.input, encoding='utf-8', closefd=args.input != '-')
+    output_file = io.open(sys.stdout.fileno() if args.output == '-' else args.output, 'w', encoding='utf-8', closefd=args.output != '-')
+
+    start = time.time()
+    with input_file, output_file:
+        characters_read = Translator(language).translate_file(input_file, output_file, chunk_size=args.chunk_size)
+    elapsed = time.time() - start
+
+    sys.stderr.write('Translated {0:.1f} MB into language {1} in {2:.2f}s ({3:.1f} MB/s), {4} distinct words\n'.format(
+        characters_read / 2**20, seed, elapsed, characters_read / 2**20 / max(elapsed, 1e-6), len(language.vocabulary)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+from __future__ import division, unicode_literals
+import sys
+import math
+import time
+import argparse
+import multiprocessing
+
+import numpy
+
+import lang_gen
+from random_source import RandomSource
+
+'''
+Checks that the words a language generates follow its probabilities. Generates a large
+number of words for one language seed (spread over all cores), counts how often each onset,
+nucleus and coda was chosen with numpy.bincount, and compares the counts against the
+distribution the language's probabilities predict, with chi-square tests.
+
+The rules in choose_valid_onset() / choose_valid_coda() make each choice depend on what came
+before it - an onset depends on the previous syllable's coda, and a coda on its own onset.
+So each component is tested conditionally: for every previous coda (or onset) that was seen,
+the expected counts are how often it was seen times the probabilities the rules give after it.
+
+Run it before and after changing how words are sampled:
+
+    python validate.py --seed 42 --words 1000000
+'''
+
+# Syllable positions, as returned by Language.get_syllable_position()
+SYLLABLE_POSITIONS = (-1, 0, 1, 2)
+SYLLABLE_POSITION_NAMES = {-1: 'single', 0: 'initial', 1: 'middle', 2: 'final'}
+
+# What each component choice is conditioned on
+SLOTS = ('onset', 'nucleus', 'coda')
+SLOT_CONDITIONS = {'onset': 'previous coda', 'nucleus': 'nothing', 'coda': 'onset'}
+
+# Cells with fewer expected counts than this are pooled, so the chi-square approximation holds
+MIN_EXPECTED_COUNT = 5
+
+DEFAULT_SIGNIFICANCE = .001
+
+# Words are generated and counted in chunks of this many, to keep memory use flat
+WORDS_PER_CHUNK = 20000
+
+# Phoneme ids are all below this
+MAX_PHONEME_ID = 400
+
+
+# ------------------------------------- Chi-square ------------------------------------- #
+
+def regularized_upper_gamma(a, x):
+    ''' Q(a, x), the regularized upper incomplete gamma function. Uses the series expansion
+        below a + 1, and the continued fraction above it (Numerical Recipes, 6.2) '''
+    if x <= 0:
+        return 1.0
+
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+
+    if x < a + 1:
+        term = total = 1 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return 1 - total * math.exp(log_prefix)
+
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in xrange(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        if abs(d) < tiny: d = tiny
+        c = b + an / c
+        if abs(c) < tiny: c = tiny
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(log_prefix) * h
+
+
+def chi_square_p_value(statistic, degrees_of_freedom):
+    ''' The probability of a chi-square statistic at least this large, if the counts do follow the expected distribution '''
+    if degrees_of_freedom <= 0:
+        return 1.0
+    return regularized_upper_gamma(degrees_of_freedom / 2, statistic / 2)
+
+
+def chi_square_test(observed, expected):
+    ''' Chi-square test of a table of observed counts, with one row per condition, against the expected
+        counts. Within each row, cells expected to be rare are pooled into a single cell.
+        Returns (statistic, degrees of freedom, number of observations in impossible cells) '''
+    statistic = 0.0
+    degrees_of_freedom = 0
+
+    # Counts where the rules say nothing can be generated mean the sampler is broken, whatever the statistic says
+    impossible = int(observed[expected == 0].sum())
+
+    for observed_row, expected_row in zip(observed, expected):
+        if not expected_row.sum():
+            continue
+
+        common = expected_row >= MIN_EXPECTED_COUNT
+        rare = ~common & (expected_row > 0)
+        observed_cells = list(observed_row[common])
+        expected_cells = list(expected_row[common])
+        if rare.any():
+            observed_cells.append(observed_row[rare].sum())
+            expected_cells.append(expected_row[rare].sum())
+
+        observed_cells, expected_cells = numpy.array(observed_cells), numpy.array(expected_cells)
+        statistic += (((observed_cells - expected_cells) ** 2) / expected_cells).sum()
+        degrees_of_freedom += len(observed_cells) - 1
+
+    return statistic, degrees_of_freedom, impossible
+
+
+# ----------------------------- Expected (conditional) distributions ----------------------------- #
+
+class ComponentIndex:
+    ''' Numbers the components of a language's phoneme data, so that counts can be kept with
+        numpy.bincount. One extra index stands for "no previous coda" at the start of a word '''
+    def __init__(self, phoneme_data):
+        self.size = phoneme_data.next_component_id + 1
+        self.no_component = self.size - 1
+
+
+def normalize(weights):
+    total = weights.sum()
+    return weights / total if total else weights
+
+
+def get_weight_vector(probabilities, component_index):
+    weights = numpy.zeros(component_index.size)
+    for component, probability in probabilities.iteritems():
+        weights[component.id_] = probability
+    return weights
+
+
+def get_onset_distributions(language, component_index, syllable_position):
+    ''' Rows are the previous coda, columns the onset; follows Language.choose_valid_onset() '''
+    phoneme_data = language.phoneme_data
+    onsets = language.probabilities['onset']
+    weights = get_weight_vector(onsets, component_index)
+    distributions = numpy.zeros((component_index.size, component_index.size))
+
+    empty_onset = numpy.zeros(component_index.size)
+    empty_onset[phoneme_data.empty_onset.id_] = 1
+
+    if syllable_position in (-1, 0):
+        distributions[component_index.no_component] = normalize(weights)
+        return distributions
+
+    for coda in language.probabilities['coda']:
+        if coda.is_complex():
+            distributions[coda.id_] = empty_onset
+        elif syllable_position == 1 and not coda.is_empty():
+            distributions[coda.id_] = empty_onset
+        else:
+            allowed = weights.copy()
+            for onset in onsets:
+                if onset.phoneme_ids[-1] == coda.phoneme_ids[-1] or (onset.is_empty() and coda.is_empty()):
+                    allowed[onset.id_] = 0
+
+            distributions[coda.id_] = normalize(allowed)
+            if not coda.is_empty():
+                force_empty = lang_gen.FORCE_EMPTY_ONSET_AFTER_ANY_CODA_CHANCE / 100
+                distributions[coda.id_] = force_empty * empty_onset + (1 - force_empty) * distributions[coda.id_]
+
+    return distributions
+
+
+def get_coda_distributions(language, component_index, syllable_position):
+    ''' Rows are the onset, columns the coda; follows Language.choose_valid_coda() '''
+    phoneme_data = language.phoneme_data
+    codas = language.probabilities['coda']
+    weights = get_weight_vector(codas, component_index)
+    distributions = numpy.zeros((component_index.size, component_index.size))
+
+    for onset in language.probabilities['onset']:
+        if syllable_position == 1:
+            distributions[onset.id_, phoneme_data.empty_coda.id_] = 1
+            continue
+
+        allowed = weights.copy()
+        for coda in codas:
+            if onset.has_any_phoneme((221, 224)) and coda.has_any_phoneme((221, 224)):
+                allowed[coda.id_] = 0
+            if syllable_position == -1 and coda.is_empty():
+                allowed[coda.id_] = 0
+        distributions[onset.id_] = normalize(allowed)
+
+    return distributions
+
+
+def get_nucleus_distributions(language, component_index, syllable_position):
+    ''' A single row (the nucleus doesn't depend on the rest of the syllable); follows Language.choose_valid_nucleus() '''
+    nuclei = language.probabilities['nucleus_monophthong' if syllable_position == 1 else 'nucleus']
+    distributions = numpy.zeros((component_index.size, component_index.size))
+    distributions[component_index.no_component] = normalize(get_weight_vector(nuclei, component_index))
+    return distributions
+
+
+DISTRIBUTION_FUNCTIONS = {'onset': get_onset_distributions, 'nucleus': get_nucleus_distributions, 'coda': get_coda_distributions}
+
+
+# -------------------------------------- Counting -------------------------------------- #
+
+def get_table_offset(component_index, syllable_position, slot):
+    ''' Where the (condition x component) count table for a syllable position and slot starts in the flat count array '''
+    table_size = component_index.size ** 2
+    return (SYLLABLE_POSITIONS.index(syllable_position) * len(SLOTS) + SLOTS.index(slot)) * table_size
+
+
+def count_words(words, language, component_index):
+    ''' Flat counts of (condition, component) pairs for every syllable position and slot, and counts of phonemes '''
+    cells = []
+    phoneme_ids = []
+    size = component_index.size
+
+    for word in words:
+        number_of_syllables = len(word.syllables)
+        previous_coda = component_index.no_component
+
+        for i, syllable in enumerate(word.syllables):
+            syllable_position = language.get_syllable_position(current_syllable=i, total_syllables=number_of_syllables)
+            onset, nucleus, coda = syllable.onset.id_, syllable.nucleus.id_, syllable.coda.id_
+
+            cells.append(get_table_offset(component_index, syllable_position, 'onset') + previous_coda * size + onset)
+            cells.append(get_table_offset(component_index, syllable_position, 'nucleus') + component_index.no_component * size + nucleus)
+            cells.append(get_table_offset(component_index, syllable_position, 'coda') + onset * size + coda)
+            previous_coda = coda
+
+        phoneme_ids.extend(word.phoneme_ids)
+
+    counts = numpy.bincount(numpy.array(cells, dtype=numpy.int64), minlength=len(SYLLABLE_POSITIONS) * len(SLOTS) * size ** 2)
+    phoneme_counts = numpy.bincount(numpy.array(phoneme_ids, dtype=numpy.int64), minlength=MAX_PHONEME_ID)
+    return counts, phoneme_counts
+
+
+# Each worker process generates its language once, and keeps it around for later tasks
+WORKER_LANGUAGES = {}
+
+
+def get_language(seed):
+    if seed not in WORKER_LANGUAGES:
+        language = lang_gen.Language(seed=seed)
+        language.generate_language_properties()
+        WORKER_LANGUAGES[seed] = language
+    return WORKER_LANGUAGES[seed]
+
+
+def generate_and_count(task):
+    ''' Worker: generate a number of words for a language from an independent random stream, and count them '''
+    seed, stream_seed, number_of_words, syllable_counts = task
+
+    language = get_language(seed)
+    # Words come from the task's own stream, so that every worker generates different words
+    language.rng = RandomSource(seed=stream_seed)
+    component_index = ComponentIndex(language.phoneme_data)
+
+    words = [language.create_word(meaning=None, number_of_syllables=language.rng.choice(syllable_counts))
+                for _ in xrange(number_of_words)]
+
+    return count_words(words, language, component_index)
+
+
+# -------------------------------------- Validation -------------------------------------- #
+
+def count_in_parallel(seed, number_of_words, syllable_counts, processes=None):
+    ''' Generate and count words across all cores. Returns the summed flat counts and phoneme counts '''
+    stream_seeds = RandomSource(seed=seed)
+    tasks = []
+    while number_of_words > 0:
+        chunk = min(WORDS_PER_CHUNK, number_of_words)
+        tasks.append((seed, stream_seeds.roll(0, 2**32 - 1), chunk, tuple(syllable_counts)))
+        number_of_words -= chunk
+
+    pool = multiprocessing.Pool(processes=processes)
+    try:
+        counts, phoneme_counts = None, None
+        for task_counts, task_phoneme_counts in pool.imap_unordered(generate_and_count, tasks):
+            counts = task_counts if counts is None else counts + task_counts
+            phoneme_counts = task_phoneme_counts if phoneme_counts is None else phoneme_counts + task_phoneme_counts
+    finally:
+        pool.close()
+        pool.join()
+
+    return counts, phoneme_counts
+
+
+def validate(seed, counts, significance=DEFAULT_SIGNIFICANCE):
+    ''' Run a chi-square test for each syllable position and slot. Returns a list of result dicts '''
+    language = get_language(seed)
+    component_index = ComponentIndex(language.phoneme_data)
+    size = component_index.size
+
+    results = []
+    for syllable_position in SYLLABLE_POSITIONS:
+        for slot in SLOTS:
+            offset = get_table_offset(component_index, syllable_position, slot)
+            observed = counts[offset:offset + size ** 2].reshape(size, size)
+            if not observed.sum():
+                continue
+
+            distributions = DISTRIBUTION_FUNCTIONS[slot](language, component_index, syllable_position)
+            expected = observed.sum(axis=1)[:, None] * distributions
+
+            statistic, degrees_of_freedom, impossible = chi_square_test(observed, expected)
+            p_value = chi_square_p_value(statistic, degrees_of_freedom)
+
+            results.append({
+                'position': SYLLABLE_POSITION_NAMES[syllable_position],
+                'slot': slot,
+                'observations': int(observed.sum()),
+                'statistic': statistic,
+                'degrees_of_freedom': degrees_of_freedom,
+                'p_value': p_value,
+                'impossible': impossible,
+                'passed': p_value >= significance and not impossible,
+            })
+
+    return results
+
+
+def print_phoneme_frequencies(language, phoneme_counts, top=12):
+    ''' The most common phonemes and their share of all phonemes generated '''
+    total = phoneme_counts.sum()
+    print '{: <8} {: >8}'.format('Phoneme', 'Share')
+    for phoneme_id in numpy.argsort(phoneme_counts)[::-1][:top]:
+        if not phoneme_counts[phoneme_id]:
+            break
+        phoneme = language.phoneme_data.id_to_phoneme[phoneme_id]
+        print '{: <8} {: >7.2f}%'.format(phoneme.char if phoneme_id < 300 else '-', 100 * phoneme_counts[phoneme_id] / total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that generated words follow their language\'s probabilities')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the language to check')
+    parser.add_argument('--words', type=int, default=200000, help='Number of words to generate')
+    parser.add_argument('--syllables', type=int, nargs='+', default=[1, 2, 3], help='Word lengths (in syllables) to generate')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: one per core)')
+    parser.add_argument('--significance', type=float, default=DEFAULT_SIGNIFICANCE)
+    args = parser.parse_args()
+
+    start = time.time()
+    counts, phoneme_counts = count_in_parallel(args.seed, args.words, args.syllables, processes=args.processes)
+    results = validate(args.seed, counts, significance=args.significance)
+    elapsed = time.time() - start
+
+    print '{: <8} {: <8} {: >10} {: >10} {: >6} {: >8} {: >11}'.format('Position', 'Slot', 'Count', 'Chi-square', 'DoF', 'p', 'Impossible')
+    for result in results:
+        print '{position: <8} {slot: <8} {observations: >10} {statistic: >10.1f} {degrees_of_freedom: >6} {p_value: >8.4f} {impossible: >11}{0}'.format(
+            '' if result['passed'] else '  FAILED', **result)
+
+    print ''
+    print_phoneme_frequencies(get_language(args.seed), phoneme_counts)
+
+    print ''
+    failures = sum(not result['passed'] for result in results)
+    print '{0} words from language {1} in {2:.1f}s: {3} of {4} tests failed at p < {5}'.format(
+        args.words, args.seed, elapsed, failures, len(results), args.significance)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
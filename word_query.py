@@ -0,0 +1,296 @@
+from __future__ import division, unicode_literals
+import re
+import io
+import sys
+import time
+import argparse
+
+import numpy
+
+import lang_gen
+import phonemes as p
+import lexicon
+
+'''
+Finds the words of a vocabulary by their sounds, with queries like
+
+    first onset velar plosive any and last coda any nasal 3
+
+A query is one or more clauses joined by "and", each of which can start with "not":
+
+    <position> <slot> <phonemes>        the slot (onset, nucleus or coda) of the first, second,
+                                        third, last or any syllable has one of the phonemes;
+                                        "empty" for an empty onset or coda
+    has <sequence>                      the phonemes come one after the other somewhere in the word
+    starts with <sequence>
+    ends with <sequence>
+    syllables <n>[-<m>]                 the word has n (to m) syllables
+
+Phonemes are described as in the rule files, "<location> <method> <voicing> [except <id> ...]",
+or by id, or V (any vowel) or C (any consonant), and a sequence is phonemes separated by "+",
+with # for the start or end of the word (see lexicon.parse_phonemes and compile_sequence).
+
+A WordIndex keeps what the clauses test as numpy columns, one row per word, so a query is a
+few vectorized operations over the whole vocabulary rather than a loop over its words:
+
+    slot bitsets        for each position and slot, a 64-bit bitset of the phonemes in it
+                        (PHONEME_BITS), with EMPTY_BIT for an empty slot; a slot clause is
+                        one AND against a mask of the phonemes it names
+    syllable counts
+    phonemes            every word's phonemes, one byte each, joined into one string (see
+                        lexicon.py); a sequence clause is a regular expression over it, split
+                        on so that the positions of the matches come out without a python call
+                        per match
+
+The index is built from the words' encode_syllables() strings with numpy, a chunk of words at a
+time, so building it costs little more than encoding the words. Over a million words, a slot or
+syllable count clause takes a few milliseconds, and a sequence clause a hundred or two.
+'''
+
+POSITIONS = ('first', 'second', 'third', 'last', 'any')
+# The syllable each of the numbered positions is
+POSITION_SYLLABLES = {'first': 0, 'second': 1, 'third': 2}
+
+# Set in the bitset of an empty slot
+EMPTY_BIT = numpy.uint64(1 << 63)
+
+# Bit of each phoneme in the slot bitsets, by its encoded byte. Phonemes get the bits below EMPTY_BIT in id order
+PHONEME_BITS = numpy.zeros(256, dtype=numpy.uint64)
+BITSET_PHONEMES = sorted((phoneme for phoneme in p.PHONEMES_BY_ID.itervalues() if phoneme.id_ < lexicon.EMPTY_PHONEME_ID_BASE),
+                         key=lambda phoneme: phoneme.id_)
+assert len(BITSET_PHONEMES) <= 63, 'the slot bitsets have room for 63 phonemes, not {0}'.format(len(BITSET_PHONEMES))
+for bit, phoneme in enumerate(BITSET_PHONEMES):
+    PHONEME_BITS[ord(lexicon.encode_phoneme_id(phoneme.id_))] = 1 << bit
+# The word for it in a query
+EMPTY = 'empty'
+
+# The slot of each SLOT_MARKER, by its byte (1 for onsets, 2 for nuclei and 3 for codas), and 0 for everything else
+SLOT_CODES = numpy.zeros(256, dtype=numpy.uint8)
+for code, slot in enumerate(lexicon.SLOTS, start=1):
+    SLOT_CODES[ord(lexicon.SLOT_MARKERS[slot])] = code
+
+# How many words are indexed at a time, to bound the memory the temporary per-byte arrays take
+INDEX_CHUNK_SIZE = 50000
+
+
+def get_slot_bitsets(encoded_words):
+    ''' The slot bitsets (by position and slot) and syllable counts of encode_syllables() strings '''
+    number_of_words = len(encoded_words)
+    codes = numpy.frombuffer(lexicon.EncodedLexicon(xrange(number_of_words), encoded_words).join(), dtype=numpy.uint8)
+    slot_codes = SLOT_CODES[codes]
+
+    # For each byte, the word it's in (counting its separator as the start of the word) ...
+    is_separator = codes == 0
+    word_numbers = numpy.cumsum(is_separator, dtype=numpy.int32) - 1
+    # ... the slot it's in, from the last marker (or separator) at or before it ...
+    last_marker = numpy.maximum.accumulate(numpy.where((slot_codes > 0) | is_separator, numpy.arange(len(codes), dtype=numpy.int32), 0))
+    byte_slots = slot_codes[last_marker]
+    # ... and which of the word's syllables it's in
+    is_onset_marker = slot_codes == 1
+    syllable_numbers = numpy.cumsum(is_onset_marker, dtype=numpy.int32)
+    syllable_numbers -= syllable_numbers[is_separator][word_numbers] + 1
+    syllable_counts = numpy.bincount(word_numbers[is_onset_marker], minlength=number_of_words)[:number_of_words]
+
+    # Phonemes set their own bits, and the marker of a slot with nothing after it sets EMPTY_BIT
+    bits = PHONEME_BITS[codes]
+    next_codes = numpy.append(codes[1:], numpy.uint8(0))
+    bits[(slot_codes > 0) & ((SLOT_CODES[next_codes] > 0) | (next_codes == 0))] = EMPTY_BIT
+
+    bitsets = {}
+    last_syllables = (syllable_counts - 1)[numpy.minimum(word_numbers, number_of_words - 1)]
+    for code, slot in enumerate(lexicon.SLOTS, start=1):
+        in_slot = byte_slots == code
+        for position in POSITIONS:
+            if position == 'any':
+                selected = in_slot
+            elif position == 'last':
+                selected = in_slot & (syllable_numbers == last_syllables)
+            else:
+                selected = in_slot & (syllable_numbers == POSITION_SYLLABLES[position])
+
+            # The selected bytes are in word order, so each word's are a run to OR together
+            selected_words = word_numbers[selected]
+            bitset = numpy.zeros(number_of_words, dtype=numpy.uint64)
+            if len(selected_words):
+                run_starts = numpy.flatnonzero(numpy.concatenate(([True], selected_words[1:] != selected_words[:-1])))
+                bitset[selected_words[run_starts]] = numpy.bitwise_or.reduceat(bits[selected], run_starts)
+            bitsets[position, slot] = bitset
+
+    return bitsets, syllable_counts
+
+
+class WordIndex:
+    ''' The columns queries are answered from (see the module docstring), for words with keys '''
+    def __init__(self, keys, words):
+        self.keys = list(keys)
+
+        bitset_chunks, syllable_count_chunks, encoded_chunks = [], [], []
+        for start in xrange(0, len(self.keys), INDEX_CHUNK_SIZE):
+            encoded_words = [lexicon.encode_syllables(word.syllables) for word in words[start:start + INDEX_CHUNK_SIZE]]
+            bitsets, syllable_counts = get_slot_bitsets(encoded_words)
+            bitset_chunks.append(bitsets)
+            syllable_count_chunks.append(syllable_counts)
+            encoded_chunks.extend(encoded_words)
+
+        self.bitsets = {key: numpy.concatenate([bitsets[key] for bitsets in bitset_chunks]) if bitset_chunks else numpy.zeros(0, dtype=numpy.uint64)
+                        for key in ((position, slot) for position in POSITIONS for slot in lexicon.SLOTS)}
+        self.syllable_counts = numpy.concatenate(syllable_count_chunks) if syllable_count_chunks else numpy.zeros(0, dtype=numpy.intp)
+
+        # The words' phonemes, without the slot markers, and where each word's separator is
+        self.joined = lexicon.EncodedLexicon(self.keys, encoded_chunks).join().translate(None, b''.join(lexicon.SLOT_MARKERS.values()))
+        self.separators = numpy.flatnonzero(numpy.frombuffer(self.joined, dtype=numpy.uint8) == 0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find_sequence(self, pattern):
+        ''' Which words a regular expression over the joined phonemes matches in, as a boolean array. The pattern
+            has to match one byte at its start and look ahead for the rest (see SequenceClause) '''
+        parts = pattern.split(self.joined)
+        # Each match is one byte, between two parts
+        match_starts = numpy.cumsum(numpy.fromiter(map(len, parts[:-1]), dtype=numpy.intp, count=len(parts) - 1) + 1) - 1
+        matches = numpy.zeros(len(self.keys) + 1, dtype=bool)
+        matches[numpy.searchsorted(self.separators, match_starts, side='right') - 1] = True
+        return matches[:len(self.keys)]
+
+    def match(self, query):
+        ''' Whether each word matches the query (a Query, or its text), as a boolean array '''
+        query = query if isinstance(query, Query) else Query(query)
+        matches = numpy.ones(len(self.keys), dtype=bool)
+        for clause in query.clauses:
+            matches &= clause.match(self)
+        return matches
+
+    def find(self, query):
+        ''' The keys of the words which match the query '''
+        return [self.keys[index] for index in numpy.flatnonzero(self.match(query))]
+
+    def count(self, query):
+        return int(numpy.count_nonzero(self.match(query)))
+
+
+def index_vocabulary(vocabulary):
+    ''' A WordIndex of a language's vocabulary (or any {key: Word}), in key order '''
+    keys = sorted(vocabulary)
+    return WordIndex(keys, [vocabulary[key] for key in keys])
+
+
+def index_words(words):
+    ''' A WordIndex of a list of words, keyed by their position '''
+    return WordIndex(xrange(len(words)), words)
+
+
+# ------------------------------------------ Queries ------------------------------------------ #
+
+class SlotClause:
+    ''' <position> <slot> <phonemes>, or <position> <slot> empty '''
+    def __init__(self, position, slot, phonemes):
+        self.key = (position, slot)
+        if phonemes.strip() == EMPTY:
+            if slot == 'nucleus':
+                raise ValueError('a nucleus is never empty')
+            self.mask = EMPTY_BIT
+        else:
+            self.mask = numpy.bitwise_or.reduce([PHONEME_BITS[ord(lexicon.encode_phoneme_id(phoneme.id_))] for phoneme in lexicon.parse_phonemes(phonemes)]
+                                                or [numpy.uint64(0)])
+
+    def match(self, index):
+        return (index.bitsets[self.key] & self.mask) != 0
+
+
+class SequenceClause:
+    ''' has / starts with / ends with <sequence> '''
+    def __init__(self, sequence):
+        first, _, rest = sequence.partition('+')
+        # Only the first element is consumed, so that matches in neighbouring words can't overlap
+        pattern = lexicon.compile_sequence(first)
+        pattern += b'(?=' + lexicon.compile_sequence(rest) + b')' if rest.strip() else b''
+        self.pattern = re.compile(pattern)
+
+    def match(self, index):
+        return index.find_sequence(self.pattern)
+
+
+class SyllableCountClause:
+    ''' syllables <n>[-<m>] '''
+    def __init__(self, counts):
+        minimum, _, maximum = counts.partition('-')
+        self.minimum = int(minimum)
+        self.maximum = int(maximum) if maximum.strip() else self.minimum
+
+    def match(self, index):
+        return (index.syllable_counts >= self.minimum) & (index.syllable_counts <= self.maximum)
+
+
+class NotClause:
+    def __init__(self, clause):
+        self.clause = clause
+
+    def match(self, index):
+        return ~self.clause.match(index)
+
+
+def parse_clause(text):
+    words = text.split()
+    if not words:
+        raise ValueError('empty clause')
+
+    if words[0] == 'not':
+        return NotClause(parse_clause(' '.join(words[1:])))
+    if words[0] == 'has':
+        return SequenceClause(' '.join(words[1:]))
+    if words[:2] == ['starts', 'with']:
+        return SequenceClause(' + '.join([lexicon.WORD_BOUNDARY, ' '.join(words[2:])]))
+    if words[:2] == ['ends', 'with']:
+        return SequenceClause(' + '.join([' '.join(words[2:]), lexicon.WORD_BOUNDARY]))
+    if words[0] == 'syllables' and len(words) == 2:
+        return SyllableCountClause(words[1])
+    if len(words) > 2 and words[0] in POSITIONS and words[1] in lexicon.SLOTS:
+        return SlotClause(words[0], words[1], ' '.join(words[2:]))
+
+    raise ValueError('could not parse clause "{0}"'.format(text))
+
+
+class Query:
+    ''' Clauses joined by "and" (see the module docstring) '''
+    def __init__(self, text):
+        self.text = text.strip()
+        try:
+            self.clauses = [parse_clause(clause) for clause in re.split(r'\band\b', self.text)]
+        except ValueError as error:
+            raise ValueError('query "{0}": {1}'.format(self.text, error))
+
+    def __str__(self):
+        return self.text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the words of a language by their sounds')
+    parser.add_argument('query', nargs='+', help='Queries, such as "first onset velar plosive any and last coda any nasal 3"')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the language')
+    parser.add_argument('--words', type=int, default=1000, help='How many words to generate for it')
+    parser.add_argument('--show', type=int, default=10, help='How many matching words to list for each query')
+    args = parser.parse_args()
+
+    language = lang_gen.Language(seed=args.seed)
+    for i in xrange(args.words):
+        language.create_word(meaning='word {0}'.format(i), number_of_syllables=language.rng.roll(1, 3))
+
+    # Words are spelled with characters outside ascii, so they can't go through print when stdout is piped
+    output_file = io.open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+
+    with output_file:
+        start = time.time()
+        index = index_vocabulary(language.vocabulary)
+        output_file.write('Indexed {0} words in {1:.2f}s\n'.format(len(index), time.time() - start))
+
+        for text in args.query:
+            query = Query(text)
+            start = time.time()
+            keys = index.find(query)
+            output_file.write('{0}: {1} words ({2:.1f}ms)\n'.format(query, len(keys), (time.time() - start) * 1000))
+            for key in keys[:args.show]:
+                output_file.write('    {0:>12}  {1}\n'.format(key, unicode(language.vocabulary[key])))
+
+if __name__ == '__main__':
+    main()